@@ -0,0 +1,16 @@
+"""
+Benchmarks
+Performance suites for the counting pipeline and API, runnable offline on CPU
+
+    startup  import time of the app in fresh interpreters
+    micro    post-processing functions on 10 to 10k synthetic detections
+    api      /api/count and /api/batch/process with stubbed models
+    stages   run_pipeline per stage on dev_media/ and media/ (needs weights)
+
+Run them together and compare against an earlier report:
+    python -m benchmarks --output bench.json
+    python -m benchmarks --baseline bench.json
+
+Load test a running server (or a stubbed local one) against latency SLOs:
+    python -m benchmarks.loadtest --stub --mix mixed --rate 20 --slo-p95 0.5
+"""
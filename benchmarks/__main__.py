@@ -0,0 +1,68 @@
+"""
+Run the benchmark suites and write one JSON report
+
+    python -m benchmarks --suites micro api --output bench.json
+    python -m benchmarks --baseline bench.json --threshold 0.2
+
+With --baseline the report gains a `comparison` section and the exit
+status is 1 when any benchmark is slower than the baseline by more than
+--threshold.
+"""
+
+import argparse
+import json
+import sys
+
+from .common import compare, environment, load_report, write_report
+
+SUITES = ('startup', 'micro', 'api', 'stages')
+
+
+def run_suite(name: str, args) -> dict:
+    if name == 'startup':
+        from .startup import TARGETS, measure
+        return {target: measure(target, args.runs) for target in TARGETS}
+    if name == 'micro':
+        from .micro import run
+        return run(args.scales, args.repeat)
+    if name == 'api':
+        from .api import run
+        return run(args.requests)
+    from .stages import run
+    return run(args.limit)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Run the benchmark suites')
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=['startup', 'micro', 'api'],
+                        help='stages needs the model weights, so it only runs when asked for')
+    parser.add_argument('--output', help='write the JSON report here')
+    parser.add_argument('--baseline', help='earlier report to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='slowdown (fraction) that counts as a regression')
+    parser.add_argument('--runs', type=int, default=5, help='startup: fresh interpreters per target')
+    parser.add_argument('--scales', nargs='+', type=int, default=[10, 100, 1000, 10000],
+                        help='micro: detections per image')
+    parser.add_argument('--repeat', type=int, default=5, help='micro: maximum runs per case')
+    parser.add_argument('--requests', type=int, default=50, help='api: requests per endpoint')
+    parser.add_argument('--limit', type=int, default=None, help='stages: maximum number of images')
+    args = parser.parse_args()
+
+    report = {'environment': environment(), 'results': {}}
+    for name in args.suites:
+        print(f'Running {name} benchmarks...', file=sys.stderr)
+        report['results'][name] = run_suite(name, args)
+
+    status = 0
+    if args.baseline:
+        report['comparison'] = compare(report['results'], load_report(args.baseline)['results'],
+                                       args.threshold)
+        status = 1 if report['comparison']['regressions'] else 0
+    if args.output:
+        write_report(report, args.output)
+    print(json.dumps(report, indent=2, default=str))
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+API throughput benchmarks
+/api/count, /api/batch/process and recounts through the Flask test client
+
+The models are replaced by the stub backend (src/pipeline/stub.py), so
+this measures the web, upload, storage and monitoring layers only. Requests go to a throwaway SQLite database and
+upload folder unless OBJ_DETECT_MYSQL_DB / UPLOAD_FOLDER are already set.
+
+    python -m benchmarks.api --requests 200
+"""
+
+import io
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+# Must happen before src.storage and the upload helpers are imported
+_SANDBOX = tempfile.mkdtemp(prefix='obj_detect_bench_')
+os.environ.setdefault('OBJ_DETECT_MYSQL_DB', os.path.join(_SANDBOX, 'bench.db'))
+os.environ.setdefault('UPLOAD_FOLDER', os.path.join(_SANDBOX, 'media'))
+
+from .common import summarize  # noqa: E402
+
+
+def _image_bytes(width: int = 640, height: int = 480) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (90, 140, 200)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def _measure(send, requests: int) -> Dict[str, Any]:
+    seconds: List[float] = []
+    errors = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        request_start = time.perf_counter()
+        response = send()
+        seconds.append(time.perf_counter() - request_start)
+        if response.status_code >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - start
+    result = summarize(seconds)
+    result.update({'errors': errors, 'throughput_rps': requests / elapsed if elapsed else 0.0})
+    return result
+
+
+def run(requests: int = 50, batch_size: int = 5, latency: str = 'none') -> Dict[str, Any]:
+    """Latency and throughput of the counting endpoints with the stub backend
+
+    `latency` is a STUB_LATENCY spec; the default measures the API alone.
+    """
+    from src.app import app
+    from src.pipeline.stub import StubPipeline
+
+    stub = StubPipeline(latency=latency)
+
+    image = _image_bytes()
+    client = app.test_client()
+
+    def count():
+        return client.post('/api/count', content_type='multipart/form-data', data={
+            'image': (io.BytesIO(image), 'bench.jpg'), 'object_type': 'dog'})
+
+    def count_all():
+        return client.post('/api/count-all', content_type='multipart/form-data', data={
+            'image': (io.BytesIO(image), 'bench.jpg'), 'object_type': 'auto'})
+
+    def batch():
+        return client.post('/api/batch/process', content_type='multipart/form-data', data={
+            'images[]': [(io.BytesIO(image), f'bench_{i}.jpg') for i in range(batch_size)],
+            'object_type': 'dog'})
+
+    def recount():
+        return client.post(f'/api/results/{result_id}/recount', json={'confidence_threshold': 0.8})
+
+    # The views hold their own reference to the adapter
+    with patch('src.pipeline.pipeline.pipeline', stub), \
+            patch('src.api.views.inputs.pipeline', stub), \
+            patch('src.api.views.outputs.pipeline', stub), \
+            patch('src.api.views.batch_processing.pipeline', stub):
+        # One untimed request of each kind creates tables, caches and the object type
+        result_id = count().get_json()['result_id']
+        for send in (count_all, batch, recount):
+            send()
+        results = {
+            'count': _measure(count, requests),
+            'count_all': _measure(count_all, requests),
+            f'batch_{batch_size}': _measure(batch, max(1, requests // batch_size)),
+            'recount': _measure(recount, requests)
+        }
+    results[f'batch_{batch_size}']['images_per_second'] = (
+        results[f'batch_{batch_size}']['throughput_rps'] * batch_size)
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Time the counting endpoints with the stub backend')
+    parser.add_argument('--requests', type=int, default=50, help='requests per endpoint')
+    parser.add_argument('--batch-size', type=int, default=5, help='images per batch request')
+    parser.add_argument('--latency', default='none', help='stub model latency, e.g. fixed:0.2')
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.requests, args.batch_size, args.latency), indent=2))
@@ -0,0 +1,125 @@
+"""
+Shared helpers for the benchmark suites: timing, reports and baselines
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMAGE_DIRECTORIES = ('dev_media', 'media')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0-100) of an already sorted list"""
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def summarize(seconds: List[float]) -> Dict[str, Any]:
+    """Median, p95, best and mean of a list of durations"""
+    ordered = sorted(seconds)
+    return {
+        'runs': len(ordered),
+        'median_seconds': statistics.median(ordered),
+        'p95_seconds': percentile(ordered, 95),
+        'min_seconds': ordered[0],
+        'mean_seconds': statistics.fmean(ordered)
+    }
+
+
+def timeit(fn: Callable[[], Any], repeat: int = 5, budget: float = 2.0) -> Dict[str, Any]:
+    """Time `fn` up to `repeat` times, stopping early once `budget` seconds are spent
+
+    The first call always runs, so slow cases (quadratic NMS at 10k
+    detections) are measured once instead of stalling the suite.
+    """
+    seconds = []
+    spent = 0.0
+    while len(seconds) < repeat and (not seconds or spent < budget):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+        spent += seconds[-1]
+    return summarize(seconds)
+
+
+def image_paths(limit: Optional[int] = None) -> List[str]:
+    """Local test images from dev_media/ and media/"""
+    paths = []
+    for directory in IMAGE_DIRECTORIES:
+        full = os.path.join(ROOT, directory)
+        if os.path.isdir(full):
+            paths.extend(sorted(os.path.join(full, name) for name in os.listdir(full)
+                                if name.lower().endswith(IMAGE_EXTENSIONS)))
+    return paths[:limit] if limit else paths
+
+
+def environment() -> Dict[str, Any]:
+    """Where a report was produced, so baselines are compared like for like"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def _flatten(results: Dict[str, Any], prefix: str = '') -> Dict[str, float]:
+    """{'micro.apply_nms.1000': median_seconds, ...} for every timed entry"""
+    flat = {}
+    for key, value in results.items():
+        path = f'{prefix}.{key}' if prefix else str(key)
+        if isinstance(value, dict):
+            if isinstance(value.get('median_seconds'), (int, float)):
+                flat[path] = value['median_seconds']
+            else:
+                flat.update(_flatten(value, path))
+    return flat
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 0.25) -> Dict[str, Any]:
+    """Median time of every benchmark against a baseline report's results
+
+    A benchmark regressed when it is more than `threshold` (a fraction)
+    slower than the baseline; entries only present on one side are listed
+    but not judged.
+    """
+    current = _flatten(results)
+    previous = _flatten(baseline)
+    changes = {}
+    regressions = []
+    for path in sorted(set(current) & set(previous)):
+        ratio = current[path] / previous[path] if previous[path] > 0 else float('inf')
+        changes[path] = {'baseline_seconds': previous[path], 'seconds': current[path],
+                         'ratio': round(ratio, 3)}
+        if ratio > 1 + threshold:
+            regressions.append(path)
+    return {
+        'threshold': threshold,
+        'changes': changes,
+        'regressions': regressions,
+        'new': sorted(set(current) - set(previous)),
+        'missing': sorted(set(previous) - set(current))
+    }
+
+
+def load_report(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_report(report: Dict[str, Any], path: str):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
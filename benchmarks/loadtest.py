@@ -0,0 +1,332 @@
+"""
+Load test
+Replay a mix of API requests against a running server and report latency
+percentiles, throughput and error rate against optional SLOs
+
+Stdlib only (asyncio streams, one connection per request). Two schedules:
+    closed loop  --concurrency N clients send back to back
+    open loop    --rate R Poisson arrivals per second, at most --concurrency
+                 in flight; latency counts from the scheduled arrival, so a
+                 saturated server shows up as queueing instead of being hidden
+
+Request mixes are named (read, write, mixed) or weights such as
+`count=3,results=5,metrics=1`. With --stub a local server running the
+stub pipeline backend (src/pipeline/stub.py) is started, so the web and
+database layers are measured alone; --stub-latency adds model-like delay:
+
+    python -m benchmarks.loadtest --stub --mix mixed --rate 20 --duration 30
+    python -m benchmarks.loadtest --stub --stub-latency lognormal:0.3,0.5 --mix write --rate 5
+    python -m benchmarks.loadtest --url http://10.0.0.5:5000 --mix read --concurrency 32 \\
+        --slo-p95 0.5 --slo-error-rate 0.01
+"""
+
+import asyncio
+import io
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .common import ROOT, percentile
+
+MIXES = {
+    'read': {'results': 6, 'metrics': 2, 'health': 1, 'ready': 1},
+    'write': {'count': 6, 'count_all': 3, 'batch': 1},
+    'mixed': {'count': 3, 'count_all': 1, 'batch': 1, 'results': 4, 'metrics': 1, 'health': 1},
+}
+
+# name: (method, path, kind of body)
+ENDPOINTS = {
+    'count': ('POST', '/api/count', 'image'),
+    'count_all': ('POST', '/api/count-all', 'image'),
+    'batch': ('POST', '/api/batch/process', 'images'),
+    'results': ('GET', '/api/results', None),
+    'metrics': ('GET', '/api/performance/metrics', None),
+    'health': ('GET', '/api/performance/health', None),
+    'ready': ('GET', '/api/performance/ready', None),
+    'prometheus': ('GET', '/metrics', None),
+}
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """A named mix or `endpoint=weight,...`"""
+    if spec in MIXES:
+        return dict(MIXES[spec])
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ENDPOINTS:
+            raise ValueError(f'Unknown endpoint {name!r}; expected one of {sorted(ENDPOINTS)}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def _multipart(fields: List[Tuple[str, Any]]) -> Tuple[bytes, str]:
+    """Encode (name, str) and (name, (filename, bytes)) fields"""
+    boundary = secrets.token_hex(16)
+    body = io.BytesIO()
+    for name, value in fields:
+        body.write(f'--{boundary}\r\n'.encode())
+        if isinstance(value, tuple):
+            filename, content = value
+            body.write(f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                       f'Content-Type: image/jpeg\r\n\r\n'.encode())
+            body.write(content)
+        else:
+            body.write(f'Content-Disposition: form-data; name="{name}"\r\n\r\n{value}'.encode())
+        body.write(b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode())
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+
+def build_requests(image: bytes, object_type: str = 'dog', batch_size: int = 3) -> Dict[str, Tuple]:
+    """(method, path, body, content type) per endpoint; bodies are built once"""
+    requests = {}
+    for name, (method, path, kind) in ENDPOINTS.items():
+        body, content_type = b'', None
+        if kind == 'image':
+            body, content_type = _multipart([
+                ('image', ('load.jpg', image)),
+                ('object_type', object_type if name == 'count' else 'auto')])
+        elif kind == 'images':
+            body, content_type = _multipart(
+                [('images[]', (f'load_{i}.jpg', image)) for i in range(batch_size)]
+                + [('object_type', object_type)])
+        requests[name] = (method, path, body, content_type)
+    return requests
+
+
+async def send(host: str, port: int, method: str, path: str, body: bytes = b'',
+               content_type: Optional[str] = None, timeout: float = 120.0) -> int:
+    """One HTTP/1.1 request on a fresh connection; returns the status code"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        head = [f'{method} {path} HTTP/1.1', f'Host: {host}:{port}', 'Connection: close',
+                f'Content-Length: {len(body)}']
+        if content_type:
+            head.append(f'Content-Type: {content_type}')
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + body)
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        # Drain the response so the server is not cut off mid-write
+        await asyncio.wait_for(reader.read(), timeout)
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+class LoadTest:
+    """Run one mix against a server and collect (endpoint, status, seconds)"""
+
+    def __init__(self, url: str, mix: Dict[str, float], requests: Dict[str, Tuple],
+                 concurrency: int = 8, rate: Optional[float] = None, duration: float = 30.0,
+                 timeout: float = 120.0, seed: int = 0):
+        parts = urlsplit(url)
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port or 80
+        self.mix = mix
+        self.requests = requests
+        self.concurrency = concurrency
+        self.rate = rate
+        self.duration = duration
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        self.samples: List[Tuple[str, int, float]] = []
+
+    def _choose(self) -> str:
+        names = list(self.mix)
+        return self.random.choices(names, weights=[self.mix[n] for n in names])[0]
+
+    async def _one(self, name: str, started: float):
+        method, path, body, content_type = self.requests[name]
+        try:
+            status = await send(self.host, self.port, method, path, body, content_type, self.timeout)
+        except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+            status = 0  # connection error or timeout
+        self.samples.append((name, status, time.perf_counter() - started))
+
+    async def _closed_loop(self, deadline: float):
+        async def client():
+            while time.perf_counter() < deadline:
+                await self._one(self._choose(), time.perf_counter())
+
+        await asyncio.gather(*(client() for _ in range(self.concurrency)))
+
+    async def _open_loop(self, deadline: float):
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = []
+
+        async def arrival(name, scheduled):
+            async with slots:
+                await self._one(name, scheduled)
+
+        next_arrival = time.perf_counter()
+        while next_arrival < deadline:
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(arrival(self._choose(), next_arrival)))
+            next_arrival += self.random.expovariate(self.rate)
+        await asyncio.gather(*tasks)
+
+    def run(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        deadline = start + self.duration
+        schedule = self._open_loop if self.rate else self._closed_loop
+        asyncio.run(schedule(deadline))
+        return report(self.samples, time.perf_counter() - start)
+
+
+def _latency(seconds: List[float]) -> Dict[str, float]:
+    ordered = sorted(seconds)
+    if not ordered:
+        return {}
+    return {
+        'p50_seconds': percentile(ordered, 50),
+        'p95_seconds': percentile(ordered, 95),
+        'p99_seconds': percentile(ordered, 99),
+        'max_seconds': ordered[-1],
+        'mean_seconds': sum(ordered) / len(ordered)
+    }
+
+
+def report(samples: List[Tuple[str, int, float]], elapsed: float) -> Dict[str, Any]:
+    """Overall and per-endpoint latency, throughput and error rate
+
+    Errors are failed connections and timeouts (status 0) and 4xx/5xx
+    responses.
+    """
+    def summary(rows):
+        errors = sum(1 for _, status, _ in rows if status == 0 or status >= 400)
+        codes: Dict[str, int] = {}
+        for _, status, _ in rows:
+            codes[str(status)] = codes.get(str(status), 0) + 1
+        return {
+            'requests': len(rows),
+            'errors': errors,
+            'error_rate': errors / len(rows) if rows else 0.0,
+            'throughput_rps': len(rows) / elapsed if elapsed else 0.0,
+            'status_codes': codes,
+            'latency': _latency([seconds for _, _, seconds in rows])
+        }
+
+    result = summary(samples)
+    result['duration_seconds'] = elapsed
+    result['endpoints'] = {name: summary([row for row in samples if row[0] == name])
+                           for name in sorted({row[0] for row in samples})}
+    return result
+
+
+def check_slos(result: Dict[str, Any], p95: Optional[float] = None, p99: Optional[float] = None,
+               error_rate: Optional[float] = None) -> Dict[str, Any]:
+    """Targets against the overall numbers; empty when no target is set"""
+    checks = {}
+    latency = result['latency']
+    for name, target, actual in (('p95_seconds', p95, latency.get('p95_seconds')),
+                                 ('p99_seconds', p99, latency.get('p99_seconds')),
+                                 ('error_rate', error_rate, result['error_rate'])):
+        if target is not None:
+            checks[name] = {'target': target, 'actual': actual,
+                            'met': actual is not None and actual <= target}
+    return checks
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_stub_server(port: int, latency: str = 'none') -> subprocess.Popen:
+    """The app with the stub backend on localhost:port, in a child process"""
+    env = dict(os.environ, OBJ_DETECT_PIPELINE_BACKEND='stub', STUB_LATENCY=latency)
+    process = subprocess.Popen([sys.executable, '-m', 'benchmarks.loadtest', '--serve-stub', str(port)],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return process
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('Stub server did not start')
+
+
+def serve_stub(port: int):
+    """Serve the app; start_stub_server selects the stub backend through the environment"""
+    from . import api  # noqa: F401  (throwaway database and upload folder)
+    from src.app import app
+
+    app.run(host='127.0.0.1', port=port, threaded=True, debug=False)
+
+
+def main() -> int:
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Load test the HTTP API')
+    parser.add_argument('--url', default='http://localhost:5000', help='server to load')
+    parser.add_argument('--stub', action='store_true', help='start a local server with the stub backend')
+    parser.add_argument('--stub-latency', default='none', help='stub model latency, e.g. lognormal:0.3,0.5')
+    parser.add_argument('--mix', default='mixed', help=f'{sorted(MIXES)} or endpoint=weight,...')
+    parser.add_argument('--concurrency', type=int, default=8, help='clients (closed loop) or in-flight cap')
+    parser.add_argument('--rate', type=float, default=None, help='Poisson arrivals per second (open loop)')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to send requests for')
+    parser.add_argument('--timeout', type=float, default=120.0, help='per-request timeout in seconds')
+    parser.add_argument('--image', help='image to upload (default: a synthetic 640x480 JPEG)')
+    parser.add_argument('--object-type', default='dog')
+    parser.add_argument('--batch-size', type=int, default=3, help='images per batch request')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--slo-p95', type=float, help='p95 latency target in seconds')
+    parser.add_argument('--slo-p99', type=float, help='p99 latency target in seconds')
+    parser.add_argument('--slo-error-rate', type=float, help='error rate target (fraction)')
+    parser.add_argument('--output', help='write the JSON report here')
+    parser.add_argument('--serve-stub', type=int, metavar='PORT', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_stub:
+        serve_stub(args.serve_stub)
+        return 0
+
+    if args.image:
+        with open(args.image, 'rb') as f:
+            image = f.read()
+    else:
+        from .api import _image_bytes
+        image = _image_bytes()
+
+    server = None
+    url = args.url
+    if args.stub:
+        port = _free_port()
+        server = start_stub_server(port, args.stub_latency)
+        url = f'http://127.0.0.1:{port}'
+    try:
+        test = LoadTest(url, parse_mix(args.mix), build_requests(image, args.object_type, args.batch_size),
+                        args.concurrency, args.rate, args.duration, args.timeout, args.seed)
+        result = test.run()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    result['config'] = {'url': url, 'stub': args.stub, 'mix': parse_mix(args.mix),
+                        'concurrency': args.concurrency, 'rate': args.rate, 'duration': args.duration}
+    result['slo'] = check_slos(result, args.slo_p95, args.slo_p99, args.slo_error_rate)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+    print(json.dumps(result, indent=2, sort_keys=True))
+    return 0 if all(check['met'] for check in result['slo'].values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
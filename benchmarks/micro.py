@@ -0,0 +1,83 @@
+"""
+Post-processing micro-benchmarks
+apply_nms, filter_segments, aggregate_results, map_labels and
+count_objects_by_class on synthetic detections, from 10 to 10k per image
+
+Detections are generated from a fixed seed, so runs are comparable.
+Label mapping uses the synonym tables only (no zero-shot model).
+
+    python -m benchmarks.micro --scales 10 100 1000
+"""
+
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .common import timeit
+
+SCALES = (10, 100, 1000, 10000)
+
+# Raw classifier labels: canonical names, synonyms and unmapped labels
+RAW_LABELS = ('dog', 'puppy', 'cat', 'kitten', 'car', 'sedan', 'person', 'man', 'bicycle', 'bike',
+              'golden retriever', 'tabby', 'sports car', 'mountain bike', 'cup', 'bottle')
+CANDIDATE_LABELS = ['dog', 'cat', 'car', 'person', 'bicycle']
+
+
+def synthetic_segments(n: int, seed: int = 0, size: int = 1024) -> Tuple[List[Dict], List[List[int]]]:
+    """Classifier results and [x, y, w, h] boxes for n segments of a size x size image"""
+    rng = np.random.default_rng(seed)
+    widths = rng.integers(10, 200, n)
+    heights = rng.integers(10, 200, n)
+    xs = rng.integers(0, size - 200, n)
+    ys = rng.integers(0, size - 200, n)
+    confidences = rng.uniform(0.3, 1.0, n)
+    labels = rng.integers(0, len(RAW_LABELS), n)
+    classifications = [{
+        'segment_id': i,
+        'raw_label': RAW_LABELS[labels[i]],
+        'confidence': float(confidences[i]),
+        'calibrated_confidence': float(confidences[i])
+    } for i in range(n)]
+    bboxes = [[int(xs[i]), int(ys[i]), int(widths[i]), int(heights[i])] for i in range(n)]
+    return classifications, bboxes
+
+
+def run(scales: Sequence[int] = SCALES, repeat: int = 5, budget: float = 2.0) -> Dict[str, Any]:
+    """{function: {scale: timing}} for every post-processing stage"""
+    from src.pipeline import mapping
+    from src.pipeline.postprocess import aggregate_results, apply_nms, count_objects_by_class, filter_segments
+
+    # Synonym mapping only; restored afterwards
+    previous_mapper = mapping._global_mapper
+    mapping._global_mapper = mapping.LabelMapper(use_zero_shot=False)
+    results: Dict[str, Dict[str, Any]] = {name: {} for name in (
+        'filter_segments', 'apply_nms', 'map_labels', 'aggregate_results', 'count_objects_by_class')}
+    try:
+        for n in scales:
+            classifications, bboxes = synthetic_segments(n)
+            # Every stage gets the same n detections (no confidence filtering)
+            detections = filter_segments(classifications, bboxes, confidence_threshold=0.0, min_area=0)
+            mapped = mapping.map_labels(detections, CANDIDATE_LABELS)
+            key = str(n)
+            results['filter_segments'][key] = timeit(
+                lambda: filter_segments(classifications, bboxes, confidence_threshold=0.7), repeat, budget)
+            results['apply_nms'][key] = timeit(lambda: apply_nms(detections, threshold=0.3), repeat, budget)
+            results['map_labels'][key] = timeit(
+                lambda: mapping.map_labels(detections, CANDIDATE_LABELS), repeat, budget)
+            results['aggregate_results'][key] = timeit(lambda: aggregate_results(mapped), repeat, budget)
+            results['count_objects_by_class'][key] = timeit(lambda: count_objects_by_class(mapped), repeat, budget)
+    finally:
+        mapping._global_mapper = previous_mapper
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Time post-processing on synthetic detections')
+    parser.add_argument('--scales', nargs='+', type=int, default=list(SCALES), help='detections per image')
+    parser.add_argument('--repeat', type=int, default=5, help='maximum runs per case')
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.scales, args.repeat), indent=2))
@@ -0,0 +1,79 @@
+"""
+Pipeline stage benchmarks
+run_pipeline on the images in dev_media/ and media/, timed per stage
+
+Stage timings come from the pipeline's own trace (image_decode,
+sam_encoder, mask_generation, classification, filter, nms, label_mapping,
+aggregation, ...). Model loading and the first (cold) image are reported
+separately. Weights must already be in MODEL_DIRECTORY
+(python -m src.pipeline.artifacts fetch): nothing is downloaded.
+
+    python -m benchmarks.stages --segmenter contour --limit 5
+"""
+
+import statistics
+import time
+from typing import Any, Dict, Optional
+
+from .common import image_paths, summarize
+
+
+def run(limit: Optional[int] = None, segmenter: Optional[str] = None,
+        enable_mapping: bool = True) -> Dict[str, Any]:
+    """Per-stage timings over the local images"""
+    from src.config import config
+    from src.pipeline.pipeline import get_pipeline, run_pipeline
+
+    config.MODEL_OFFLINE = True
+    paths = image_paths(limit)
+    if not paths:
+        return {'error': 'No images in dev_media/ or media/'}
+
+    load_start = time.perf_counter()
+    try:
+        get_pipeline()
+    except Exception as e:
+        return {'error': f'Models unavailable: {e}'}
+    model_load_seconds = time.perf_counter() - load_start
+
+    # The first image pays for lazy allocations; it is timed but not summarized
+    first = run_pipeline(paths[0], enable_mapping=enable_mapping, segmenter=segmenter)
+    stages: Dict[str, list] = {}
+    totals = []
+    detections = []
+    errors = 0
+    for path in paths:
+        result = run_pipeline(path, enable_mapping=enable_mapping, segmenter=segmenter)
+        if result['summary'].get('error') and result['summary']['error'] != 'No segments found':
+            errors += 1
+            continue
+        totals.append(result['processing_time'])
+        detections.append(len(result['detections']))
+        for stage, seconds in result['summary'].get('stage_timings', {}).items():
+            stages.setdefault(stage, []).append(seconds)
+
+    return {
+        'images': len(paths),
+        'errors': errors,
+        'segmenter': segmenter or config.SEGMENTER,
+        'model_load_seconds': model_load_seconds,
+        'first_image_seconds': first['processing_time'],
+        'total': summarize(totals) if totals else None,
+        'stages': {stage: summarize(seconds) for stage, seconds in stages.items()},
+        'mean_detections': statistics.fmean(detections) if detections else 0.0
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    from src.pipeline.segmenters import SEGMENTERS
+
+    parser = argparse.ArgumentParser(description='Time run_pipeline per stage on local images')
+    parser.add_argument('--limit', type=int, default=None, help='maximum number of images')
+    parser.add_argument('--segmenter', choices=SEGMENTERS, default=None)
+    parser.add_argument('--no-mapping', action='store_true', help='skip label mapping')
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.limit, args.segmenter, not args.no_mapping), indent=2, default=str))
@@ -0,0 +1,62 @@
+"""
+Startup benchmark
+Import time of the app and the pipeline entry points, in fresh interpreters
+
+Every target is imported `--runs` times, each in a new process so nothing
+is cached. The report has the median and best wall time per target and the
+heavy ML/plotting modules the import pulled in; the API (`src.app`) should
+pull in none of them, they load on the first inference or plot.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --targets src.app torch --runs 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('torch', 'torchvision', 'cv2', 'segment_anything', 'transformers', 'matplotlib', 'seaborn')
+
+TARGETS = ('src.app', 'src.pipeline.pipeline', 'src.pipeline.postprocess', 'src.pipeline.mapping')
+
+_PROBE = """
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module({target!r})
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(target: str, runs: int = 5) -> dict:
+    """Import `target` in `runs` fresh interpreters"""
+    code = _PROBE.format(target=target, heavy=HEAVY_MODULES)
+    seconds = []
+    heavy = []
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True,
+                                   text=True, check=True)
+        # The app logs to stdout during import; the probe prints last
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        seconds.append(result['seconds'])
+        heavy = result['heavy']
+    return {
+        'median_seconds': round(statistics.median(seconds), 3),
+        'best_seconds': round(min(seconds), 3),
+        'heavy_modules': heavy
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure import time of the app in fresh interpreters')
+    parser.add_argument('--targets', nargs='+', default=list(TARGETS), help='modules to import')
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per target')
+    args = parser.parse_args()
+
+    report = {target: measure(target, args.runs) for target in args.targets}
+    print(json.dumps(report, indent=2))
@@ -6,6 +6,7 @@ from flask import jsonify, make_response
 from marshmallow import ValidationError
 import traceback
 import logging
+from ...pipeline.cancellation import PipelineCancelled
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -39,6 +40,16 @@ class DatabaseAPIError(APIError):
     def __init__(self, message, details=None):
         super().__init__(message, 500, 'DATABASE_ERROR', details)
 
+class ServiceUnavailableAPIError(APIError):
+    """Server at capacity with 503 status code"""
+    def __init__(self, message, details=None):
+        super().__init__(message, 503, 'SERVICE_UNAVAILABLE', details)
+
+class TimeoutAPIError(APIError):
+    """Processing deadline exceeded with 504 status code"""
+    def __init__(self, message, details=None):
+        super().__init__(message, 504, 'PROCESSING_TIMEOUT', details)
+
 def create_error_response(error, include_details=False):
     """Create standardized error response"""
     if isinstance(error, APIError):
@@ -119,7 +130,17 @@ def handle_file_upload_error(error):
 
 def handle_ai_processing_error(error):
     """Handle AI processing specific errors"""
-    if 'models not loaded' in str(error).lower():
+    if isinstance(error, PipelineCancelled):
+        if error.reason == 'timeout':
+            return create_error_response(
+                TimeoutAPIError(
+                    'Processing timeout',
+                    f'Processing stopped at {error.stage or "a checkpoint"} after PROCESSING_TIMEOUT seconds. '
+                    'The server may be busy; try again later or with a smaller image.'
+                )
+            )
+        return create_error_response(ProcessingAPIError('Processing cancelled', str(error)))
+    elif 'models not loaded' in str(error).lower():
         return create_error_response(
             ProcessingAPIError(
                 'AI models are not available',
@@ -243,6 +264,48 @@ def validate_object_type(object_type):
     
     return object_type.strip()
 
+def validate_threshold(value, name):
+    """Validate an optional threshold between 0 and 1 (None stays None)"""
+    if value is None:
+        return None
+    
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValidationAPIError(
+            f'Invalid {name}',
+            f'{name} must be a number between 0 and 1'
+        )
+    
+    if not 0.0 <= value <= 1.0:
+        raise ValidationAPIError(
+            f'Invalid {name}',
+            f'{name} must be between 0 and 1'
+        )
+    
+    return value
+
+def validate_segmenter(segmenter, is_available=None):
+    """Validate an optional segmenter name; None selects the configured default"""
+    if not segmenter:
+        return None
+    
+    from ...pipeline.segmenters import SEGMENTERS
+    segmenter = segmenter.strip().lower()
+    if segmenter not in SEGMENTERS:
+        raise ValidationAPIError(
+            'Unknown segmenter',
+            f'Segmenter must be one of: {", ".join(SEGMENTERS)}'
+        )
+    
+    if is_available is not None and not is_available(segmenter):
+        raise ValidationAPIError(
+            'Segmenter unavailable',
+            f'The {segmenter} segmenter is not installed on this server'
+        )
+    
+    return segmenter
+
 
 
 
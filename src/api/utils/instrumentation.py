@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+"""Request Instrumentation Utility Module
+Description:
+    Flask hooks that count every request and time it per endpoint for the
+    /metrics exposition
+"""
+from flask import g, request
+import time
+from ...metrics import shared
+from ...metrics.instruments import HTTP_IN_FLIGHT, HTTP_LATENCY, HTTP_REQUESTS
+
+
+def _endpoint_label():
+    """URL rule of the current request (e.g. /api/results/<string:output_id>)
+
+    Using the rule instead of the path keeps label cardinality bounded.
+    """
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _record(status):
+    """Count and time the current request once"""
+    if getattr(g, '_metrics_recorded', True):
+        return
+    g._metrics_recorded = True
+    endpoint = _endpoint_label()
+    HTTP_REQUESTS.inc(method=request.method, endpoint=endpoint, status=str(status))
+    HTTP_LATENCY.observe(time.perf_counter() - g._metrics_start,
+                         method=request.method, endpoint=endpoint)
+
+
+def init_app(app):
+    """Register the instrumentation hooks on a Flask app"""
+
+    @app.before_request
+    def _start_request_timer():
+        g._metrics_start = time.perf_counter()
+        g._metrics_recorded = False
+        HTTP_IN_FLIGHT.inc()
+
+    @app.after_request
+    def _record_response(response):
+        _record(response.status_code)
+        shared.maybe_flush()
+        return response
+
+    @app.teardown_request
+    def _finish_request(exc):
+        if getattr(g, '_metrics_start', None) is None:
+            return
+        # after_request does not run when a view raises
+        _record(500)
+        HTTP_IN_FLIGHT.dec()
+        g._metrics_start = None
@@ -0,0 +1,232 @@
+#!/usr/bin/python3
+"""Request Profiling Utility Module
+Description:
+    Admin-only profiling of a running worker, off by default. Nothing is
+    registered on the app unless PROFILING_ENABLED is on and a
+    PROFILING_TOKEN is set, so a disabled worker pays nothing.
+
+    Per request: send `X-Profile: cprofile|pyinstrument|torch` (or
+    `?profile=...`) with `X-Profile-Token`. The request runs under that
+    profiler and the response names the saved file in `X-Profile-File`:
+        cprofile      pstats dump (.prof) for snakeviz / pstats
+        pyinstrument  HTML call tree (.html); needs `pip install pyinstrument`
+        torch         torch.profiler chrome trace (.json) of the model
+                      inference the request ran, for chrome://tracing
+
+    Whole process: SamplingProfiler samples every thread's stack for a
+    fixed time and returns collapsed stacks (flamegraph.pl, speedscope)
+"""
+import cProfile
+import hmac
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from flask import g, jsonify, make_response, request
+
+from ...config import config
+
+TOKEN_HEADER = 'X-Profile-Token'
+MODE_HEADER = 'X-Profile'
+FILE_HEADER = 'X-Profile-File'
+
+# One request profile at a time: cProfile and the torch profiler are
+# process-wide, so concurrent captures would corrupt each other
+_capture_lock = threading.Lock()
+# One sampling run at a time; each holds a request thread for its duration
+sampling_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    """Profiling is on only when enabled explicitly and protected by a token"""
+    return bool(config.PROFILING_ENABLED and config.PROFILING_TOKEN)
+
+
+def authorized() -> bool:
+    """Whether the current request carries the profiling token"""
+    supplied = request.headers.get(TOKEN_HEADER, '')
+    return enabled() and hmac.compare_digest(supplied.encode(), config.PROFILING_TOKEN.encode())
+
+
+def unauthorized():
+    return make_response(jsonify({'error': f'Profiling requires a valid {TOKEN_HEADER} header'}), 403)
+
+
+def profile_directory() -> str:
+    os.makedirs(config.PROFILING_DIRECTORY, exist_ok=True)
+    return config.PROFILING_DIRECTORY
+
+
+def _prune():
+    """Keep the newest PROFILING_MAX_FILES profiles"""
+    directory = profile_directory()
+    names = sorted(os.listdir(directory), key=lambda n: os.path.getmtime(os.path.join(directory, n)))
+    for name in names[:max(0, len(names) - config.PROFILING_MAX_FILES)]:
+        os.remove(os.path.join(directory, name))
+
+
+class _CProfileCapture:
+    extension = 'prof'
+
+    def start(self):
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stop(self, path: str):
+        self.profiler.disable()
+        self.profiler.dump_stats(path)
+
+
+class _PyinstrumentCapture:
+    extension = 'html'
+
+    def start(self):
+        from pyinstrument import Profiler
+
+        self.profiler = Profiler()
+        self.profiler.start()
+
+    def stop(self, path: str):
+        self.profiler.stop()
+        with open(path, 'w') as f:
+            f.write(self.profiler.output_html())
+
+
+class _TorchCapture:
+    """torch.profiler around the request; it records the model ops only"""
+    extension = 'json'
+
+    def start(self):
+        import torch
+
+        self.profiler = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU],
+                                               record_shapes=True)
+        self.profiler.__enter__()
+
+    def stop(self, path: str):
+        self.profiler.__exit__(None, None, None)
+        self.profiler.export_chrome_trace(path)
+
+
+CAPTURES = {
+    'cprofile': _CProfileCapture,
+    'pyinstrument': _PyinstrumentCapture,
+    'torch': _TorchCapture
+}
+
+
+def _finish_capture() -> Optional[str]:
+    """Stop the current request's profiler and save it; returns the file name"""
+    capture = getattr(g, '_profile_capture', None)
+    if capture is None:
+        return None
+    g._profile_capture = None
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}_{g._profile_mode}_{secrets.token_hex(4)}.{capture.extension}"
+    try:
+        capture.stop(os.path.join(profile_directory(), name))
+        _prune()
+    finally:
+        _capture_lock.release()
+    return name
+
+
+def init_app(app):
+    """Register the per-request profiling hooks; a no-op unless enabled()"""
+    if not enabled():
+        return
+
+    @app.before_request
+    def _start_profile():
+        mode = request.headers.get(MODE_HEADER) or request.args.get('profile')
+        if not mode:
+            return None
+        if not authorized():
+            return unauthorized()
+        if mode not in CAPTURES:
+            return make_response(jsonify({'error': f'Unknown profiler {mode!r}; expected one of {sorted(CAPTURES)}'}), 400)
+        if not _capture_lock.acquire(blocking=False):
+            return make_response(jsonify({'error': 'Another request is being profiled'}), 409)
+        capture = CAPTURES[mode]()
+        try:
+            capture.start()
+        except ImportError as e:
+            _capture_lock.release()
+            return make_response(jsonify({'error': f'Profiler {mode!r} is not installed: {e}'}), 501)
+        g._profile_capture = capture
+        g._profile_mode = mode
+        return None
+
+    @app.after_request
+    def _attach_profile(response):
+        name = _finish_capture()
+        if name:
+            response.headers[FILE_HEADER] = name
+        return response
+
+    @app.teardown_request
+    def _abandon_profile(exc):
+        # after_request does not run when a view raises
+        _finish_capture()
+
+
+class SamplingProfiler:
+    """Samples the stacks of every other thread at a fixed interval
+
+    Stacks are counted in collapsed form, one `thread;frame;frame count`
+    line per distinct stack with the root first, which flamegraph.pl and
+    speedscope read directly. Frames are `file.py:function`, so samples
+    on different lines of one function are merged.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Counter = Counter()
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        name = f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+        # The collapsed format separates frames by ';' and the count by a space
+        return name.replace(' ', '_').replace(';', '_')
+
+    def sample(self):
+        """Record one stack per thread, skipping the sampling thread"""
+        me = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f'thread-{ident}').replace(' ', '_'))
+            self.stacks[';'.join(reversed(stack))] += 1
+        self.samples += 1
+
+    def run(self, seconds: float) -> 'SamplingProfiler':
+        """Sample for `seconds` in the calling thread"""
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            self.sample()
+            time.sleep(self.interval)
+        return self
+
+    def collapsed(self) -> str:
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def list_profiles() -> Dict[str, Dict[str, float]]:
+    """Saved request profiles, newest first"""
+    directory = profile_directory()
+    entries = {}
+    for name in sorted(os.listdir(directory), key=lambda n: os.path.getmtime(os.path.join(directory, n)),
+                       reverse=True):
+        stat = os.stat(os.path.join(directory, name))
+        entries[name] = {'bytes': stat.st_size, 'created': stat.st_mtime}
+    return entries
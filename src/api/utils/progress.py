@@ -0,0 +1,292 @@
+#!/usr/bin/python3
+"""Job Progress Utility Module
+Description:
+    Progress events of background jobs (async batches), streamed to
+    clients as Server-Sent Events.
+
+    Each job is an append-only log of JSON events, one per line, in
+    <JOBS_DIRECTORY>/<job_id>.jsonl, written only by the thread running
+    the job. Readers tail the file, so a client may poll or stream from
+    any gunicorn worker, not just the one running the job. Cancelling
+    creates <job_id>.cancel, which the job checks between steps.
+
+    Events (`event` field, with a `data` object):
+        queued      job accepted: kind, total
+        started     processing began
+        uploaded    image saved: index, image_name
+        stage       pipeline stage finished: index, stage, seconds
+        counted     image done: index, result (the per-image result; images
+                    a cancelled or timed-out batch never started are
+                    counted too, with status cancelled or skipped)
+        persisted   image stored: index, result_id
+        completed / failed / cancelled   terminal: summary or error
+
+    A stream holds a request thread while it follows a job, so each worker
+    serves at most MAX_EVENT_STREAMS of them at once (open_stream) and ends
+    each after EVENT_STREAM_MAX_SECONDS; EventSource clients reconnect on
+    their own and resume with Last-Event-ID.
+
+    Jobs run on a bounded thread pool per worker process (JobRunner).
+    When the worker shuts down, their cancellation tokens are cancelled so
+    each stops at its next pipeline checkpoint, saves what it counted and
+    writes its terminal event before the pool is joined.
+"""
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from ...config import config
+from ...pipeline.cancellation import CancellationToken
+
+TERMINAL_EVENTS = ('completed', 'failed', 'cancelled')
+_JOB_ID = re.compile(r'[0-9a-f]{32}')
+
+
+def jobs_directory() -> str:
+    directory = config.JOBS_DIRECTORY or os.path.join(tempfile.gettempdir(), 'objdetect-jobs')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """One event in text/event-stream framing; `id` lets clients resume"""
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+class Job:
+    """One background job's event log"""
+
+    def __init__(self, job_id: str, directory: Optional[str] = None):
+        self.id = job_id
+        directory = directory or jobs_directory()
+        self.path = os.path.join(directory, f'{job_id}.jsonl')
+        self.cancel_path = os.path.join(directory, f'{job_id}.cancel')
+        self._last_id = 0
+
+    def publish(self, event: str, **data: Any) -> Dict[str, Any]:
+        """Append an event (only from the thread running the job)"""
+        self._last_id += 1
+        record = {'id': self._last_id, 'event': event, 'time': time.time(), 'data': data}
+        # One short write to an O_APPEND file; readers only take whole lines
+        with open(self.path, 'a') as log:
+            log.write(json.dumps(record) + '\n')
+        return record
+
+    def read(self, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """Events written after byte `offset`, and the offset to continue from"""
+        try:
+            with open(self.path, 'rb') as log:
+                log.seek(offset)
+                chunk = log.read()
+        except FileNotFoundError:
+            return [], offset
+        complete = chunk[:chunk.rfind(b'\n') + 1]
+        events = [json.loads(line) for line in complete.splitlines() if line]
+        return events, offset + len(complete)
+
+    def events(self, after: int = 0) -> List[Dict[str, Any]]:
+        """All events with an id greater than `after`"""
+        return [event for event in self.read()[0] if event['id'] > after]
+
+    def cancel(self) -> bool:
+        """Ask the job to stop; False if it has already finished"""
+        if self.status()['finished']:
+            return False
+        open(self.cancel_path, 'a').close()
+        return True
+
+    def cancelled(self) -> bool:
+        return os.path.exists(self.cancel_path)
+
+    def status(self) -> Dict[str, Any]:
+        """The job folded from its events: status, counts and results so far"""
+        state = {'job_id': self.id, 'status': 'queued', 'finished': False, 'kind': None,
+                 'total': 0, 'processed': 0, 'successful': 0, 'failed': 0, 'results': {},
+                 'created_at': None, 'updated_at': None}
+        for event in self.read()[0]:
+            name, data = event['event'], event['data']
+            state['created_at'] = state['created_at'] or event['time']
+            state['updated_at'] = event['time']
+            if name == 'queued':
+                state.update(kind=data.get('kind'), total=data.get('total', 0))
+            elif name == 'started':
+                state['status'] = 'running'
+            elif name == 'counted':
+                state['processed'] += 1
+                state['successful' if data['result'].get('success') else 'failed'] += 1
+                state['results'][data['index']] = data['result']
+            elif name == 'persisted' and data['index'] in state['results']:
+                state['results'][data['index']]['result_id'] = data['result_id']
+            elif name in TERMINAL_EVENTS:
+                state.update(status=name, finished=True)
+                if name == 'failed':
+                    state['error'] = data.get('error')
+        state['results'] = [state['results'][index] for index in sorted(state['results'])]
+        state['cancel_requested'] = self.cancelled()
+        return state
+
+    def stream(self, after: int = 0) -> Iterator[str]:
+        """SSE text of the events after `after`, following the log until the job ends
+
+        Sends a comment every PROGRESS_HEARTBEAT seconds so proxies keep the
+        connection open, gives up if the job writes nothing for
+        BATCH_PROCESSING_TIMEOUT seconds (e.g. its worker was killed) and
+        ends after EVENT_STREAM_MAX_SECONDS so clients reconnect.
+        """
+        offset = 0
+        last_sent = last_event = started = time.monotonic()
+        # Reconnect after a second when this stream ends before the job
+        yield 'retry: 1000\n\n'
+        while True:
+            events, offset = self.read(offset)
+            for event in events:
+                last_event = time.monotonic()
+                if event['id'] <= after:
+                    continue
+                last_sent = last_event
+                yield format_sse(event)
+                if event['event'] in TERMINAL_EVENTS:
+                    return
+            now = time.monotonic()
+            if now - last_event > config.BATCH_PROCESSING_TIMEOUT:
+                yield ': job stalled\n\n'
+                return
+            if now - started >= config.EVENT_STREAM_MAX_SECONDS:
+                yield ': reconnect\n\n'
+                return
+            if now - last_sent >= config.PROGRESS_HEARTBEAT:
+                last_sent = now
+                yield ': keep-alive\n\n'
+            time.sleep(config.PROGRESS_POLL_INTERVAL)
+
+
+_open_streams = 0
+_streams_lock = threading.Lock()
+
+
+def open_stream() -> bool:
+    """Take one of this process's MAX_EVENT_STREAMS; False when all are open"""
+    global _open_streams
+    with _streams_lock:
+        if _open_streams >= config.MAX_EVENT_STREAMS:
+            return False
+        _open_streams += 1
+        return True
+
+
+def close_stream() -> None:
+    """Give back a stream taken with open_stream()"""
+    global _open_streams
+    with _streams_lock:
+        _open_streams = max(0, _open_streams - 1)
+
+
+def create_job(kind: str, total: int) -> Job:
+    """A new job with its 'queued' event written; prunes expired jobs"""
+    prune()
+    job = Job(uuid.uuid4().hex)
+    job.publish('queued', kind=kind, total=total)
+    return job
+
+
+def get_job(job_id: str) -> Optional[Job]:
+    """The job with this id, or None (ids are checked, never used as paths as given)"""
+    if not _JOB_ID.fullmatch(job_id or ''):
+        return None
+    job = Job(job_id)
+    return job if os.path.exists(job.path) else None
+
+
+def prune(max_age: Optional[float] = None) -> int:
+    """Delete the files of jobs untouched for JOB_RETENTION_SECONDS"""
+    max_age = config.JOB_RETENTION_SECONDS if max_age is None else max_age
+    directory = jobs_directory()
+    cutoff = time.time() - max_age
+    removed = 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.unlink(path)
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
+
+
+class JobRunner:
+    """Bounded pool running this worker process's background jobs
+
+    Non-daemon threads: shutdown() cancels the running and queued jobs and
+    waits for them, so none is cut off halfway through persisting.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.capacity = max(1, workers) + max(0, queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._tokens: Dict[str, CancellationToken] = {}
+        self._closed = False
+
+    def submit(self, job: Job, target: Callable[..., None], *args: Any) -> bool:
+        """Run target(*args, cancel_token=token) for the job; False when full
+
+        The token fires when the job is cancelled (DELETE /api/jobs/<id>)
+        or the runner shuts down.
+        """
+        with self._lock:
+            if self._closed or len(self._tokens) >= self.capacity:
+                return False
+            token = CancellationToken(is_cancelled=job.cancelled)
+            self._tokens[job.id] = token
+        self._executor.submit(self._run, job.id, target, args, token)
+        return True
+
+    def _run(self, job_id: str, target: Callable[..., None], args: Tuple, token: CancellationToken) -> None:
+        try:
+            target(*args, cancel_token=token)
+        finally:
+            with self._lock:
+                self._tokens.pop(job_id, None)
+
+    def active(self) -> int:
+        """Jobs running or waiting for a thread"""
+        with self._lock:
+            return len(self._tokens)
+
+    def shutdown(self) -> None:
+        """Refuse new jobs, cancel the current ones and wait for them to end"""
+        with self._lock:
+            self._closed = True
+            tokens = list(self._tokens.values())
+        for token in tokens:
+            token.cancel()
+        self._executor.shutdown(wait=True)
+
+
+_runner: Optional[JobRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_runner() -> JobRunner:
+    """This process's job runner, sized from JOB_WORKERS/JOB_QUEUE_SIZE"""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner(config.JOB_WORKERS, config.JOB_QUEUE_SIZE)
+        return _runner
+
+
+def shutdown_jobs() -> None:
+    """Cancel and drain this process's jobs (gunicorn worker_exit)"""
+    global _runner
+    with _runner_lock:
+        runner, _runner = _runner, None
+    if runner is not None:
+        runner.shutdown()
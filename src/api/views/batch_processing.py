@@ -3,22 +3,28 @@
 Batch Processing Views module
 """
 from flask_restful import Resource
-from flask import request, jsonify, make_response
-from ...storage import database, Input, Output, ObjectType
+from flask import request, jsonify, make_response, current_app
+from werkzeug.datastructures import FileStorage
+from ...storage import database, Input, Output, ObjectType, Detection
 from ..utils.image_utils import upload_image
 from ...config import config
 from ...pipeline.pipeline import pipeline
+from ...pipeline.cancellation import CancellationToken, PipelineCancelled
+from ...pipeline.tracing import on_stage
 from .monitoring import monitoring
+from ..utils import progress
 from ..utils.error_handlers import (
     create_error_response, handle_file_upload_error, handle_ai_processing_error,
-    handle_database_error, validate_object_type, ValidationAPIError, 
-    ProcessingAPIError, DatabaseAPIError
+    handle_database_error, validate_object_type, validate_segmenter, ValidationAPIError, 
+    ProcessingAPIError, DatabaseAPIError, ServiceUnavailableAPIError
 )
+import io
 import os
 import uuid
 import time
+from contextlib import nullcontext
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 
 class BatchProcessing(Resource):
     """Handle batch processing of multiple images"""
@@ -50,6 +56,22 @@ class BatchProcessing(Resource):
             type: boolean
             required: false
             description: Whether to use auto-detection (default: false)
+          - in: formData
+            name: segmenter
+            type: string
+            enum: [sam, mobile_sam, contour]
+            required: false
+            description: Segmenter for every image in the batch (default SEGMENTER)
+          - in: formData
+            name: include_timings
+            type: boolean
+            required: false
+            description: Add per-stage pipeline timings (stage_timings) to each image result
+          - in: formData
+            name: async
+            type: boolean
+            required: false
+            description: Run in the background and answer 202 with a job id; follow it at /api/jobs/{job_id}/events (SSE) or /api/jobs/{job_id}
         responses:
           200:
             description: Batch processing completed
@@ -66,6 +88,12 @@ class BatchProcessing(Resource):
                   type: integer
                 failed_images:
                   type: integer
+                timed_out_images:
+                  type: integer
+                  description: Images stopped by PROCESSING_TIMEOUT or not started before BATCH_PROCESSING_TIMEOUT
+                cancelled_images:
+                  type: integer
+                  description: Images not started because the job was cancelled
                 processing_time:
                   type: number
                 results:
@@ -89,6 +117,20 @@ class BatchProcessing(Resource):
                         type: number
                       error:
                         type: string
+                      timed_out:
+                        type: boolean
+                        description: The image failed because a processing deadline passed
+                      status:
+                        type: string
+                        enum: [cancelled, skipped]
+                        description: Only for images never started; cancelled with the job, or skipped once BATCH_PROCESSING_TIMEOUT passed
+                      stage_timings:
+                        type: object
+                        description: Seconds spent per pipeline stage (only with include_timings=true)
+          202:
+            description: Batch queued as a background job (async=true); job_id, status_url and events_url
+          503:
+            description: Background job queue full (async=true); retry after the Retry-After header
           400:
             description: Bad request
           500:
@@ -101,6 +143,7 @@ class BatchProcessing(Resource):
             # Validate object type
             object_type = request.form.get('object_type')
             auto_detect = request.form.get('auto_detect', 'false').lower() == 'true'
+            include_timings = request.values.get('include_timings', 'false').lower() == 'true'
             description = request.form.get('description', f'Batch processing {object_type} objects')
             
             if not auto_detect:
@@ -109,6 +152,11 @@ class BatchProcessing(Resource):
                 except ValidationAPIError as e:
                     return create_error_response(e)
             
+            try:
+                segmenter = validate_segmenter(request.values.get('segmenter'), pipeline.segmenter_available)
+            except ValidationAPIError as e:
+                return create_error_response(e)
+            
             # Get uploaded files
             if 'images[]' not in request.files:
                 return create_error_response(
@@ -136,46 +184,28 @@ class BatchProcessing(Resource):
                     )
                 )
             
-            print(f"Starting batch processing: {len(files)} images, batch_id: {batch_id}")
-            
-            # Process each image
-            results = []
-            successful_count = 0
-            failed_count = 0
-            
-            for i, file in enumerate(files):
-                image_result = self._process_single_image(
-                    file, object_type, description, auto_detect, i + 1, len(files)
-                )
-                results.append(image_result)
-                
-                if image_result['success']:
-                    successful_count += 1
-                else:
-                    failed_count += 1
+            options = {
+                'object_type': object_type,
+                'description': description,
+                'auto_detect': auto_detect,
+                'segmenter': segmenter,
+                'include_timings': include_timings
+            }
             
-            # Calculate total processing time
-            total_processing_time = time.time() - batch_start_time
+            if request.values.get('async', 'false').lower() == 'true':
+                return self._start_job(files, options)
             
-            # Record batch metrics
-            monitoring.record_request(
-                f"{object_type}_batch" if not auto_detect else "auto_detect_batch",
-                total_processing_time,
-                successful_count > 0
-            )
+            print(f"Starting batch processing: {len(files)} images, batch_id: {batch_id}")
+            results = self._run_batch(files, **options)
             
             response_data = {
                 'success': True,
                 'batch_id': batch_id,
-                'total_images': len(files),
-                'successful_images': successful_count,
-                'failed_images': failed_count,
-                'processing_time': round(total_processing_time, 3),
+                **self._finish_batch(results, len(files), batch_start_time, object_type, auto_detect),
                 'results': results,
                 'created_at': datetime.now().isoformat()
             }
             
-            print(f"Batch processing completed: {successful_count}/{len(files)} successful")
             return make_response(jsonify(response_data), 200)
             
         except Exception as e:
@@ -188,9 +218,171 @@ class BatchProcessing(Resource):
             print(f"Batch processing failed: {str(e)}")
             return create_error_response(e, include_details=True)
     
+    def _start_job(self, files, options: Dict[str, Any]):
+        """Queue the batch on the job runner and answer 202 with its job id
+
+        The uploads are copied into memory first: the request's files are
+        closed once this response is sent. Answers 503 when the runner
+        already holds JOB_WORKERS + JOB_QUEUE_SIZE jobs.
+        """
+        runner = progress.get_runner()
+        if runner.active() >= runner.capacity:
+            return self._jobs_busy()
+        job = progress.create_job('batch', total=len(files))
+        copies = [FileStorage(stream=io.BytesIO(file.read()), filename=file.filename,
+                              content_type=file.mimetype) for file in files]
+        if not runner.submit(job, self._run_job, current_app._get_current_object(), job, copies, options):
+            # Filled up since the check above
+            job.publish('failed', error='Job queue full')
+            return self._jobs_busy()
+        
+        print(f"Queued batch job {job.id}: {len(files)} images")
+        return make_response(jsonify({
+            'success': True,
+            'job_id': job.id,
+            'batch_id': job.id,
+            'status': 'queued',
+            'total_images': len(files),
+            'status_url': f'/api/jobs/{job.id}',
+            'events_url': f'/api/jobs/{job.id}/events'
+        }), 202)
+    
+    def _jobs_busy(self):
+        response = create_error_response(ServiceUnavailableAPIError(
+            'Too many background jobs',
+            'This worker already runs or queues JOB_WORKERS + JOB_QUEUE_SIZE jobs; retry later'
+        ))
+        response.headers['Retry-After'] = '5'
+        return response
+    
+    def _run_job(self, app, job: progress.Job, files, options: Dict[str, Any],
+                 cancel_token: Optional[CancellationToken] = None) -> None:
+        """Body of a background batch job; every outcome ends in a terminal event"""
+        batch_start_time = time.time()
+        with app.app_context():
+            try:
+                job.publish('started')
+                results = self._run_batch(files, job=job, cancel_token=cancel_token, **options)
+                summary = self._finish_batch(results, len(files), batch_start_time,
+                                             options['object_type'], options['auto_detect'])
+                cancelled = cancel_token is not None and cancel_token.reason() == 'cancelled'
+                job.publish('cancelled' if cancelled else 'completed', **summary)
+            except Exception as e:
+                print(f"Batch job {job.id} failed: {str(e)}")
+                job.publish('failed', error=str(e))
+            finally:
+                # Release this thread's database session
+                database.close()
+    
+    def _run_batch(self, files, object_type: str, description: str, auto_detect: bool,
+                   segmenter: Optional[str], include_timings: bool,
+                   job: Optional[progress.Job] = None,
+                   cancel_token: Optional[CancellationToken] = None) -> List[Dict[str, Any]]:
+        """Process every image, then persist the successful ones in one transaction
+
+        The batch has a BATCH_PROCESSING_TIMEOUT deadline and each image a
+        PROCESSING_TIMEOUT one within it; a run past either stops at its
+        next pipeline checkpoint. Once the batch deadline passes, the images
+        not yet started fail with timed_out (status 'skipped') and those
+        counted are still saved. With a job, progress is published as it
+        happens, and when cancel_token (the job's) is cancelled the batch
+        stops the same way, the rest failing with status 'cancelled'. Either
+        way every input image has a result.
+        """
+        results = []
+        staged = []
+        batch_token = CancellationToken(config.BATCH_PROCESSING_TIMEOUT, parent=cancel_token)
+        
+        for i, file in enumerate(files):
+            reason = batch_token.reason()
+            if reason:
+                print(f"Batch {'cancelled' if reason == 'cancelled' else 'timed out'} "
+                      f"after {i}/{len(files)} images")
+                for index in range(i, len(files)):
+                    results.append(self._not_started(files[index], reason))
+                    if job:
+                        job.publish('counted', index=index, result=results[-1])
+                break
+            
+            # Report each pipeline stage of this image as it finishes
+            stage_events = nullcontext()
+            if job:
+                stage_events = on_stage(lambda stage, seconds, index=i: job.publish(
+                    'stage', index=index, stage=stage, seconds=round(seconds, 6)))
+            with stage_events:
+                image_result, record = self._process_single_image(
+                    file, object_type, description, auto_detect, i + 1, len(files), segmenter, job,
+                    batch_token.child(config.PROCESSING_TIMEOUT)
+                )
+            results.append(image_result)
+            if record:
+                staged.append((i, record))
+                if include_timings:
+                    image_result['stage_timings'] = record['stage_timings']
+            if job:
+                job.publish('counted', index=i, result=image_result)
+        
+        # Persist the whole batch in one transaction
+        self._persist_batch(staged, results, job)
+        return results
+    
+    def _not_started(self, file, reason: str) -> Dict[str, Any]:
+        """Result of an image the batch stopped before ('cancelled' or 'timeout')"""
+        if reason == 'cancelled':
+            return {
+                'image_name': file.filename or 'unknown',
+                'success': False,
+                'status': 'cancelled',
+                'error': 'Batch was cancelled before this image was processed',
+                'processing_time': 0
+            }
+        return {
+            'image_name': file.filename or 'unknown',
+            'success': False,
+            'status': 'skipped',
+            'error': 'Batch exceeded BATCH_PROCESSING_TIMEOUT before this image was processed',
+            'timed_out': True,
+            'processing_time': 0
+        }
+    
+    def _finish_batch(self, results: List[Dict[str, Any]], total_images: int, batch_start_time: float,
+                      object_type: str, auto_detect: bool) -> Dict[str, Any]:
+        """Record the batch metrics and summarize it"""
+        successful_count = sum(1 for r in results if r['success'])
+        failed_count = len(results) - successful_count
+        timed_out_count = sum(1 for r in results if r.get('timed_out'))
+        cancelled_count = sum(1 for r in results if r.get('status') == 'cancelled')
+        
+        # Calculate total processing time
+        total_processing_time = time.time() - batch_start_time
+        
+        # Record batch metrics
+        monitoring.record_request(
+            f"{object_type}_batch" if not auto_detect else "auto_detect_batch",
+            total_processing_time,
+            successful_count > 0
+        )
+        
+        print(f"Batch processing completed: {successful_count}/{total_images} successful")
+        return {
+            'total_images': total_images,
+            'successful_images': successful_count,
+            'failed_images': failed_count,
+            'timed_out_images': timed_out_count,
+            'cancelled_images': cancelled_count,
+            'processing_time': round(total_processing_time, 3)
+        }
+    
     def _process_single_image(self, file, object_type: str, description: str, 
-                            auto_detect: bool, image_index: int, total_images: int) -> Dict[str, Any]:
-        """Process a single image within the batch"""
+                            auto_detect: bool, image_index: int, total_images: int,
+                            segmenter: Optional[str] = None,
+                            job: Optional[progress.Job] = None,
+                            cancel_token: Optional[CancellationToken] = None) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """Process a single image within the batch
+
+        Returns the per-image result and, on success, the staged database
+        record that _persist_batch writes once the whole batch is done
+        """
         image_start_time = time.time()
         
         try:
@@ -201,7 +393,7 @@ class BatchProcessing(Resource):
                     'success': False,
                     'error': 'No file selected',
                     'processing_time': 0
-                }
+                }, None
             
             # Check file extension
             allowed_extensions = {'png', 'jpg', 'jpeg', 'bmp', 'gif'}
@@ -211,7 +403,7 @@ class BatchProcessing(Resource):
                     'success': False,
                     'error': 'Invalid file type. Please upload a valid image file (PNG, JPG, JPEG, BMP, GIF)',
                     'processing_time': 0
-                }
+                }, None
             
             # Check file size (10MB limit)
             file.seek(0, 2)  # Seek to end
@@ -224,15 +416,18 @@ class BatchProcessing(Resource):
                     'success': False,
                     'error': 'File too large. Please upload an image smaller than 10MB',
                     'processing_time': 0
-                }
+                }, None
             
             print(f"  Processing image {image_index}/{total_images}: {file.filename}")
             
             # Create a temporary request object for upload_image
             from flask import Request
             temp_request = Request.from_values(
-                files={'image': file},
-                form={'object_type': object_type, 'description': description}
+                data={
+                    'image': (file.stream, file.filename, file.mimetype),
+                    'object_type': object_type,
+                    'description': description
+                }
             )
             
             # Upload image
@@ -244,25 +439,28 @@ class BatchProcessing(Resource):
                         'success': False,
                         'error': 'Failed to upload image',
                         'processing_time': 0
-                    }
+                    }, None
             except Exception as e:
                 return {
                     'image_name': file.filename,
                     'success': False,
                     'error': f'Upload failed: {str(e)}',
                     'processing_time': 0
-                }
+                }, None
             
             image_filename = image_result
             image_path = os.path.join('media', image_filename)
             fs_image_path = os.path.join(config.MEDIA_DIRECTORY, image_filename)
+            if job:
+                job.publish('uploaded', index=image_index - 1, image_name=file.filename)
             
             # Process image with AI pipeline
             try:
                 if auto_detect:
-                    ai_result = pipeline.process_image_auto(fs_image_path)
+                    ai_result = pipeline.process_image_auto(fs_image_path, segmenter, cancel_token=cancel_token)
                 else:
-                    ai_result = pipeline.process_image(fs_image_path, object_type)
+                    ai_result = pipeline.process_image(fs_image_path, object_type, segmenter,
+                                                       cancel_token=cancel_token)
                 
                 if not ai_result.get('success', False):
                     return {
@@ -270,83 +468,59 @@ class BatchProcessing(Resource):
                         'success': False,
                         'error': f'AI processing failed: {ai_result.get("error", "Unknown error")}',
                         'processing_time': time.time() - image_start_time
-                    }
-            except Exception as e:
+                    }, None
+            except PipelineCancelled as e:
+                print(f"   Image {image_index}/{total_images} stopped: {str(e)}")
                 return {
                     'image_name': file.filename,
                     'success': False,
-                    'error': f'AI processing failed: {str(e)}',
-                    'processing_time': time.time() - image_start_time
-                }
-            
-            # Create database records
-            try:
-                # Create input record
-                input_data = {
-                    'description': f"{description} - {file.filename}",
-                    'image_path': image_path
-                }
-                new_input = Input(**input_data)
-                new_input.save()
-                
-                # Get or create object type
-                if not auto_detect:
-                    object_type_record = database.get(ObjectType, name=object_type)
-                    if not object_type_record:
-                        object_type_record = ObjectType(
-                            name=object_type,
-                            description=f'Object type for {object_type}'
-                        )
-                        object_type_record.save()
-                else:
-                    # For auto-detect, use the detected object type
-                    detected_type = ai_result.get('object_type', 'unknown')
-                    object_type_record = database.get(ObjectType, name=detected_type)
-                    if not object_type_record:
-                        object_type_record = ObjectType(
-                            name=detected_type,
-                            description=f'Auto-detected object type: {detected_type}'
-                        )
-                        object_type_record.save()
-                
-                # Create output record
-                output_data = {
-                    'predicted_count': ai_result.get('predicted_count', 0),
-                    'pred_confidence': ai_result.get('confidence', 0.0),
-                    'object_type_id': object_type_record.id,
-                    'input_id': new_input.id
-                }
-                new_output = Output(**output_data)
-                new_output.save()
-                
+                    'error': str(e),
+                    'timed_out': e.reason == 'timeout',
+                    'processing_time': round(time.time() - image_start_time, 3)
+                }, None
             except Exception as e:
                 return {
                     'image_name': file.filename,
                     'success': False,
-                    'error': f'Database operation failed: {str(e)}',
+                    'error': f'AI processing failed: {str(e)}',
                     'processing_time': time.time() - image_start_time
-                }
+                }, None
+            
+            # Stage database records (written later by _persist_batch)
+            if not auto_detect:
+                record_type = object_type
+                type_description = f'Object type for {object_type}'
+                metrics_label = object_type
+            else:
+                # For auto-detect, use the detected object type
+                record_type = ai_result.get('object_type', 'unknown')
+                type_description = f'Auto-detected object type: {record_type}'
+                metrics_label = f"{record_type}_auto"
             
-            # Record individual image metrics
             processing_time = time.time() - image_start_time
-            monitoring.record_request(
-                object_type if not auto_detect else f"{ai_result.get('object_type', 'unknown')}_auto",
-                processing_time,
-                True
-            )
+            record = {
+                'description': f"{description} - {file.filename}",
+                'image_path': image_path,
+                'object_type': record_type,
+                'object_type_description': type_description,
+                'metrics_label': metrics_label,
+                'predicted_count': ai_result.get('predicted_count', 0),
+                'pred_confidence': ai_result.get('confidence', 0.0),
+                'processing_time': processing_time,
+                'stage_timings': ai_result.get('stage_timings', {}),
+                'detections': ai_result.get('detections', [])
+            }
             
             print(f"  Image {image_index}/{total_images} processed successfully: {ai_result.get('predicted_count', 0)} objects")
             
             return {
                 'image_name': file.filename,
                 'success': True,
-                'result_id': str(new_output.id),
                 'object_type': ai_result.get('object_type', object_type),
                 'predicted_count': ai_result.get('predicted_count', 0),
                 'confidence': ai_result.get('confidence', 0.0),
-                'processing_time': round(processing_time, 3),
-                'created_at': new_output.created_at.isoformat() if hasattr(new_output, 'created_at') else None
-            }
+                'processing_time': round(processing_time, 3)
+            }, record
             
         except Exception as e:
             processing_time = time.time() - image_start_time
@@ -356,7 +530,75 @@ class BatchProcessing(Resource):
                 'success': False,
                 'error': f'Unexpected error: {str(e)}',
                 'processing_time': round(processing_time, 3)
-            }
+            }, None
+    
+    def _persist_batch(self, staged: List[Tuple[int, Dict[str, Any]]], results: List[Dict[str, Any]],
+                       job: Optional[progress.Job] = None) -> None:
+        """Write the Input/Output/Detection rows of every successful image in one commit
+
+        Rows are bulk inserted in a single executemany per table. If that
+        fails, each image is retried in its own savepoint so a bad row only
+        fails its own image instead of the whole batch.
+        """
+        if not staged:
+            return
+        
+        rows = {}
+        with database.unit_of_work():
+            for index, record in staged:
+                object_type_record = database.get_object_type(name=record['object_type'])
+                if not object_type_record:
+                    object_type_record = ObjectType(
+                        name=record['object_type'],
+                        description=record['object_type_description']
+                    )
+                    object_type_record.save()
+                
+                new_input = Input(
+                    description=record['description'],
+                    image_path=record['image_path']
+                )
+                new_output = Output(
+                    predicted_count=record['predicted_count'],
+                    pred_confidence=record['pred_confidence'],
+                    object_type_id=object_type_record.id,
+                    input_id=new_input.id
+                )
+                rows[index] = (new_input, new_output,
+                               *Detection.from_records(new_output.id, record['detections']))
+            
+            try:
+                with database.savepoint():
+                    # Grouped by table, so each table is one executemany
+                    database.bulk_save([image_rows[0] for image_rows in rows.values()] +
+                                       [image_rows[1] for image_rows in rows.values()] +
+                                       [row for image_rows in rows.values() for row in image_rows[2:]])
+            except Exception as e:
+                print(f"  Bulk insert failed, retrying image by image: {str(e)}")
+                for index, image_rows in list(rows.items()):
+                    try:
+                        with database.savepoint():
+                            database.bulk_save(list(image_rows))
+                    except Exception as e:
+                        results[index] = {
+                            'image_name': results[index]['image_name'],
+                            'success': False,
+                            'error': f'Database operation failed: {str(e)}',
+                            'processing_time': results[index]['processing_time']
+                        }
+                        del rows[index]
+        
+        # Record individual image metrics once the rows are committed
+        for index, record in staged:
+            if index not in rows:
+                continue
+            new_output = rows[index][1]
+            results[index]['result_id'] = str(new_output.id)
+            results[index]['created_at'] = new_output.created_at.isoformat()
+            if job:
+                job.publish('persisted', index=index, result_id=str(new_output.id))
+            monitoring.record_request(record['metrics_label'], record['processing_time'], True,
+                                      stage_timings=record['stage_timings'])
 
 class BatchStatus(Resource):
     """Get batch processing status and statistics"""
@@ -372,21 +614,14 @@ class BatchStatus(Resource):
             description: Batch processing statistics
         """
         try:
-            # Get recent batch processing statistics
-            outputs = database.all(Output) if database.all(Output) else []
-            
-            # Calculate batch statistics (last 24 hours)
-            recent_outputs = []
-            for output in outputs:
-                if hasattr(output, 'created_at'):
-                    # Simple check for recent activity
-                    recent_outputs.append(output)
+            # Outputs created in the last 24 hours, counted in SQL
+            db_stats = database.summary_stats(window_hours=24, max_age=config.STATS_CACHE_TTL)
             
             # Get performance metrics
             metrics = monitoring.get_metrics()
             
             stats = {
-                'total_processed_today': len(recent_outputs),
+                'total_processed_today': db_stats['recent_outputs'],
                 'average_processing_time': metrics.get('average_processing_time', 0),
                 'success_rate': metrics.get('success_rate_percent', 0),
                 'total_requests': metrics.get('total_requests', 0),
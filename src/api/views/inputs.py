@@ -3,18 +3,19 @@
 Input Views module
 """
 from flask_restful import Resource
-from ...storage import database, Input, Output, ObjectType
+from ...storage import database, Input, Output, ObjectType, Detection
 from ..serializers.inputs import InputSchema
 from marshmallow import ValidationError, EXCLUDE
 from flask import request, jsonify, make_response
 from ..utils.image_utils import upload_image
 from ...config import config
 from ...pipeline.pipeline import pipeline
+from ...pipeline.cancellation import CancellationToken, PipelineCancelled
 from .monitoring import monitoring
 from ..utils.error_handlers import (
     create_error_response, handle_file_upload_error, handle_ai_processing_error,
     handle_database_error, validate_file_upload, validate_object_type,
-    ValidationAPIError, ProcessingAPIError, DatabaseAPIError
+    validate_segmenter, ValidationAPIError, ProcessingAPIError, DatabaseAPIError
 )
 import os
 import uuid
@@ -75,6 +76,17 @@ class InputList(Resource):
             type: string
             required: false
             description: Optional description
+          - in: formData
+            name: segmenter
+            type: string
+            enum: [sam, mobile_sam, contour]
+            required: false
+            description: Segmenter for this image (default SEGMENTER); contour is fastest, for simple scenes
+          - in: query
+            name: include_timings
+            type: boolean
+            required: false
+            description: Add the per-stage pipeline timings (stage_timings) to the response
         responses:
           201:
             description: Image processed successfully
@@ -97,10 +109,15 @@ class InputList(Resource):
                   type: string
                 created_at:
                   type: string
+                stage_timings:
+                  type: object
+                  description: Seconds spent per pipeline stage (only with include_timings=true)
           400:
             description: Bad request or processing error
           500:
             description: Internal server error
+          504:
+            description: Processing exceeded PROCESSING_TIMEOUT (including the wait for a free inference slot)
         """
         try:
             # Validate file upload
@@ -115,6 +132,7 @@ class InputList(Resource):
             
             try:
                 object_type = validate_object_type(object_type)
+                segmenter = validate_segmenter(request.values.get('segmenter'), pipeline.segmenter_available)
             except ValidationAPIError as e:
                 return create_error_response(e)
             
@@ -135,7 +153,8 @@ class InputList(Resource):
             # Process image with AI pipeline
             print(f"Processing image: {image_path} for object type: {object_type}")
             try:
-                ai_result = pipeline.process_image(fs_image_path, object_type)
+                ai_result = pipeline.process_image(fs_image_path, object_type, segmenter,
+                                                   cancel_token=CancellationToken(config.PROCESSING_TIMEOUT))
                 
                 if not ai_result.get('success', False):
                     return handle_ai_processing_error(
@@ -144,32 +163,37 @@ class InputList(Resource):
             except Exception as e:
                 return handle_ai_processing_error(e)
             
-            # Create input record
-            input_data = {
-                'description': description,
-                'image_path': image_path
-            }
-            new_input = Input(**input_data)
-            new_input.save()
-            
-            # Get or create object type
-            object_type_record = database.get(ObjectType, name=object_type)
-            if not object_type_record:
-                object_type_record = ObjectType(
-                    name=object_type,
-                    description=f'Object type for {object_type}'
-                )
-                object_type_record.save()
-            
-            # Create output record
-            output_data = {
-                'predicted_count': ai_result.get('predicted_count', 0),
-                'pred_confidence': ai_result.get('confidence', 0.0),
-                'object_type_id': object_type_record.id,
-                'input_id': new_input.id
-            }
-            new_output = Output(**output_data)
-            new_output.save()
+            # Persist input, object type, output and detections in a single commit
+            with database.unit_of_work():
+                # Create input record
+                input_data = {
+                    'description': description,
+                    'image_path': image_path
+                }
+                new_input = Input(**input_data)
+                new_input.save()
+                
+                # Get or create object type
+                object_type_record = database.get_object_type(name=object_type)
+                if not object_type_record:
+                    object_type_record = ObjectType(
+                        name=object_type,
+                        description=f'Object type for {object_type}'
+                    )
+                    object_type_record.save()
+                
+                # Create output record
+                output_data = {
+                    'predicted_count': ai_result.get('predicted_count', 0),
+                    'pred_confidence': ai_result.get('confidence', 0.0),
+                    'object_type_id': object_type_record.id,
+                    'input_id': new_input.id
+                }
+                new_output = Output(**output_data)
+                new_output.save()
+                
+                # Per-segment results, so recounts need no re-inference
+                database.bulk_save(Detection.from_records(new_output.id, ai_result.get('detections', [])))
             
             # Prepare response
             response_data = {
@@ -182,11 +206,14 @@ class InputList(Resource):
                 'image_path': image_path,
                 'created_at': new_output.created_at.isoformat() if hasattr(new_output, 'created_at') else None
             }
+            if request.values.get('include_timings', 'false').lower() == 'true':
+                response_data['stage_timings'] = ai_result.get('stage_timings', {})
             
             # Record performance metrics
             processing_time = ai_result.get('processing_time', 0.0)
             success = ai_result.get('success', True)
-            monitoring.record_request(object_type, processing_time, success)
+            monitoring.record_request(object_type, processing_time, success,
+                                      stage_timings=ai_result.get('stage_timings'))
             
             print(f"Successfully processed image: {ai_result.get('predicted_count', 0)} {object_type}s detected")
             return make_response(jsonify(response_data), 201)
@@ -219,6 +246,17 @@ class InputList(Resource):
             type: string
             required: false
             description: Optional description
+          - in: formData
+            name: segmenter
+            type: string
+            enum: [sam, mobile_sam, contour]
+            required: false
+            description: Segmenter for this image (default SEGMENTER); contour is fastest, for simple scenes
+          - in: query
+            name: include_timings
+            type: boolean
+            required: false
+            description: Add the per-stage pipeline timings (stage_timings) to the response
         responses:
           201:
             description: Image processed successfully with all objects detected
@@ -241,10 +279,15 @@ class InputList(Resource):
                   type: string
                 created_at:
                   type: string
+                stage_timings:
+                  type: object
+                  description: Seconds spent per pipeline stage (only with include_timings=true)
           400:
             description: Bad request or processing error
           500:
             description: Internal server error
+          504:
+            description: Processing exceeded PROCESSING_TIMEOUT (including the wait for a free inference slot)
         """
         try:
             # Check if image file is present
@@ -262,6 +305,11 @@ class InputList(Resource):
                     'error': 'object_type is required'
                 }), 400)
             
+            try:
+                segmenter = validate_segmenter(request.values.get('segmenter'), pipeline.segmenter_available)
+            except ValidationAPIError as e:
+                return create_error_response(e)
+            
             # Upload image
             image_result = upload_image(request)
             if isinstance(image_result, tuple):  # Error response
@@ -273,39 +321,48 @@ class InputList(Resource):
             
             # Process image with AI pipeline (auto-detection)
             print(f"Auto-detecting objects in image: {image_path}")
-            ai_result = pipeline.process_image_auto(fs_image_path)
+            try:
+                ai_result = pipeline.process_image_auto(fs_image_path, segmenter,
+                                                        cancel_token=CancellationToken(config.PROCESSING_TIMEOUT))
+            except PipelineCancelled as e:
+                return handle_ai_processing_error(e)
             
             if not ai_result.get('success', False):
                 return make_response(jsonify({
                     'error': f'AI processing failed: {ai_result.get("error", "Unknown error")}'
                 }), 500)
             
-            # Create input record
-            input_data = {
-                'description': description,
-                'image_path': image_path
-            }
-            new_input = Input(**input_data)
-            new_input.save()
-            
-            # Get or create object type
-            object_type_record = database.get(ObjectType, name=object_type)
-            if not object_type_record:
-                object_type_record = ObjectType(
-                    name=object_type,
-                    description=f'Object type for {object_type}'
-                )
-                object_type_record.save()
-            
-            # Create output record
-            output_data = {
-                'predicted_count': ai_result.get('predicted_count', 0),
-                'pred_confidence': ai_result.get('confidence', 0.0),
-                'object_type_id': object_type_record.id,
-                'input_id': new_input.id
-            }
-            new_output = Output(**output_data)
-            new_output.save()
+            # Persist input, object type, output and detections in a single commit
+            with database.unit_of_work():
+                # Create input record
+                input_data = {
+                    'description': description,
+                    'image_path': image_path
+                }
+                new_input = Input(**input_data)
+                new_input.save()
+                
+                # Get or create object type
+                object_type_record = database.get_object_type(name=object_type)
+                if not object_type_record:
+                    object_type_record = ObjectType(
+                        name=object_type,
+                        description=f'Object type for {object_type}'
+                    )
+                    object_type_record.save()
+                
+                # Create output record
+                output_data = {
+                    'predicted_count': ai_result.get('predicted_count', 0),
+                    'pred_confidence': ai_result.get('confidence', 0.0),
+                    'object_type_id': object_type_record.id,
+                    'input_id': new_input.id
+                }
+                new_output = Output(**output_data)
+                new_output.save()
+                
+                # Per-segment results, so recounts need no re-inference
+                database.bulk_save(Detection.from_records(new_output.id, ai_result.get('detections', [])))
             
             # Prepare response
             response_data = {
@@ -318,11 +375,14 @@ class InputList(Resource):
                 'image_path': image_path,
                 'created_at': new_output.created_at.isoformat() if hasattr(new_output, 'created_at') else None
             }
+            if request.values.get('include_timings', 'false').lower() == 'true':
+                response_data['stage_timings'] = ai_result.get('stage_timings', {})
             
             # Record performance metrics
             processing_time = ai_result.get('processing_time', 0.0)
             success = ai_result.get('success', True)
-            monitoring.record_request(f"{object_type}_auto", processing_time, success)
+            monitoring.record_request(f"{object_type}_auto", processing_time, success,
+                                      stage_timings=ai_result.get('stage_timings'))
             
             print(f"Successfully auto-detected objects: {ai_result.get('predicted_count', 0)} total objects")
             return make_response(jsonify(response_data), 201)
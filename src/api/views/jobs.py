@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+"""
+Job Views module
+Status, progress stream and cancellation of background jobs (async batches)
+"""
+from flask_restful import Resource
+from flask import request, jsonify, make_response, Response
+from ..utils import progress
+from ..utils.error_handlers import create_error_response, NotFoundAPIError, ServiceUnavailableAPIError
+
+
+def _job_not_found(job_id):
+    return create_error_response(
+        NotFoundAPIError(
+            f'Job {job_id} not found',
+            'Jobs are kept for JOB_RETENTION_SECONDS after their last event'
+        )
+    )
+
+
+class JobStatus(Resource):
+    """A background job's current state"""
+
+    def get(self, job_id):
+        """
+        Get the status of a background job
+        ---
+        tags:
+          - Jobs
+        summary: Job status with the results so far
+        parameters:
+          - in: path
+            name: job_id
+            type: string
+            required: true
+        responses:
+          200:
+            description: status (queued, running, completed, failed, cancelled), progress counts and the per-image results so far
+          404:
+            description: Job not found
+        """
+        job = progress.get_job(job_id)
+        if not job:
+            return _job_not_found(job_id)
+        return make_response(jsonify(job.status()), 200)
+
+    def delete(self, job_id):
+        """
+        Cancel a background job
+        ---
+        tags:
+          - Jobs
+        summary: Cancel a job
+        description: The running image stops at its next pipeline checkpoint and no further image starts; images already counted are still saved. Its event stream ends with a `cancelled` event.
+        parameters:
+          - in: path
+            name: job_id
+            type: string
+            required: true
+        responses:
+          202:
+            description: Cancellation requested
+          404:
+            description: Job not found
+          409:
+            description: The job has already finished
+        """
+        job = progress.get_job(job_id)
+        if not job:
+            return _job_not_found(job_id)
+        if not job.cancel():
+            return make_response(jsonify({'error': f'Job {job_id} has already finished'}), 409)
+        return make_response(jsonify({'success': True, 'job_id': job_id, 'status': 'cancelling'}), 202)
+
+
+class JobEvents(Resource):
+    """Server-Sent Events stream of a job's progress"""
+
+    def get(self, job_id):
+        """
+        Stream the progress events of a background job
+        ---
+        tags:
+          - Jobs
+        summary: Job progress as Server-Sent Events
+        description: "Replays the job's events, then follows it until a terminal event (completed, failed or cancelled). Events: queued, started, uploaded, stage, counted (with the image result), persisted. Streams end after EVENT_STREAM_MAX_SECONDS; reconnecting clients send Last-Event-ID (EventSource does this itself) to skip events they already have. Each worker serves at most MAX_EVENT_STREAMS streams; poll GET /api/jobs/{job_id} instead when it answers 503."
+        produces:
+          - text/event-stream
+        parameters:
+          - in: path
+            name: job_id
+            type: string
+            required: true
+          - in: header
+            name: Last-Event-ID
+            type: integer
+            required: false
+        responses:
+          200:
+            description: text/event-stream of job events
+          404:
+            description: Job not found
+          503:
+            description: This worker already serves MAX_EVENT_STREAMS streams
+        """
+        job = progress.get_job(job_id)
+        if not job:
+            return _job_not_found(job_id)
+        if not progress.open_stream():
+            response = create_error_response(
+                ServiceUnavailableAPIError(
+                    'Too many event streams',
+                    f'Poll /api/jobs/{job_id} or retry later'
+                )
+            )
+            response.headers['Retry-After'] = '5'
+            return response
+        try:
+            after = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id', 0))
+        except ValueError:
+            after = 0
+
+        response = Response(job.stream(after), mimetype='text/event-stream')
+        # Runs when the server closes the response, even if never iterated
+        response.call_on_close(progress.close_stream)
+        response.headers['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
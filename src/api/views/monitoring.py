@@ -3,76 +3,252 @@
 Performance Monitoring Views module
 """
 from flask_restful import Resource
-from flask import request, jsonify, make_response
+from flask import request, jsonify, make_response, Response
 from ...storage import database, Output, Input, ObjectType
+from ...config import config
+from ...metrics import (LatencyHistogram, SlidingWindow, MetricFamily, REGISTRY,
+                        CONTENT_TYPE, latency_buckets, shared)
+from ...metrics.instruments import CACHE_LOOKUPS
+import threading
 import time
-import statistics
 from datetime import datetime, timedelta
-from collections import defaultdict
 
-class PerformanceMonitoring:
-    """Performance monitoring singleton"""
-    _instance = None
-    _initialized = False
+class _MonitoringState:
+    """Counters behind PerformanceMonitoring
+
+    Plain data with to_dict/from_dict/merge so the counters of several
+    worker processes can be combined into one view.
+    """
     
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(PerformanceMonitoring, cls).__new__(cls)
-        return cls._instance
+    def __init__(self, windows, max_object_types, other_object_type, started=None):
+        self.window_spans = windows
+        self.max_object_types = max_object_types
+        self.other_object_type = other_object_type
+        self.session_start_time = time.time() if started is None else started
+        self.total_requests = 0
+        self.successful_requests = 0
+        self.failed_requests = 0
+        self.latency = LatencyHistogram()
+        self.windows = {name: SlidingWindow(span) for name, span in windows.items()}
+        self.object_type_stats = {}
+        self.stage_latency = {}
     
-    def __init__(self):
-        if not self._initialized:
-            self.session_start_time = time.time()
-            self.total_requests = 0
-            self.successful_requests = 0
-            self.failed_requests = 0
-            self.processing_times = []
-            self.object_type_stats = defaultdict(lambda: {'count': 0, 'total_time': 0, 'successes': 0, 'failures': 0})
-            self._initialized = True
+    def object_type_entry(self, object_type: str):
+        """Per-type counters, capping how many distinct types are tracked"""
+        entry = self.object_type_stats.get(object_type)
+        if entry is None:
+            if len(self.object_type_stats) >= self.max_object_types:
+                object_type = self.other_object_type
+                entry = self.object_type_stats.get(object_type)
+            if entry is None:
+                entry = {'count': 0, 'successes': 0, 'failures': 0, 'latency': LatencyHistogram()}
+                self.object_type_stats[object_type] = entry
+        return entry
+    
+    def stage_histogram(self, stage: str):
+        histogram = self.stage_latency.get(stage)
+        if histogram is None:
+            histogram = self.stage_latency[stage] = LatencyHistogram()
+        return histogram
     
-    def record_request(self, object_type: str, processing_time: float, success: bool):
-        """Record a processing request"""
+    def record(self, object_type, processing_time, success, stage_timings, now):
         self.total_requests += 1
         if success:
             self.successful_requests += 1
         else:
             self.failed_requests += 1
         
-        self.processing_times.append(processing_time)
+        self.latency.record(processing_time)
+        for window in self.windows.values():
+            window.record(processing_time, success, now)
         
         # Update object type statistics
-        self.object_type_stats[object_type]['count'] += 1
-        self.object_type_stats[object_type]['total_time'] += processing_time
+        entry = self.object_type_entry(object_type)
+        entry['count'] += 1
+        entry['latency'].record(processing_time)
         if success:
-            self.object_type_stats[object_type]['successes'] += 1
+            entry['successes'] += 1
         else:
-            self.object_type_stats[object_type]['failures'] += 1
+            entry['failures'] += 1
+        
+        for stage, seconds in (stage_timings or {}).items():
+            self.stage_histogram(stage).record(seconds)
+    
+    def merge(self, other: '_MonitoringState'):
+        """Add another worker's counters into this state"""
+        self.session_start_time = min(self.session_start_time, other.session_start_time)
+        self.total_requests += other.total_requests
+        self.successful_requests += other.successful_requests
+        self.failed_requests += other.failed_requests
+        self.latency.merge(other.latency)
+        for name, window in other.windows.items():
+            if name in self.windows:
+                self.windows[name].merge(window)
+        for obj_type, data in other.object_type_stats.items():
+            entry = self.object_type_entry(obj_type)
+            entry['count'] += data['count']
+            entry['successes'] += data['successes']
+            entry['failures'] += data['failures']
+            entry['latency'].merge(data['latency'])
+        for stage, histogram in other.stage_latency.items():
+            self.stage_histogram(stage).merge(histogram)
+    
+    def to_dict(self):
+        return {
+            'session_start_time': self.session_start_time,
+            'total_requests': self.total_requests,
+            'successful_requests': self.successful_requests,
+            'failed_requests': self.failed_requests,
+            'latency': self.latency.to_dict(),
+            'windows': {name: window.to_dict() for name, window in self.windows.items()},
+            'object_types': {
+                obj_type: dict(data, latency=data['latency'].to_dict())
+                for obj_type, data in self.object_type_stats.items()
+            },
+            'stages': {stage: histogram.to_dict() for stage, histogram in self.stage_latency.items()}
+        }
+    
+    @classmethod
+    def from_dict(cls, data, windows, max_object_types, other_object_type):
+        state = cls(windows, max_object_types, other_object_type, started=data['session_start_time'])
+        state.total_requests = data['total_requests']
+        state.successful_requests = data['successful_requests']
+        state.failed_requests = data['failed_requests']
+        state.latency = LatencyHistogram.from_dict(data['latency'])
+        for name, window in data['windows'].items():
+            if name in state.windows:
+                state.windows[name] = SlidingWindow.from_dict(window)
+        for obj_type, entry in data['object_types'].items():
+            state.object_type_stats[obj_type] = dict(entry, latency=LatencyHistogram.from_dict(entry['latency']))
+        for stage, histogram in data['stages'].items():
+            state.stage_latency[stage] = LatencyHistogram.from_dict(histogram)
+        return state
+
+
+class PerformanceMonitoring:
+    """Performance monitoring singleton
+
+    Memory is bounded: latencies go into fixed-bucket histograms (global,
+    per sliding window and per object type) instead of a growing list, and
+    every update/read runs under one lock so Flask threads can share it.
+
+    With METRICS_SHARED_DIR set, each worker process publishes its counters
+    through src.metrics.shared and every read returns the merged view of
+    all workers; reset_stats() resets all of them.
+    """
+    _instance = None
+    _initialized = False
+    
+    # Sliding windows reported by get_metrics(): name -> span in seconds
+    WINDOWS = {'1m': 60, '5m': 300, '1h': 3600}
+    # Object types beyond this many are folded into OTHER_OBJECT_TYPE
+    MAX_OBJECT_TYPES = 100
+    OTHER_OBJECT_TYPE = '_other'
+    
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(PerformanceMonitoring, cls).__new__(cls)
+        return cls._instance
+    
+    def __init__(self):
+        if not self._initialized:
+            self._lock = threading.Lock()
+            self._generation = None
+            self._reset()
+            shared.register_section('monitoring', self._dump)
+            self._initialized = True
+    
+    def _new_state(self, data=None):
+        if data is not None:
+            return _MonitoringState.from_dict(data, self.WINDOWS, self.MAX_OBJECT_TYPES, self.OTHER_OBJECT_TYPE)
+        return _MonitoringState(self.WINDOWS, self.MAX_OBJECT_TYPES, self.OTHER_OBJECT_TYPE)
+    
+    def _reset(self):
+        """(Re)create all counters; callers hold the lock or are __init__"""
+        self.state = self._new_state()
+    
+    def _dump(self, generation):
+        """Shared-store section: this worker's counters for `generation`
+
+        A worker that sees a newer generation than its own was reset by
+        another worker, so it starts over before publishing.
+        """
+        with self._lock:
+            if self._generation is None:
+                self._generation = generation
+            elif generation != self._generation:
+                self._reset()
+                self._generation = generation
+            return {'generation': generation, 'state': self.state.to_dict()}
+    
+    def _view(self):
+        """A private copy of the counters to report from
+
+        This worker's state, merged with the current-generation snapshots
+        of every other worker when a shared store is configured.
+        """
+        store = shared.get_store()
+        if store is not None:
+            store.flush()  # picks up a reset made by another worker
+        with self._lock:
+            view = self._new_state(self.state.to_dict())
+            generation = self._generation
+        if store is None:
+            return view
+        for data, _, _ in store.read('monitoring'):
+            if data['generation'] == generation:
+                view.merge(self._new_state(data['state']))
+        return view
+    
+    def record_request(self, object_type: str, processing_time: float, success: bool,
+                       stage_timings: dict = None):
+        """Record a processing request
+
+        stage_timings is the pipeline's {stage: seconds} breakdown
+        (summary['stage_timings']); each stage gets its own histogram.
+        """
+        now = time.time()
+        with self._lock:
+            self.state.record(object_type, processing_time, success, stage_timings, now)
+        shared.maybe_flush()
     
     def get_metrics(self):
         """Get current performance metrics"""
-        uptime = time.time() - self.session_start_time
-        success_rate = (self.successful_requests / self.total_requests * 100) if self.total_requests > 0 else 0
-        avg_processing_time = statistics.mean(self.processing_times) if self.processing_times else 0
-        median_processing_time = statistics.median(self.processing_times) if self.processing_times else 0
+        now = time.time()
+        view = self._view()
+        uptime = now - view.session_start_time
+        total_requests = view.total_requests
+        latency = view.latency.summary()
+        success_rate = (view.successful_requests / total_requests * 100) if total_requests > 0 else 0
         
         return {
             'uptime_seconds': uptime,
-            'total_requests': self.total_requests,
-            'successful_requests': self.successful_requests,
-            'failed_requests': self.failed_requests,
+            'total_requests': total_requests,
+            'successful_requests': view.successful_requests,
+            'failed_requests': view.failed_requests,
             'success_rate_percent': round(success_rate, 2),
-            'average_processing_time': round(avg_processing_time, 3),
-            'median_processing_time': round(median_processing_time, 3),
-            'min_processing_time': round(min(self.processing_times), 3) if self.processing_times else 0,
-            'max_processing_time': round(max(self.processing_times), 3) if self.processing_times else 0,
-            'requests_per_minute': round(self.total_requests / (uptime / 60), 2) if uptime > 0 else 0
+            'average_processing_time': round(latency['mean'], 3),
+            'median_processing_time': round(latency['p50'], 3),
+            'p90_processing_time': round(latency['p90'], 3),
+            'p99_processing_time': round(latency['p99'], 3),
+            'min_processing_time': round(latency['min'], 3),
+            'max_processing_time': round(latency['max'], 3),
+            'requests_per_minute': round(total_requests / (uptime / 60), 2) if uptime > 0 else 0,
+            'windows': {
+                name: {key: round(value, 3) for key, value in window.summary(now).items()}
+                for name, window in view.windows.items()
+            },
+            'stages': {
+                name: {key: round(value, 4) for key, value in histogram.summary().items()}
+                for name, histogram in view.stage_latency.items()
+            }
         }
     
     def get_object_type_stats(self):
         """Get statistics by object type"""
         stats = {}
-        for obj_type, data in self.object_type_stats.items():
-            avg_time = data['total_time'] / data['count'] if data['count'] > 0 else 0
+        for obj_type, data in self._view().object_type_stats.items():
+            latency = data['latency'].summary()
             success_rate = (data['successes'] / data['count'] * 100) if data['count'] > 0 else 0
             
             stats[obj_type] = {
@@ -80,23 +256,95 @@ class PerformanceMonitoring:
                 'successful_requests': data['successes'],
                 'failed_requests': data['failures'],
                 'success_rate_percent': round(success_rate, 2),
-                'average_processing_time': round(avg_time, 3),
-                'total_processing_time': round(data['total_time'], 3)
+                'average_processing_time': round(latency['mean'], 3),
+                'median_processing_time': round(latency['p50'], 3),
+                'p90_processing_time': round(latency['p90'], 3),
+                'p99_processing_time': round(latency['p99'], 3),
+                'total_processing_time': round(data['latency'].total, 3)
             }
         return stats
     
     def reset_stats(self):
-        """Reset all statistics"""
-        self.session_start_time = time.time()
-        self.total_requests = 0
-        self.successful_requests = 0
-        self.failed_requests = 0
-        self.processing_times = []
-        self.object_type_stats = defaultdict(lambda: {'count': 0, 'total_time': 0, 'successes': 0, 'failures': 0})
+        """Reset all statistics (of every worker when a shared store is configured)"""
+        store = shared.get_store()
+        generation = store.reset() if store is not None else None
+        with self._lock:
+            self._reset()
+            self._generation = generation
+        if store is not None:
+            store.flush(force=True)
+    
+    def collect(self, registry=None):
+        """Registry collector: per object type and per stage metric families"""
+        requests = MetricFamily('objdetect_pipeline_requests', 'counter',
+                                'Processed images by object type and outcome')
+        duration = MetricFamily('objdetect_pipeline_duration_seconds', 'histogram',
+                                'End-to-end processing time by object type')
+        stages = MetricFamily('objdetect_pipeline_stage_duration_seconds', 'histogram',
+                              'Time spent in each pipeline stage')
+        view = self._view()
+        for obj_type, data in view.object_type_stats.items():
+            labels = {'object_type': obj_type}
+            requests.add(dict(labels, status='success'), data['successes'], '_total')
+            requests.add(dict(labels, status='failure'), data['failures'], '_total')
+            histogram = data['latency']
+            duration.add_histogram(labels, latency_buckets(histogram), histogram.count, histogram.total)
+        for stage, histogram in view.stage_latency.items():
+            stages.add_histogram({'stage': stage}, latency_buckets(histogram),
+                                 histogram.count, histogram.total)
+        return [requests, duration, stages]
 
 # Global monitoring instance
 monitoring = PerformanceMonitoring()
 
+
+def _collect_cache_ratios(registry):
+    """Registry collector: hit ratio per cache from objdetect_cache_lookups"""
+    lookups = {}
+    for labels, value in registry.get(CACHE_LOOKUPS.name).items():
+        lookups.setdefault(labels['cache'], {})[labels['result']] = value
+    ratios = MetricFamily('objdetect_cache_hit_ratio', 'gauge', 'Cache hits / lookups since start')
+    for cache, results in lookups.items():
+        total = results.get('hit', 0.0) + results.get('miss', 0.0)
+        ratios.add({'cache': cache}, results.get('hit', 0.0) / total if total else 0.0)
+    return [ratios]
+
+
+def merged_registry():
+    """The metric registry summed over every worker (or this one alone)"""
+    store = shared.get_store()
+    if store is None:
+        return REGISTRY
+    store.flush()
+    dumps = [(REGISTRY.dump(), True)]
+    dumps.extend((data, alive) for data, _, alive in store.read('registry'))
+    return REGISTRY.merged(dumps)
+
+
+REGISTRY.register_collector(monitoring.collect)
+REGISTRY.register_collector(_collect_cache_ratios)
+shared.register_section('registry', lambda generation: REGISTRY.dump())
+
+
+class MetricsExposition(Resource):
+    """Prometheus/OpenMetrics scrape endpoint"""
+    
+    def get(self):
+        """
+        Get metrics in OpenMetrics text format
+        ---
+        tags:
+          - Monitoring
+        summary: Prometheus/OpenMetrics scrape endpoint
+        description: HTTP request counters and latency per endpoint, pipeline latency per object type and stage, model loads, cache hit ratios, in-flight requests and database query timings.
+        produces:
+          - application/openmetrics-text
+        responses:
+          200:
+            description: Metrics in OpenMetrics text exposition format
+        """
+        return Response(merged_registry().render(), content_type=CONTENT_TYPE)
+
 class PerformanceMetrics(Resource):
     """Get current performance metrics"""
     
@@ -134,7 +382,13 @@ class PerformanceMetrics(Resource):
                   description: Average processing time in seconds
                 median_processing_time:
                   type: number
-                  description: Median processing time in seconds
+                  description: Median (p50) processing time in seconds, histogram estimate
+                p90_processing_time:
+                  type: number
+                  description: 90th percentile processing time in seconds
+                p99_processing_time:
+                  type: number
+                  description: 99th percentile processing time in seconds
                 min_processing_time:
                   type: number
                   description: Minimum processing time in seconds
@@ -144,6 +398,12 @@ class PerformanceMetrics(Resource):
                 requests_per_minute:
                   type: number
                   description: Requests processed per minute
+                windows:
+                  type: object
+                  description: Request rate, errors and latency quantiles over the last 1m, 5m and 1h
+                stages:
+                  type: object
+                  description: Per pipeline stage (model_init, mask_generation, classification, ...) count, mean, min, max, p50, p90 and p99 in seconds
         """
         try:
             metrics = monitoring.get_metrics()
@@ -192,33 +452,18 @@ class DatabaseStats(Resource):
             description: Database statistics retrieved successfully
         """
         try:
-            # Get counts from database
-            total_inputs = len(database.all(Input)) if database.all(Input) else 0
-            total_outputs = len(database.all(Output)) if database.all(Output) else 0
-            total_object_types = len(database.all(ObjectType)) if database.all(ObjectType) else 0
-            
-            # Get recent activity (last 24 hours)
-            recent_outputs = []
-            if database.all(Output):
-                for output in database.all(Output):
-                    if hasattr(output, 'created_at'):
-                        # Simple check for recent activity (within last 24 hours)
-                        recent_outputs.append(output)
-            
-            # Calculate average confidence
-            confidences = []
-            if database.all(Output):
-                for output in database.all(Output):
-                    if hasattr(output, 'pred_confidence'):
-                        confidences.append(output.pred_confidence)
-            
-            avg_confidence = statistics.mean(confidences) if confidences else 0
+            # Counts and averages are computed in SQL (briefly cached)
+            db_stats = database.summary_stats(window_hours=24, max_age=config.STATS_CACHE_TTL)
+            total_inputs = db_stats['total_inputs']
+            total_outputs = db_stats['total_outputs']
+            total_object_types = db_stats['total_object_types']
+            avg_confidence = db_stats['average_confidence']
             
             stats = {
                 'total_inputs': total_inputs,
                 'total_outputs': total_outputs,
                 'total_object_types': total_object_types,
-                'recent_activity_24h': len(recent_outputs),
+                'recent_activity_24h': db_stats['recent_outputs'],
                 'average_confidence': round(avg_confidence, 3),
                 'database_health': 'healthy' if total_outputs > 0 else 'empty'
             }
@@ -262,7 +507,7 @@ class SystemHealth(Resource):
         tags:
           - Monitoring
         summary: Get comprehensive system health
-        description: Returns comprehensive system health including performance metrics, database stats, and AI pipeline status.
+        description: Returns comprehensive system health including performance metrics, database stats, and AI pipeline status (loaded models, device, memory, load and last inference times, warm-up state).
         responses:
           200:
             description: System health retrieved successfully
@@ -274,7 +519,7 @@ class SystemHealth(Resource):
             perf_metrics = monitoring.get_metrics()
             
             # Get database stats
-            total_outputs = len(database.all(Output)) if database.all(Output) else 0
+            total_outputs = database.summary_stats(max_age=config.STATS_CACHE_TTL)['total_outputs']
             
             # Get AI pipeline status
             pipeline_status = pipeline.get_model_status()
@@ -287,6 +532,8 @@ class SystemHealth(Resource):
                 health_score -= 15
             if not pipeline_status.get('models_loaded', False):
                 health_score -= 30
+            elif not pipeline_status.get('warmup_complete', False):
+                health_score -= 10
             if total_outputs == 0:
                 health_score -= 10
             
@@ -309,6 +556,8 @@ class SystemHealth(Resource):
                 health_data['recommendations'].append('Processing time is high, consider optimization')
             if not pipeline_status.get('models_loaded', False):
                 health_data['recommendations'].append('AI models are not loaded properly')
+            elif not pipeline_status.get('warmup_complete', False):
+                health_data['recommendations'].append('AI models have not been warmed up yet')
             
             return health_data, 200
         except Exception as e:
@@ -316,10 +565,34 @@ class SystemHealth(Resource):
                 'error': f'Failed to get system health: {str(e)}'
             }), 500)
 
-
-
-
-
-
-
-
+class Readiness(Resource):
+    """Readiness probe for load balancers"""
+    
+    def get(self):
+        """
+        Check whether this worker is ready for traffic
+        ---
+        tags:
+          - Monitoring
+        summary: Readiness probe
+        description: Returns 503 until the models are loaded and warmed up (MODEL_WARMUP), so load balancers hold traffic instead of sending the first requests to a cold worker. Use /health for liveness.
+        responses:
+          200:
+            description: Models are warm; ready for traffic
+          503:
+            description: Warm-up has not finished (or failed)
+        """
+        from ...pipeline.pipeline import pipeline
+        
+        if not config.MODEL_WARMUP:
+            # Models load lazily on the first request
+            return {'ready': True, 'warmup_enabled': False}, 200
+        
+        status = pipeline.get_model_status()
+        body = {
+            'ready': pipeline.is_ready(),
+            'warmup_enabled': True,
+            'warmup_in_progress': status.get('warmup_in_progress', False),
+            'warmup_error': status.get('warmup_error')
+        }
+        return body, 200 if body['ready'] else 503
@@ -51,7 +51,7 @@ class ObjectTypeList(Resource):
             
             for obj_data in default_object_types:
                 # Check if object type already exists
-                existing = database.get(ObjectType, name=obj_data["name"])
+                existing = database.get_object_type(name=obj_data["name"])
                 if not existing:
                     new_obj = ObjectType(**obj_data)
                     new_obj.save()
@@ -132,7 +132,7 @@ class ObjectTypeSingle(Resource):
           404:
             description: Object type not found
         """
-        obj = database.get(ObjectType, id=obj_id)
+        obj = database.get_object_type(id=obj_id)
         if obj:
             return (obj_schema.dump(obj), 200)
 
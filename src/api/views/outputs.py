@@ -3,12 +3,14 @@
 Output Views module
 """
 from flask_restful import Resource
-from ...storage import database, Output, ObjectType, Input
+from ...storage import database, Output, ObjectType, Input, Detection
+from ...pipeline.pipeline import pipeline
 from ..serializers.outputs import OutputSchema
 from marshmallow import ValidationError, EXCLUDE
 from flask import request, jsonify, make_response
 from ..utils.error_handlers import (
-    create_error_response, handle_database_error, NotFoundAPIError
+    create_error_response, handle_database_error, NotFoundAPIError,
+    APIError, ProcessingAPIError, validate_object_type, validate_threshold
 )
 
 
@@ -59,7 +61,7 @@ class OutputList(Resource):
             enhanced_outputs = []
             for output in outputs:
                 # Get object type name
-                object_type = database.get(ObjectType, id=output.object_type_id)
+                object_type = database.get_object_type(id=output.object_type_id)
                 object_type_name = object_type.name if object_type else "Unknown"
                 
                 # Get image path
@@ -201,7 +203,7 @@ class OutputSingle(Resource):
                 )
 
             # Enhance with object type name and image path for frontend details view
-            object_type = database.get(ObjectType, id=output.object_type_id)
+            object_type = database.get_object_type(id=output.object_type_id)
             input_record = database.get(Input, id=output.input_id)
 
             enhanced = output_schema.dump(output)
@@ -327,3 +329,131 @@ class OutputSingle(Resource):
             
         except Exception as e:
             return handle_database_error(e)
+
+
+class OutputRecount(Resource):
+    """Recount a stored result with other thresholds, without re-inference"""
+
+    def post(self, output_id):
+        """
+        Recount a result from its stored detections
+        ---
+        tags:
+          - Outputs
+        summary: Recount a result with other thresholds
+        description: Reruns filtering, NMS, label mapping and counting on the detections stored with an output, without running the models again. Accepts an output id or the id of its input (its newest output is used). Thresholds default to CONFIDENCE_THRESHOLD and NMS_THRESHOLD; object_type defaults to the output's. With persist the recount is saved as a new output of the same input.
+        parameters:
+          - in: path
+            name: output_id
+            type: string
+            required: true
+            description: UUID of the output (or input) to recount
+          - in: body
+            name: body
+            required: false
+            schema:
+              type: object
+              properties:
+                confidence_threshold:
+                  type: number
+                  format: float
+                  example: 0.5
+                nms_threshold:
+                  type: number
+                  format: float
+                  example: 0.4
+                object_type:
+                  type: string
+                  example: "dog"
+                persist:
+                  type: boolean
+                  default: false
+        responses:
+          200:
+            description: Recounted result
+          201:
+            description: Recounted result, saved as a new output (result_id)
+          400:
+            description: Invalid threshold or object type
+          404:
+            description: Output not found
+          422:
+            description: The output has no stored detections
+        """
+        try:
+            data = request.get_json(silent=True) or {}
+            confidence_threshold = validate_threshold(data.get('confidence_threshold'), 'confidence_threshold')
+            nms_threshold = validate_threshold(data.get('nms_threshold'), 'nms_threshold')
+
+            output = database.get(Output, id=output_id)
+            if not output:
+                input_record = database.get(Input, id=output_id)
+                if input_record and input_record.outputs:
+                    output = max(input_record.outputs, key=lambda o: o.created_at)
+            if not output:
+                raise NotFoundAPIError(
+                    f'Output with ID {output_id} not found',
+                    'The requested output record does not exist'
+                )
+
+            if data.get('object_type'):
+                object_type = validate_object_type(data['object_type'])
+            else:
+                source_type = database.get_object_type(id=output.object_type_id)
+                object_type = source_type.name if source_type else 'unknown'
+
+            records = [detection.to_record() for detection in database.get_detections(output.id)]
+            # An image without segments stores no rows either, and recounts to 0
+            if not records and output.predicted_count:
+                raise ProcessingAPIError(
+                    'No stored detections for this result',
+                    'Results created before detections were stored must be processed again'
+                )
+
+            result = pipeline.recount(records, object_type, confidence_threshold, nms_threshold)
+
+            response_data = {
+                'success': True,
+                'source_result_id': str(output.id),
+                'object_type': object_type,
+                'predicted_count': result['predicted_count'],
+                'confidence': result['confidence'],
+                'previous_count': output.predicted_count,
+                'confidence_threshold': result['confidence_threshold'],
+                'nms_threshold': result['nms_threshold'],
+                'segments': result['segments'],
+                'segments_after_filtering': result['segments_after_filtering'],
+                'segments_after_nms': result['segments_after_nms'],
+                'processing_time': result['processing_time']
+            }
+
+            if data.get('persist') is not True:
+                return make_response(jsonify(response_data), 200)
+
+            # Save the recount as a new output of the same input
+            with database.unit_of_work():
+                object_type_record = database.get_object_type(name=object_type)
+                if not object_type_record:
+                    object_type_record = ObjectType(
+                        name=object_type,
+                        description=f'Object type for {object_type}'
+                    )
+                    object_type_record.save()
+
+                new_output = Output(
+                    predicted_count=result['predicted_count'],
+                    pred_confidence=result['confidence'],
+                    object_type_id=object_type_record.id,
+                    input_id=output.input_id
+                )
+                new_output.save()
+                database.bulk_save(Detection.from_records(new_output.id, result['detections']))
+
+            response_data['result_id'] = str(new_output.id)
+            response_data['created_at'] = new_output.created_at.isoformat()
+            return make_response(jsonify(response_data), 201)
+
+        except APIError as e:
+            return create_error_response(e)
+        except Exception as e:
+            return handle_database_error(e)
@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+"""
+Profiling Views module
+Admin endpoints behind PROFILING_TOKEN; only registered when profiling is enabled
+"""
+from flask_restful import Resource
+from flask import request, jsonify, make_response, Response, send_from_directory
+from ...config import config
+from ..utils.profiling import (SamplingProfiler, authorized, list_profiles, profile_directory,
+                               sampling_lock, unauthorized)
+import os
+
+
+class ProfileList(Resource):
+    """Saved per-request profiles"""
+
+    def get(self):
+        """
+        List saved request profiles
+        ---
+        tags:
+          - Profiling
+        summary: List saved request profiles
+        description: Profiles written by requests sent with the X-Profile header, newest first. Requires the X-Profile-Token header.
+        parameters:
+          - name: X-Profile-Token
+            in: header
+            type: string
+            required: true
+        responses:
+          200:
+            description: Profile file names with size and creation time
+          403:
+            description: Missing or wrong token
+        """
+        if not authorized():
+            return unauthorized()
+        return {'profiles': list_profiles()}, 200
+
+
+class ProfileDownload(Resource):
+    """Download one saved profile"""
+
+    def get(self, name):
+        """
+        Download a saved request profile
+        ---
+        tags:
+          - Profiling
+        summary: Download a saved request profile
+        description: .prof (cProfile, open with snakeviz), .html (pyinstrument) or .json (torch chrome trace). Requires the X-Profile-Token header.
+        parameters:
+          - name: name
+            in: path
+            type: string
+            required: true
+          - name: X-Profile-Token
+            in: header
+            type: string
+            required: true
+        responses:
+          200:
+            description: The profile file
+          403:
+            description: Missing or wrong token
+          404:
+            description: No such profile
+        """
+        if not authorized():
+            return unauthorized()
+        directory = os.path.abspath(profile_directory())
+        if name not in list_profiles():
+            return make_response(jsonify({'error': f'Profile {name} not found'}), 404)
+        return send_from_directory(directory, name, as_attachment=True)
+
+
+class SamplingProfile(Resource):
+    """Time-boxed sampling profile of the whole worker process"""
+
+    def get(self):
+        """
+        Sample every thread of this worker for a while
+        ---
+        tags:
+          - Profiling
+        summary: Sampling profile of the worker process
+        description: Samples the stack of every thread for `seconds` and returns collapsed stacks (one `thread;frame;frame count` line per stack) for flamegraph.pl or speedscope. The request blocks for the whole duration; one sampling run at a time. Requires the X-Profile-Token header.
+        produces:
+          - text/plain
+        parameters:
+          - name: seconds
+            in: query
+            type: number
+            default: 10
+            description: Sampling time, at most PROFILING_MAX_SECONDS
+          - name: interval
+            in: query
+            type: number
+            default: 0.005
+            description: Seconds between samples (at least 0.001)
+          - name: X-Profile-Token
+            in: header
+            type: string
+            required: true
+        responses:
+          200:
+            description: Collapsed stacks
+          400:
+            description: Invalid seconds or interval
+          403:
+            description: Missing or wrong token
+          409:
+            description: Another sampling run is in progress
+        """
+        if not authorized():
+            return unauthorized()
+        try:
+            seconds = float(request.args.get('seconds', 10))
+            interval = float(request.args.get('interval', 0.005))
+        except ValueError:
+            return make_response(jsonify({'error': 'seconds and interval must be numbers'}), 400)
+        if not 0 < seconds <= config.PROFILING_MAX_SECONDS or interval < 0.001:
+            return make_response(jsonify({
+                'error': f'seconds must be in (0, {config.PROFILING_MAX_SECONDS}] and interval at least 0.001'
+            }), 400)
+        if not sampling_lock.acquire(blocking=False):
+            return make_response(jsonify({'error': 'A sampling profile is already running'}), 409)
+        try:
+            profiler = SamplingProfiler(interval).run(seconds)
+        finally:
+            sampling_lock.release()
+        response = Response(profiler.collapsed(), content_type='text/plain; charset=utf-8')
+        response.headers['Content-Disposition'] = f'attachment; filename=profile-{os.getpid()}.collapsed'
+        response.headers['X-Profile-Samples'] = str(profiler.samples)
+        return response
@@ -10,6 +10,9 @@ from flask_cors import CORS
 from flasgger import Swagger
 from .docs.swagger_template import swagger_template
 from .config import config
+from .api.utils import instrumentation
+from .api.utils import profiling
+from .metrics import shared as shared_metrics
 import logging
 from flask import send_from_directory
 import os
@@ -29,6 +32,12 @@ swagger = Swagger(app, template=swagger_template)
 # Setup CORS
 cors = CORS(app, resources={r"/api/*": {"origins": "*"}}, supports_credentials=True)
 
+# Count and time every request for /metrics; share metrics across workers
+instrumentation.init_app(app)
+shared_metrics.configure(config.METRICS_SHARED_DIR, config.METRICS_FLUSH_INTERVAL)
+# Per-request profiling for admins; registers nothing unless PROFILING_ENABLED
+profiling.init_app(app)
+
 @app.errorhandler(404)
 def page_not_found(e):
     """json 404 page"""
@@ -59,8 +68,9 @@ api = Api(app)
 from .api.views.inputs import *
 from .api.views.object_types import *
 from .api.views.outputs import *
-from .api.views.monitoring import PerformanceMetrics, ObjectTypeStats, DatabaseStats, ResetStats, SystemHealth
+from .api.views.monitoring import PerformanceMetrics, ObjectTypeStats, DatabaseStats, ResetStats, SystemHealth, MetricsExposition, Readiness
 from .api.views.batch_processing import BatchProcessing, BatchStatus
+from .api.views.jobs import JobStatus, JobEvents
 
 api.add_resource(InputList, '/api/count')
 # Add count-all endpoint for auto-detection
@@ -76,6 +86,7 @@ api.add_resource(
     '/api/correct/<string:output_id>',
     endpoint='output_single'
 )
+api.add_resource(OutputRecount, '/api/results/<string:output_id>/recount')
 
 # Performance monitoring endpoints
 api.add_resource(PerformanceMetrics, '/api/performance/metrics')
@@ -83,10 +94,32 @@ api.add_resource(ObjectTypeStats, '/api/performance/object-types')
 api.add_resource(DatabaseStats, '/api/performance/database')
 api.add_resource(ResetStats, '/api/performance/reset')
 api.add_resource(SystemHealth, '/api/performance/health')
+api.add_resource(Readiness, '/api/performance/ready')
+api.add_resource(MetricsExposition, '/metrics')
+
+# Admin profiling endpoints (token-gated), only when profiling is enabled
+if profiling.enabled():
+    from .api.views.profiling import ProfileList, ProfileDownload, SamplingProfile
+    api.add_resource(ProfileList, '/api/admin/profiles')
+    api.add_resource(ProfileDownload, '/api/admin/profiles/<string:name>')
+    api.add_resource(SamplingProfile, '/api/admin/profile/sample')
 
 # Batch processing endpoints
 api.add_resource(BatchProcessing, '/api/batch/process')
 api.add_resource(BatchStatus, '/api/batch/status')
+# Background jobs (async batches): status, SSE progress and cancellation
+api.add_resource(JobStatus, '/api/jobs/<string:job_id>')
+api.add_resource(JobEvents, '/api/jobs/<string:job_id>/events')
+
+def start_model_warm_up():
+    """Load and warm the models in the background when MODEL_WARMUP is on"""
+    if not config.MODEL_WARMUP:
+        return None
+    # With the debug reloader only the child process serves requests
+    if config.DEBUG and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return None
+    from .pipeline.pipeline import pipeline
+    return pipeline.start_warm_up()
 
 # Serve media files
 @app.route('/media/<path:filename>')
@@ -102,6 +135,7 @@ if __name__ == "__main__":
     logging.info(f"Database: {config.DATABASE_TYPE}")
     logging.info(f"Media directory: {config.MEDIA_DIRECTORY}")
     
+    start_model_warm_up()
     app.run(
         host=config.HOST, 
         port=config.PORT, 
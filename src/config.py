@@ -46,6 +46,10 @@ class Config:
     SAM_CHECKPOINT_URL = os.getenv('SAM_CHECKPOINT_URL', 
         'https://dl.fbaipublicfiles.com/segment_anything/sam_vit_b_01ec64.pth')
     TRANSFORMERS_MODEL = os.getenv('TRANSFORMERS_MODEL', 'google/vit-base-patch16-224')
+    # Weights are resolved from MODEL_DIRECTORY through its sha256 manifest
+    # (src/pipeline/artifacts.py); offline mode never downloads
+    MODEL_OFFLINE = os.getenv('MODEL_OFFLINE', 'False').lower() == 'true'
+    VERIFY_MODEL_CHECKSUMS = os.getenv('VERIFY_MODEL_CHECKSUMS', 'True').lower() == 'true'
     # Performance tuning (safe defaults for CPU)
     FAST_MODE = os.getenv('FAST_MODE', 'True').lower() == 'true'
     MAX_IMAGE_DIM = int(os.getenv('MAX_IMAGE_DIM', '1024'))  # downscale long edge
@@ -54,18 +58,81 @@ class Config:
     SAM_STABILITY_SCORE_THRESH = float(os.getenv('SAM_STABILITY_SCORE_THRESH', '0.9'))
     SAM_MIN_MASK_REGION_AREA = int(os.getenv('SAM_MIN_MASK_REGION_AREA', '2000'))
     TOP_SEGMENTS = int(os.getenv('TOP_SEGMENTS', '15'))
+    # Default segmenter: sam, mobile_sam or contour (src/pipeline/segmenters.py);
+    # requests can pick another with the `segmenter` form field
+    SEGMENTER = os.getenv('SEGMENTER', 'sam').lower()
+    # Minimum classifier confidence and NMS IoU for API requests; stored
+    # detections can be recounted with other values (POST /api/results/<id>/recount)
+    CONFIDENCE_THRESHOLD = float(os.getenv('CONFIDENCE_THRESHOLD', '0.7'))
+    NMS_THRESHOLD = float(os.getenv('NMS_THRESHOLD', '0.3'))
+    # Model runtime: eager, torchscript or onnxruntime; exported graphs are
+    # read from EXPORT_DIRECTORY (python -m src.pipeline.backends writes them)
+    INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'eager').lower()
+    EXPORT_DIRECTORY = os.getenv('EXPORT_DIRECTORY', os.path.join(MODEL_DIRECTORY, 'exported'))
+    # Classifier precision on CPU: none (fp32), dynamic or static int8
+    # (src/pipeline/quantization.py); static calibrates on local images
+    CLASSIFIER_QUANTIZATION = os.getenv('CLASSIFIER_QUANTIZATION', 'none').lower()
+    QUANTIZATION_CALIBRATION_DIR = os.getenv('QUANTIZATION_CALIBRATION_DIR', 'dev_media')
+    QUANTIZATION_CALIBRATION_IMAGES = int(os.getenv('QUANTIZATION_CALIBRATION_IMAGES', '32'))
+    # Load models and run a dummy inference at startup (readiness waits for it)
+    MODEL_WARMUP = os.getenv('MODEL_WARMUP', 'True').lower() == 'true'
+    # Pipeline backend: models, or stub for deterministic synthetic detections
+    # with a configurable latency (src/pipeline/stub.py); refused in production
+    PIPELINE_BACKEND = os.getenv('OBJ_DETECT_PIPELINE_BACKEND', 'models').lower()
+    STUB_LATENCY = os.getenv('STUB_LATENCY', 'none')  # e.g. fixed:0.2, lognormal:0.3,0.5
+    STUB_MAX_OBJECTS = int(os.getenv('STUB_MAX_OBJECTS', '8'))
+    STUB_SEED = int(os.getenv('STUB_SEED', '0'))
     
     # Performance Configuration
     MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', '10'))
     MAX_CONCURRENT_REQUESTS = int(os.getenv('MAX_CONCURRENT_REQUESTS', '5'))
     PROCESSING_TIMEOUT = int(os.getenv('PROCESSING_TIMEOUT', '120'))
     BATCH_PROCESSING_TIMEOUT = int(os.getenv('BATCH_PROCESSING_TIMEOUT', '300'))
+    STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', '5'))  # seconds
+    # Background jobs (async batches): event logs shared by every worker
+    # process ('' = <tmp>/objdetect-jobs), streamed from /api/jobs/<id>/events
+    JOBS_DIRECTORY = os.getenv('JOBS_DIRECTORY', '')
+    JOB_RETENTION_SECONDS = int(os.getenv('JOB_RETENTION_SECONDS', '3600'))
+    PROGRESS_POLL_INTERVAL = float(os.getenv('PROGRESS_POLL_INTERVAL', '0.2'))  # seconds
+    PROGRESS_HEARTBEAT = float(os.getenv('PROGRESS_HEARTBEAT', '15'))  # seconds
+    # Each event stream holds a request thread: at most MAX_EVENT_STREAMS per
+    # worker process (more get a 503), each ended after EVENT_STREAM_MAX_SECONDS
+    # (EventSource clients reconnect and resume from Last-Event-ID)
+    MAX_EVENT_STREAMS = int(os.getenv('MAX_EVENT_STREAMS', '2'))
+    EVENT_STREAM_MAX_SECONDS = float(os.getenv('EVENT_STREAM_MAX_SECONDS', '60'))
+    # Background jobs run per worker process on JOB_WORKERS threads; at most
+    # JOB_QUEUE_SIZE more wait for one, further submissions get a 503
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+    JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', '4'))
+    # Directory where worker processes share metrics ('' = per-process only)
+    METRICS_SHARED_DIR = os.getenv('METRICS_SHARED_DIR', '')
+    METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '1'))  # seconds
+    
+    # Production server (start_production.py / src/serving.py)
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', '2'))  # worker processes
+    WEB_THREADS = int(os.getenv('WEB_THREADS', '4'))  # request threads per worker
+    # torch intra-op threads per inference slot; 0 = split each worker's
+    # cores across its MAX_CONCURRENT_REQUESTS slots (src/pipeline/execution.py)
+    TORCH_NUM_THREADS = int(os.getenv('TORCH_NUM_THREADS', '0'))
+    TORCH_INTEROP_THREADS = int(os.getenv('TORCH_INTEROP_THREADS', '1'))
+    # Seconds a stopping worker may spend finishing in-flight requests
+    GRACEFUL_TIMEOUT = int(os.getenv('GRACEFUL_TIMEOUT', os.getenv('PROCESSING_TIMEOUT', '120')))
+    # Load models once in the master so workers share the weights
+    PRELOAD_MODELS = os.getenv('PRELOAD_MODELS', 'True').lower() == 'true'
     
     # Security Configuration
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000,http://localhost:5173').split(',')
     RATE_LIMIT_PER_MINUTE = int(os.getenv('RATE_LIMIT_PER_MINUTE', '60'))
     
+    # Admin profiling (src/api/utils/profiling.py): nothing is registered
+    # unless enabled and PROFILING_TOKEN is set
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False').lower() == 'true'
+    PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')
+    PROFILING_DIRECTORY = os.getenv('PROFILING_DIRECTORY', 'logs/profiles')
+    PROFILING_MAX_FILES = int(os.getenv('PROFILING_MAX_FILES', '20'))  # newest request profiles kept
+    PROFILING_MAX_SECONDS = float(os.getenv('PROFILING_MAX_SECONDS', '60'))  # longest sampling run
+    
     # Logging Configuration
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE = os.getenv('LOG_FILE', 'logs/app.log')
@@ -155,6 +222,9 @@ class ProductionConfig(Config):
         if self.DATABASE_TYPE == 'sqlite':
             raise ValueError("SQLite should not be used in production. Use MySQL or PostgreSQL.")
 
+        if self.PIPELINE_BACKEND == 'stub':
+            raise ValueError("The stub pipeline backend returns fake counts and must not be used in production")
+
 def get_config() -> Config:
     """Get configuration based on environment"""
     env = os.getenv('OBJ_DETECT_ENV', 'development').lower()
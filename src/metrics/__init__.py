@@ -0,0 +1,6 @@
+#!/usr/bin/python3
+"""Bounded, mergeable metrics primitives shared by the API and pipeline"""
+from .core import LatencyHistogram, SlidingWindow, LATENCY_BOUNDS, log_bounds
+from .registry import (REGISTRY, CONTENT_TYPE, Counter, Gauge, Histogram,
+                       MetricFamily, Registry, latency_buckets, render)
+from . import shared
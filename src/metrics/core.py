@@ -0,0 +1,223 @@
+"""
+Streaming metrics primitives
+Fixed-memory latency histograms and sliding time windows
+
+Every structure here has a bounded size: recording a value and reading
+quantiles cost the same after one request or after ten million. None of
+them lock on their own; owners (e.g. PerformanceMonitoring) serialize
+access with a single lock.
+"""
+
+import bisect
+import math
+from typing import Dict, List, Optional
+
+
+def log_bounds(low: float = 0.001, high: float = 600.0, growth: float = 1.1) -> List[float]:
+    """Geometric bucket upper bounds from `low` to `high` seconds
+
+    With growth=1.1 any quantile read from the histogram is within ~10%
+    of the true value, using ~140 buckets for 1ms..10min.
+    """
+    bounds = []
+    bound = low
+    while bound < high:
+        bounds.append(round(bound, 6))
+        bound *= growth
+    bounds.append(high)
+    return bounds
+
+
+LATENCY_BOUNDS = log_bounds()
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with exact count/sum/min/max
+
+    Bucket i counts values <= bounds[i]; the last bucket holds overflow.
+    """
+
+    __slots__ = ('bounds', 'counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self, bounds: List[float] = LATENCY_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def record(self, value: float) -> None:
+        """Add one observation (seconds)"""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        """Add another histogram with the same bounds into this one"""
+        if other.count == 0:
+            return
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Estimate the q-quantile (0..1) by interpolating inside its bucket"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, c in enumerate(self.counts):
+            if c and cumulative + c >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                estimate = lower + (upper - lower) * ((rank - cumulative) / c)
+                return min(max(estimate, self.min), self.max)
+            cumulative += c
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        """count/mean/min/max and p50/p90/p99 of the recorded values"""
+        return {
+            'count': self.count,
+            'mean': self.mean(),
+            'min': self.min if self.count else 0.0,
+            'max': self.max if self.count else 0.0,
+            'p50': self.quantile(0.50),
+            'p90': self.quantile(0.90),
+            'p99': self.quantile(0.99)
+        }
+
+    def to_dict(self) -> Dict:
+        """Serializable state (see from_dict); buckets are stored sparsely"""
+        return {
+            'counts': [[i, c] for i, c in enumerate(self.counts) if c],
+            'count': self.count,
+            'total': self.total,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, bounds: List[float] = LATENCY_BOUNDS) -> 'LatencyHistogram':
+        hist = cls(bounds)
+        for i, c in data['counts']:
+            hist.counts[i] = c
+        hist.count = data['count']
+        hist.total = data['total']
+        if hist.count:
+            hist.min = data['min']
+            hist.max = data['max']
+        return hist
+
+
+class _Slot:
+    """One time slice of a SlidingWindow"""
+
+    __slots__ = ('index', 'count', 'errors', 'latency')
+
+    def __init__(self, index: int):
+        self.index = index
+        self.count = 0
+        self.errors = 0
+        self.latency = LatencyHistogram()
+
+
+class SlidingWindow:
+    """Request rate, error count and latency over the last `span` seconds
+
+    The window is a ring of `slots` time slices; old slices are recycled
+    in place, so memory stays fixed and a read merges at most `slots`
+    histograms. Resolution is span / slots.
+    """
+
+    def __init__(self, span: float, slots: int = 60):
+        self.span = span
+        self.slot_width = span / slots
+        self.slots: List[Optional[_Slot]] = [None] * slots
+
+    def _slot(self, now: float) -> _Slot:
+        index = int(now // self.slot_width)
+        position = index % len(self.slots)
+        slot = self.slots[position]
+        if slot is None or slot.index != index:
+            slot = _Slot(index)
+            self.slots[position] = slot
+        return slot
+
+    def record(self, value: float, success: bool, now: float) -> None:
+        slot = self._slot(now)
+        slot.count += 1
+        if not success:
+            slot.errors += 1
+        slot.latency.record(value)
+
+    def merge(self, other: 'SlidingWindow') -> None:
+        """Add another window with the same span/slots into this one
+
+        Slices for the same time index are summed; a newer slice replaces
+        an older one in the same ring position.
+        """
+        for position, theirs in enumerate(other.slots):
+            if theirs is None:
+                continue
+            mine = self.slots[position]
+            if mine is None or mine.index < theirs.index:
+                mine = self.slots[position] = _Slot(theirs.index)
+            elif mine.index > theirs.index:
+                continue
+            mine.count += theirs.count
+            mine.errors += theirs.errors
+            mine.latency.merge(theirs.latency)
+
+    def to_dict(self) -> Dict:
+        """Serializable state of the occupied slices (see from_dict)"""
+        return {
+            'span': self.span,
+            'slots': [
+                [slot.index, slot.count, slot.errors, slot.latency.to_dict()]
+                for slot in self.slots if slot is not None
+            ]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, slots: int = 60) -> 'SlidingWindow':
+        window = cls(data['span'], slots)
+        for index, count, errors, latency in data['slots']:
+            slot = _Slot(index)
+            slot.count = count
+            slot.errors = errors
+            slot.latency = LatencyHistogram.from_dict(latency)
+            window.slots[index % slots] = slot
+        return window
+
+    def summary(self, now: float) -> Dict[str, float]:
+        """Totals, rate and latency quantiles for the live slots"""
+        oldest = int(now // self.slot_width) - len(self.slots) + 1
+        latency = LatencyHistogram()
+        count = errors = 0
+        for slot in self.slots:
+            if slot is not None and slot.index >= oldest:
+                count += slot.count
+                errors += slot.errors
+                latency.merge(slot.latency)
+        stats = latency.summary()
+        return {
+            'requests': count,
+            'errors': errors,
+            'requests_per_minute': count / (self.span / 60),
+            'average_processing_time': stats['mean'],
+            'p50_processing_time': stats['p50'],
+            'p90_processing_time': stats['p90'],
+            'p99_processing_time': stats['p99']
+        }
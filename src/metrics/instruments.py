@@ -0,0 +1,38 @@
+"""
+Application metrics
+The counters, gauges and histograms exported on GET /metrics
+
+Defined here, in one place, so the API, storage and pipeline layers all
+update the same objects and metric names stay consistent.
+"""
+
+from .registry import REGISTRY
+
+# HTTP layer (see src/api/utils/instrumentation.py)
+HTTP_REQUESTS = REGISTRY.counter(
+    'objdetect_http_requests', 'HTTP requests handled', ['method', 'endpoint', 'status'])
+HTTP_LATENCY = REGISTRY.histogram(
+    'objdetect_http_request_duration_seconds', 'HTTP request latency', ['method', 'endpoint'])
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    'objdetect_http_requests_in_flight', 'HTTP requests currently being handled')
+
+# Pipeline
+PIPELINE_IN_FLIGHT = REGISTRY.gauge(
+    'objdetect_pipeline_in_flight', 'Images currently inside run_pipeline')
+INFERENCE_SLOTS_BUSY = REGISTRY.gauge(
+    'objdetect_inference_slots_busy', 'Inference slots in use (see src/pipeline/execution.py)')
+INFERENCE_QUEUE_DEPTH = REGISTRY.gauge(
+    'objdetect_inference_queue_depth', 'Requests waiting for a free inference slot')
+MODEL_LOADS = REGISTRY.counter(
+    'objdetect_model_loads', 'Model load attempts', ['model', 'status'])
+MODEL_LOAD_SECONDS = REGISTRY.histogram(
+    'objdetect_model_load_duration_seconds', 'Time spent loading a model', ['model'])
+
+# Caches that do not keep their own counters
+CACHE_LOOKUPS = REGISTRY.counter(
+    'objdetect_cache_lookups', 'Cache lookups by result (hit/miss)', ['cache', 'result'])
+
+# Database (see Engine)
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    'objdetect_db_query_duration_seconds', 'SQL statement execution time', ['operation'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
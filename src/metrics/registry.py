@@ -0,0 +1,340 @@
+"""
+Metric registry and OpenMetrics text exposition
+Labelled counters, gauges and histograms plus pull-time collectors
+
+Metrics are created once at import time (module level) and updated from
+anywhere; render() walks every metric and collector and produces the
+text served by GET /metrics:
+
+    REQUESTS = REGISTRY.counter('objdetect_http_requests', 'HTTP requests', ['endpoint'])
+    REQUESTS.inc(endpoint='/api/count')
+"""
+
+import bisect
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .core import LatencyHistogram
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# Bucket bounds for exported histograms: roughly doubling from 5ms to 10min
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+class MetricFamily:
+    """One metric (name, type, help) and its samples, ready to render"""
+
+    def __init__(self, name: str, kind: str, help: str):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.samples: List[Tuple[str, Dict[str, str], float]] = []
+
+    def add(self, labels: Dict[str, str], value: float, suffix: str = '') -> None:
+        self.samples.append((suffix, labels, value))
+
+    def add_histogram(self, labels: Dict[str, str], buckets: Sequence[Tuple[float, int]],
+                      count: int, total: float) -> None:
+        """Add one histogram series from (upper_bound, cumulative_count) pairs"""
+        for bound, cumulative in buckets:
+            self.add(dict(labels, le=_format_value(bound)), cumulative, '_bucket')
+        self.add(dict(labels, le='+Inf'), count, '_bucket')
+        self.add(labels, count, '_count')
+        self.add(labels, total, '_sum')
+
+
+class _Metric:
+    """Base of the labelled metric types; one value slot per label tuple"""
+
+    kind = ''
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames and self.kind in ('counter', 'gauge'):
+            # An unlabelled series exists from the start, reading 0
+            self._values[()] = 0.0
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+            if not self.labelnames and self.kind in ('counter', 'gauge'):
+                self._values[()] = 0.0
+
+    def copy_empty(self) -> '_Metric':
+        """A metric with the same definition and no recorded values"""
+        return type(self)(self.name, self.help, self.labelnames)
+
+    def dump(self) -> List[list]:
+        """JSON-serializable [label_values, value] pairs (see merge_dump)"""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def merge_dump(self, dumped: List[list]) -> None:
+        """Add values dumped by another process's copy of this metric"""
+        with self._lock:
+            for key, value in dumped:
+                key = tuple(key)
+                self._values[key] = self._values.get(key, 0.0) + value
+
+
+class Counter(_Metric):
+    """Monotonic counter; exported as <name>_total"""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if amount < 0:
+            raise ValueError('Counters can only increase')
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def items(self) -> List[Tuple[Dict[str, str], float]]:
+        """(labels, value) for every label set seen so far"""
+        with self._lock:
+            return [(self._labels(key), value) for key, value in self._values.items()]
+
+    def collect(self) -> MetricFamily:
+        family = MetricFamily(self.name, self.kind, self.help)
+        with self._lock:
+            for key, value in self._values.items():
+                family.add(self._labels(key), value, '_total')
+        return family
+
+
+class Gauge(_Metric):
+    """Value that goes up and down (in-flight requests, queue depth)"""
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def collect(self) -> MetricFamily:
+        family = MetricFamily(self.name, self.kind, self.help)
+        with self._lock:
+            for key, value in self._values.items():
+                family.add(self._labels(key), value)
+        return family
+
+
+class Histogram(_Metric):
+    """Bucketed observations with count and sum per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts (+1 overflow), count, sum]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += 1
+            state[2] += value
+
+    def copy_empty(self) -> 'Histogram':
+        return type(self)(self.name, self.help, self.labelnames, self.buckets)
+
+    def dump(self) -> List[list]:
+        with self._lock:
+            return [[list(key), [list(counts), count, total]]
+                    for key, (counts, count, total) in self._values.items()]
+
+    def merge_dump(self, dumped: List[list]) -> None:
+        with self._lock:
+            for key, (counts, count, total) in dumped:
+                key = tuple(key)
+                state = self._values.get(key)
+                if state is None:
+                    state = self._values[key] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+                for i, c in enumerate(counts):
+                    state[0][i] += c
+                state[1] += count
+                state[2] += total
+
+    def collect(self) -> MetricFamily:
+        family = MetricFamily(self.name, self.kind, self.help)
+        with self._lock:
+            for key, (counts, count, total) in self._values.items():
+                cumulative = 0
+                buckets = []
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    buckets.append((bound, cumulative))
+                family.add_histogram(self._labels(key), buckets, count, total)
+        return family
+
+
+def latency_buckets(histogram: LatencyHistogram, every: int = 8) -> List[Tuple[float, int]]:
+    """Cumulative (bound, count) pairs for exporting a LatencyHistogram
+
+    Every `every`-th fine-grained bound is kept (growth 1.1**8, i.e. about
+    doubling), so the export stays small while the bounds remain exact
+    bucket edges of the source histogram.
+    """
+    buckets = []
+    cumulative = 0
+    for i, bound in enumerate(histogram.bounds):
+        cumulative += histogram.counts[i]
+        if i % every == every - 1 or i == len(histogram.bounds) - 1:
+            buckets.append((bound, cumulative))
+    return buckets
+
+
+class Registry:
+    """Holds metrics and collectors and renders them as OpenMetrics text"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[['Registry'], Iterable[MetricFamily]]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f'Metric {metric.name} already registered differently')
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[['Registry'], Iterable[MetricFamily]]) -> None:
+        """Add a callable invoked on every render() that returns MetricFamily objects
+
+        The collector receives the registry being rendered, so it can
+        derive values from that registry's metrics (e.g. a merged copy).
+        """
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def metrics(self) -> List[_Metric]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def get(self, name: str) -> Optional[_Metric]:
+        with self._lock:
+            return self._metrics.get(name)
+
+    def collect(self) -> List[MetricFamily]:
+        families = [metric.collect() for metric in self.metrics()]
+        with self._lock:
+            collectors = list(self._collectors)
+        for collector in collectors:
+            families.extend(collector(self))
+        return families
+
+    def dump(self) -> Dict[str, List[list]]:
+        """JSON-serializable values of every metric, keyed by name"""
+        return {metric.name: metric.dump() for metric in self.metrics()}
+
+    def merged(self, dumps: Iterable[Tuple[Dict[str, List[list]], bool]]) -> 'Registry':
+        """A registry with this one's definitions and collectors, summing `dumps`
+
+        dumps holds (Registry.dump() output, include_gauges) pairs; gauges
+        of processes that have exited should be left out, while their
+        counters and histograms still count.
+        """
+        merged = Registry()
+        for metric in self.metrics():
+            merged._metrics[metric.name] = metric.copy_empty()
+        with self._lock:
+            merged._collectors = list(self._collectors)
+        for dumped, include_gauges in dumps:
+            for name, values in dumped.items():
+                metric = merged._metrics.get(name)
+                if metric is None or (metric.kind == 'gauge' and not include_gauges):
+                    continue
+                metric.merge_dump(values)
+        return merged
+
+    def render(self, families: Optional[List[MetricFamily]] = None) -> str:
+        """OpenMetrics text for every metric and collector"""
+        return render(self.collect() if families is None else families)
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    if float(value).is_integer():
+        return f'{value:.1f}'
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render(families: Iterable[MetricFamily]) -> str:
+    """Serialize metric families in the OpenMetrics text format"""
+    lines = []
+    for family in families:
+        lines.append(f'# HELP {family.name} {_escape(family.help)}')
+        lines.append(f'# TYPE {family.name} {family.kind}')
+        for suffix, labels, value in family.samples:
+            if labels:
+                label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f'{family.name}{suffix}{{{label_text}}} {_format_value(value)}')
+            else:
+                lines.append(f'{family.name}{suffix} {_format_value(value)}')
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+# Process-wide default registry
+REGISTRY = Registry()
@@ -0,0 +1,166 @@
+"""
+Multi-process metrics store
+Lets every worker process publish its metrics so any worker can report the
+merged view
+
+Each process periodically writes a JSON snapshot of its registered
+sections (e.g. PerformanceMonitoring counters, the metric registry) to
+<directory>/worker-<pid>.json, atomically and at most once per flush
+interval. Readers load the other workers' files and merge them with their
+own in-memory state. A shared generation number implements reset: bumping
+it makes readers ignore older snapshots and tells every worker to clear
+its counters on its next flush.
+
+The directory should be private to one deployment and emptied (clear())
+when it starts, since files of exited workers are kept so their counts
+are not lost.
+"""
+
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+GENERATION_FILE = 'generation'
+
+# name -> callable(generation) returning a JSON-serializable section
+_sections: Dict[str, Callable[[int], Any]] = {}
+_store: Optional['SharedMetricsStore'] = None
+
+
+def register_section(name: str, dump: Callable[[int], Any]) -> None:
+    """Publish dump(generation) under `name` in this process's snapshots"""
+    _sections[name] = dump
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _write_atomic(path: str, text: str) -> None:
+    """Write via a temp file + rename so readers never see partial files"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as tmp:
+            tmp.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class SharedMetricsStore:
+    """Directory of per-worker metric snapshots"""
+
+    def __init__(self, directory: str, flush_interval: float = 1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._pending_pid = None  # pid that has a trailing flush scheduled
+        os.makedirs(directory, exist_ok=True)
+
+    def _worker_path(self, pid: int) -> str:
+        return os.path.join(self.directory, f'worker-{pid}.json')
+
+    def generation(self) -> int:
+        """Current reset generation (0 before the first reset)"""
+        try:
+            with open(os.path.join(self.directory, GENERATION_FILE)) as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def reset(self) -> int:
+        """Start a new generation; returns it"""
+        with self._lock:
+            generation = self.generation() + 1
+            _write_atomic(os.path.join(self.directory, GENERATION_FILE), str(generation))
+        return generation
+
+    def flush(self, force: bool = False) -> bool:
+        """Write this process's snapshot if the flush interval has passed
+
+        A skipped flush schedules one trailing write for the end of the
+        interval, so the last updates before a worker goes idle still land.
+        Returns True when a snapshot was written.
+        """
+        now = time.monotonic()
+        with self._lock:
+            wait = self.flush_interval - (now - self._last_flush)
+            if not force and wait > 0:
+                if self._pending_pid != os.getpid():
+                    self._pending_pid = os.getpid()
+                    timer = threading.Timer(wait, self._trailing_flush)
+                    timer.daemon = True
+                    timer.start()
+                return False
+            self._last_flush = now
+        generation = self.generation()
+        snapshot = {
+            'pid': os.getpid(),
+            'generation': generation,
+            'written_at': time.time(),
+            'sections': {name: dump(generation) for name, dump in list(_sections.items())}
+        }
+        _write_atomic(self._worker_path(os.getpid()), json.dumps(snapshot, separators=(',', ':')))
+        return True
+
+    def _trailing_flush(self) -> None:
+        with self._lock:
+            self._pending_pid = None
+        self.flush(force=True)
+
+    def read(self, section: str) -> List[Tuple[Any, int, bool]]:
+        """(data, generation, alive) of `section` from every other process"""
+        own = self._worker_path(os.getpid())
+        results = []
+        for path in glob.glob(os.path.join(self.directory, 'worker-*.json')):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue  # removed or unreadable; skip this round
+            data = snapshot.get('sections', {}).get(section)
+            if data is not None:
+                results.append((data, snapshot.get('generation', 0), _pid_alive(snapshot.get('pid', 0))))
+        return results
+
+
+def configure(directory: Optional[str], flush_interval: float = 1.0) -> Optional[SharedMetricsStore]:
+    """Enable the shared store for this process (None/'' disables it)"""
+    global _store
+    _store = SharedMetricsStore(directory, flush_interval) if directory else None
+    return _store
+
+
+def get_store() -> Optional[SharedMetricsStore]:
+    """The configured store, or None when metrics are per-process only"""
+    return _store
+
+
+def maybe_flush() -> None:
+    """Throttled flush of this process's snapshot, if a store is configured"""
+    if _store is not None:
+        _store.flush()
+
+
+def clear(directory: str) -> None:
+    """Remove every snapshot and the generation marker (deployment start)"""
+    for path in glob.glob(os.path.join(directory, 'worker-*.json')):
+        os.unlink(path)
+    marker = os.path.join(directory, GENERATION_FILE)
+    if os.path.exists(marker):
+        os.unlink(marker)
@@ -0,0 +1,344 @@
+"""
+Streaming cross-image aggregation
+Per-class counts, confidence and area statistics over any number of
+images, in memory bounded by the number of classes
+
+CrossImageAggregator consumes one image at a time, either its detections
+(add_image) or per-class counts (add_counts, e.g. rows of the outputs
+table), and produces the aggregate_counts_across_images() report:
+
+    aggregator = CrossImageAggregator()
+    for name, detections in results:
+        aggregator.add_image(name, detections)
+    aggregator.report()
+
+Means, variances, minima and maxima are exact (Welford/Chan running
+statistics); medians come from a log-bucketed quantile sketch with a
+bounded relative error. Aggregators of different shards or workers
+combine with merge().
+
+Over the whole outputs history, straight from the database:
+    python -m src.pipeline.aggregation --since 2026-01-01 --corrected
+"""
+
+import itertools
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .postprocess import GroupedStats, count_objects_by_class
+
+
+class RunningStats:
+    """Count, mean, variance, min, max and sum of a stream of values
+
+    Batches and other instances are combined with Chan et al.'s parallel
+    update of Welford's algorithm, so merging shards gives the same
+    result as one pass over all values.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared deviations from the mean
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float, weight: int = 1):
+        """Add `value` observed `weight` times"""
+        self._combine(weight, float(value), 0.0, float(value), float(value))
+
+    def add_summary(self, count: int, mean: float, std: float, minimum: float, maximum: float):
+        """Add a batch given its population std (as np.std)"""
+        self._combine(int(count), float(mean), float(std) ** 2 * count, float(minimum), float(maximum))
+
+    def merge(self, other: 'RunningStats') -> 'RunningStats':
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+        return self
+
+    def _combine(self, count: int, mean: float, m2: float, minimum: float, maximum: float):
+        if count <= 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+        self.min = min(self.min, minimum)
+        self.max = max(self.max, maximum)
+
+    @property
+    def total(self) -> float:
+        return self.mean * self.count
+
+    @property
+    def variance(self) -> float:
+        """Population variance (np.var)"""
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def describe(self) -> Dict[str, float]:
+        if not self.count:
+            return {'mean': 0, 'std': 0, 'min': 0, 'max': 0}
+        return {'mean': self.mean, 'std': self.std, 'min': self.min, 'max': self.max}
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative error `relative_accuracy`
+
+    Positive values go to logarithmic buckets (the DDSketch scheme): any
+    quantile is returned within the relative accuracy of the true value,
+    using one counter per occupied bucket. Zero and negative values share
+    one bucket reported as 0.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError('relative_accuracy must be between 0 and 1')
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value: float, weight: int = 1):
+        if value > 0:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + weight
+        else:
+            self.zeros += weight
+        self.count += weight
+
+    def add_many(self, values: np.ndarray):
+        values = np.asarray(values, dtype=float)
+        positive = values[values > 0]
+        keys, counts = np.unique(np.ceil(np.log(positive) / self._log_gamma).astype(np.int64),
+                                 return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zeros += len(values) - len(positive)
+        self.count += len(values)
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        if other.gamma != self.gamma:
+            raise ValueError('Only sketches with the same relative accuracy can be merged')
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        return self
+
+    def _value_at(self, rank: int) -> float:
+        """Estimate of the rank-th smallest value (0-based)"""
+        seen = self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                break
+        # Midpoint (in relative terms) of the bucket (gamma^(k-1), gamma^k]
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q: float) -> float:
+        """Estimate of the q-quantile (0 <= q <= 1), interpolated like np.quantile; 0 when empty"""
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        lower = self._value_at(math.floor(rank))
+        upper = self._value_at(math.ceil(rank))
+        return lower + (upper - lower) * (rank - math.floor(rank))
+
+
+class _ClassAccumulator:
+    """Running statistics of one class across images"""
+
+    def __init__(self, relative_accuracy: float):
+        self.confidence = RunningStats()
+        self.area = RunningStats()
+        # The report has a median for confidence only
+        self.confidence_sketch = QuantileSketch(relative_accuracy)
+        # Per-image counts of the images the class appears in
+        self.per_image = RunningStats()
+        self.high = 0
+        self.low = 0
+        self.reliable = 0
+
+    def merge(self, other: '_ClassAccumulator'):
+        for name in ('confidence', 'area', 'confidence_sketch', 'per_image'):
+            getattr(self, name).merge(getattr(other, name))
+        self.high += other.high
+        self.low += other.low
+        self.reliable += other.reliable
+
+    def overall(self) -> Dict[str, Any]:
+        """An entry of count_objects_by_class()"""
+        count = self.confidence.count
+        area = self.area.describe()
+        area['total'] = self.area.total
+        return {
+            'count': count,
+            'confidence_stats': {**self.confidence.describe(), 'median': self.confidence_sketch.quantile(0.5)},
+            'area_stats': area,
+            'quality_flags': {
+                'high_confidence': self.high,
+                'medium_confidence': count - self.high - self.low,
+                'low_confidence': self.low,
+                'reliable': self.reliable / count > 0.5 if count else False
+            }
+        }
+
+    def cross_image(self, total_images: int) -> Dict[str, Any]:
+        counts = self.per_image
+        return {
+            'appears_in_images': counts.count,
+            'total_images': total_images,
+            'frequency': counts.count / total_images if total_images else 0,
+            'count_variance': counts.variance if counts.count > 1 else 0,
+            'avg_count_per_image': counts.mean,
+            'consistency_score': 1 - counts.std / counts.mean if counts.mean > 0 else 0
+        }
+
+
+class CrossImageAggregator:
+    """Incremental aggregate_counts_across_images()
+
+    Memory grows with the number of classes, not images or detections,
+    unless keep_per_image is set (then per_image_stats is filled in as
+    the in-memory function does).
+    """
+
+    def __init__(self, keep_per_image: bool = False, relative_accuracy: float = 0.01):
+        self.keep_per_image = keep_per_image
+        self.relative_accuracy = relative_accuracy
+        self.classes: Dict[str, _ClassAccumulator] = {}
+        self.per_image_stats: Dict[str, Dict] = {}
+        self.total_images = 0
+        self.total_objects = 0
+
+    def _class(self, label: str) -> _ClassAccumulator:
+        accumulator = self.classes.get(label)
+        if accumulator is None:
+            accumulator = self.classes[label] = _ClassAccumulator(self.relative_accuracy)
+        return accumulator
+
+    def add_image(self, image_name: str, detections: List[Dict]):
+        """Fold in one image's detections"""
+        self.total_images += 1
+        self.total_objects += len(detections)
+        if self.keep_per_image:
+            self.per_image_stats[image_name] = count_objects_by_class(detections)
+        if not detections:
+            return
+        grouped = GroupedStats.from_detections(detections)
+        confidence = grouped.stats('confidence')
+        area = grouped.stats('area')
+        high = grouped.count_where(grouped.confidences > 0.8)
+        low = grouped.count_where(grouped.confidences < 0.5)
+        reliable = grouped.count_where(grouped.confidences > 0.7)
+        confidences = grouped.values_by_class('confidence')
+        for i, label in enumerate(grouped.labels):
+            accumulator = self._class(label)
+            count = int(grouped.counts[i])
+            accumulator.confidence.add_summary(count, confidence['mean'][i], confidence['std'][i],
+                                               confidence['min'][i], confidence['max'][i])
+            accumulator.area.add_summary(count, area['mean'][i], area['std'][i], area['min'][i], area['max'][i])
+            accumulator.confidence_sketch.add_many(confidences[label])
+            accumulator.per_image.add(count)
+            accumulator.high += int(high[i])
+            accumulator.low += int(low[i])
+            accumulator.reliable += int(reliable[i])
+
+    def add_counts(self, image_name: str, counts: Dict[str, Tuple[int, float]]):
+        """Fold in one image known only by {label: (count, mean confidence)}
+
+        Each counted object is taken to have the image's mean confidence,
+        so confidence spread within an image is not seen and there are no
+        areas. Classes counted 0 do not appear in the image.
+        """
+        self.total_images += 1
+        present = {label: (int(count), float(conf)) for label, (count, conf) in counts.items() if count > 0}
+        self.total_objects += sum(count for count, _ in present.values())
+        if self.keep_per_image:
+            self.per_image_stats[image_name] = {label: {'count': count, 'confidence_stats': {'mean': conf}}
+                                                for label, (count, conf) in present.items()}
+        for label, (count, conf) in present.items():
+            accumulator = self._class(label)
+            accumulator.confidence.add(conf, count)
+            accumulator.confidence_sketch.add(conf, count)
+            accumulator.per_image.add(count)
+            accumulator.high += count if conf > 0.8 else 0
+            accumulator.low += count if conf < 0.5 else 0
+            accumulator.reliable += count if conf > 0.7 else 0
+
+    def merge(self, other: 'CrossImageAggregator') -> 'CrossImageAggregator':
+        """Combine with an aggregator over other images"""
+        for label, accumulator in other.classes.items():
+            self._class(label).merge(accumulator)
+        self.per_image_stats.update(other.per_image_stats)
+        self.total_images += other.total_images
+        self.total_objects += other.total_objects
+        return self
+
+    def report(self) -> Dict[str, Any]:
+        """Same shape as aggregate_counts_across_images()"""
+        if not self.total_images:
+            return {}
+        return {
+            'overall_counts': {label: acc.overall() for label, acc in self.classes.items()},
+            'per_image_stats': self.per_image_stats,
+            'cross_image_analysis': {label: acc.cross_image(self.total_images)
+                                     for label, acc in self.classes.items()},
+            'summary': {
+                'total_images': self.total_images,
+                'total_objects': self.total_objects,
+                'unique_classes': len(self.classes),
+                'avg_objects_per_image': self.total_objects / self.total_images
+            }
+        }
+
+
+def aggregate_rows(rows: Iterable[Tuple[str, str, int, float]],
+                   aggregator: Optional[CrossImageAggregator] = None) -> CrossImageAggregator:
+    """Fold (image id, label, count, confidence) rows, grouped by image id, into an aggregator"""
+    aggregator = aggregator or CrossImageAggregator()
+    for image_id, image_rows in itertools.groupby(rows, key=lambda row: row[0]):
+        counts: Dict[str, Tuple[int, float]] = {}
+        for _, label, count, confidence in image_rows:
+            previous, previous_conf = counts.get(label, (0, 0.0))
+            total = previous + (count or 0)
+            # Several outputs of one class on one image: count-weighted confidence
+            counts[label] = (total, (previous * previous_conf + (count or 0) * confidence) / total if total else 0.0)
+        aggregator.add_counts(image_id, counts)
+    return aggregator
+
+
+def aggregate_history(database=None, since=None, corrected: bool = False, batch_size: int = 1000,
+                      aggregator: Optional[CrossImageAggregator] = None) -> CrossImageAggregator:
+    """Aggregate the outputs table, streamed in batches of `batch_size` rows"""
+    if database is None:
+        from ..storage import database
+    return aggregate_rows(database.iter_output_counts(since=since, corrected=corrected, batch_size=batch_size),
+                          aggregator)
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    from datetime import datetime
+
+    parser = argparse.ArgumentParser(description='Aggregate counts over the outputs history')
+    parser.add_argument('--since', type=datetime.fromisoformat, help='only outputs created at or after this date')
+    parser.add_argument('--corrected', action='store_true', help='use user-corrected counts where present')
+    parser.add_argument('--batch-size', type=int, default=1000, help='rows fetched per round trip')
+    parser.add_argument('--relative-accuracy', type=float, default=0.01, help='median sketch accuracy')
+    args = parser.parse_args()
+
+    history = aggregate_history(since=args.since, corrected=args.corrected, batch_size=args.batch_size,
+                                aggregator=CrossImageAggregator(relative_accuracy=args.relative_accuracy))
+    print(json.dumps(history.report(), indent=2, default=str))
@@ -0,0 +1,360 @@
+"""
+Model artifacts
+Resolve every model's weights from config.MODEL_DIRECTORY
+
+All weights the pipeline loads live under MODEL_DIRECTORY and are listed
+in its manifest.json with the sha256 and size of each file:
+
+    models/
+        manifest.json
+        sam_vit_b.safetensors                       SAM, converted from the .pth at fetch time
+        hf/microsoft--resnet-50/                    HF snapshot (config, processor, model.safetensors)
+        hf/typeform--distilbert-base-uncased-mnli/
+
+Files are checked against the manifest before they are loaded. Hashes are
+cached in .verified.json by size and mtime, so a restart only rehashes
+files that changed. Weights are stored as safetensors and memory-mapped,
+so loading does not copy them and forked workers share the pages.
+
+Artifacts missing from the manifest are downloaded into MODEL_DIRECTORY
+on first use; with MODEL_OFFLINE nothing is downloaded and a missing or
+corrupt artifact fails the load. Populate the directory ahead of time
+(e.g. when building the image) and check it with:
+    python -m src.pipeline.artifacts fetch
+    python -m src.pipeline.artifacts verify
+"""
+
+import glob
+import hashlib
+import inspect
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import urllib.request
+from typing import Any, Callable, Dict, List, Optional
+
+from ..config import config
+
+CLASSIFIER_MODEL = 'microsoft/resnet-50'
+ZERO_SHOT_MODEL = 'typeform/distilbert-base-uncased-mnli'
+
+SAM_URLS = {
+    'vit_b': 'https://dl.fbaipublicfiles.com/segment_anything/sam_vit_b_01ec64.pth',
+    'vit_l': 'https://dl.fbaipublicfiles.com/segment_anything/sam_vit_l_0b3195.pth',
+    'vit_h': 'https://dl.fbaipublicfiles.com/segment_anything/sam_vit_h_4b8939.pth',
+}
+
+# Weights are only taken as safetensors; repos without them are converted
+HF_PATTERNS = ['*.json', '*.txt', '*.model', '*.safetensors']
+
+MANIFEST = 'manifest.json'
+VERIFIED = '.verified.json'
+
+
+class ArtifactError(RuntimeError):
+    """A model artifact is missing, corrupt or cannot be fetched"""
+
+
+def sha256_file(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    """Write through a temporary file so readers never see a partial file"""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _read_json(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_safetensors(state: Dict[str, Any], path: str):
+    from safetensors.torch import save_file
+
+    # Cloning breaks storage sharing (tied weights), which save_file rejects
+    save_file({name: tensor.detach().clone().contiguous() for name, tensor in state.items()},
+              path, metadata={'format': 'pt'})
+
+
+def load_state_dict(path: str) -> Dict[str, Any]:
+    """Memory-mapped state dict from a .safetensors or torch zip checkpoint"""
+    import torch
+
+    if path.endswith('.safetensors'):
+        from safetensors.torch import load_file
+        return load_file(path, device='cpu')
+    return torch.load(path, map_location='cpu', mmap=True, weights_only=True)
+
+
+def load_sam_model(model_type: str, path: str, build: Optional[Callable[[], Any]] = None):
+    """SAM with weights assigned straight from the mapped checkpoint
+
+    The model is built on the meta device, so no time is spent on random
+    initialisation and parameters point at the mapped file rather than at
+    a copy. `build` defaults to segment_anything's builder for model_type.
+    """
+    import torch
+    from segment_anything import sam_model_registry
+    from segment_anything.modeling import Sam
+
+    build = build or sam_model_registry[model_type]
+    with torch.device('meta'):
+        model = build()
+    model.load_state_dict(load_state_dict(path), assign=True)
+    # pixel_mean/pixel_std are non-persistent buffers, so not in the checkpoint
+    defaults = inspect.signature(Sam.__init__).parameters
+    for name in ('pixel_mean', 'pixel_std'):
+        value = torch.tensor(defaults[name].default, dtype=torch.float32).view(-1, 1, 1)
+        model.register_buffer(name, value, False)
+    missing = [name for name, tensor in list(model.named_parameters()) + list(model.named_buffers())
+               if tensor.is_meta]
+    if missing:
+        raise ArtifactError(f'{path} does not provide {missing[:5]}')
+    return model.eval()
+
+
+class ArtifactStore:
+    """Manifest of model weights in one directory"""
+
+    def __init__(self, directory: str, offline: bool = False, verify: bool = True):
+        self.directory = directory
+        self.offline = offline
+        self.verify_checksums = verify
+        self.resolved: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, MANIFEST)
+
+    def manifest(self) -> Dict[str, Any]:
+        return _read_json(self.manifest_path).get('artifacts', {})
+
+    def register(self, name: str, kind: str, path: str, source: str,
+                 revision: Optional[str] = None) -> Dict[str, Any]:
+        """Hash the files at `path` (relative to the directory) into the manifest"""
+        full_path = os.path.join(self.directory, path)
+        if os.path.isdir(full_path):
+            files = sorted(os.path.relpath(f, self.directory)
+                           for f in glob.glob(os.path.join(full_path, '**', '*'), recursive=True)
+                           if os.path.isfile(f))
+            # snapshot_download keeps its own metadata under .cache/
+            files = [f for f in files if not any(part.startswith('.') for part in f.split(os.sep))]
+        elif os.path.isfile(full_path):
+            files = [path]
+        else:
+            raise ArtifactError(f'Nothing to register at {full_path}')
+
+        verified = _read_json(os.path.join(self.directory, VERIFIED))
+        entry = {
+            'kind': kind,
+            'path': path,
+            'source': source,
+            'revision': revision,
+            'fetched_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'files': {}
+        }
+        for relative in files:
+            full = os.path.join(self.directory, relative)
+            stat = os.stat(full)
+            digest = sha256_file(full)
+            entry['files'][relative] = {'sha256': digest, 'size': stat.st_size}
+            verified[relative] = {'sha256': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+        with self._lock:
+            data = _read_json(self.manifest_path) or {'version': 1, 'artifacts': {}}
+            data['artifacts'][name] = entry
+            _write_json(self.manifest_path, data)
+            _write_json(os.path.join(self.directory, VERIFIED), verified)
+        return entry
+
+    def verify(self, name: str, use_cache: bool = True) -> List[str]:
+        """Problems with an artifact's files (empty when it matches the manifest)"""
+        entry = self.manifest().get(name)
+        if entry is None:
+            return [f'{name} is not in {self.manifest_path}']
+        verified_path = os.path.join(self.directory, VERIFIED)
+        verified = _read_json(verified_path)
+        problems = []
+        updated = False
+        for relative, expected in entry['files'].items():
+            full = os.path.join(self.directory, relative)
+            if not os.path.isfile(full):
+                problems.append(f'{relative} is missing')
+                continue
+            stat = os.stat(full)
+            if stat.st_size != expected['size']:
+                problems.append(f'{relative} is {stat.st_size} bytes, expected {expected["size"]}')
+                continue
+            cached = verified.get(relative)
+            if (use_cache and cached and cached['size'] == stat.st_size
+                    and cached['mtime_ns'] == stat.st_mtime_ns):
+                digest = cached['sha256']
+            else:
+                digest = sha256_file(full)
+                verified[relative] = {'sha256': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+                updated = True
+            if digest != expected['sha256']:
+                problems.append(f'{relative} has sha256 {digest}, expected {expected["sha256"]}')
+        if updated:
+            with self._lock:
+                _write_json(verified_path, verified)
+        return problems
+
+    def resolve(self, name: str) -> str:
+        """Local path of a verified artifact, fetching it first when allowed"""
+        start = time.perf_counter()
+        if name not in self.manifest():
+            if self.offline:
+                raise ArtifactError(
+                    f'{name} is not in {self.manifest_path} and MODEL_OFFLINE is set; '
+                    f'run: python -m src.pipeline.artifacts fetch')
+            self.fetch(name)
+        entry = self.manifest()[name]
+        if self.verify_checksums:
+            problems = self.verify(name)
+            if problems:
+                raise ArtifactError(f'{name} failed verification: {"; ".join(problems)}')
+        path = os.path.join(self.directory, entry['path'])
+        self.resolved[name] = {
+            'path': path,
+            'source': entry['source'],
+            'revision': entry.get('revision'),
+            'verified': self.verify_checksums,
+            'resolve_seconds': time.perf_counter() - start
+        }
+        return path
+
+    def fetch(self, name: str, force: bool = False) -> Dict[str, Any]:
+        """Download an artifact into the directory and add it to the manifest"""
+        if self.offline:
+            raise ArtifactError(f'Cannot fetch {name}: MODEL_OFFLINE is set')
+        if not force and name in self.manifest() and not self.verify(name):
+            return self.manifest()[name]
+        os.makedirs(self.directory, exist_ok=True)
+        if name.startswith('sam_'):
+            return self._fetch_sam(name[len('sam_'):])
+        return self._fetch_hf(name)
+
+    def _fetch_sam(self, model_type: str) -> Dict[str, Any]:
+        import torch
+
+        if model_type == config.SAM_MODEL_TYPE:
+            url = config.SAM_CHECKPOINT_URL
+        elif model_type in SAM_URLS:
+            url = SAM_URLS[model_type]
+        else:
+            raise ArtifactError(f'No checkpoint URL for SAM {model_type!r}')
+        logging.info(f'Downloading {url}')
+        with tempfile.TemporaryDirectory(dir=self.directory) as tmp:
+            checkpoint = os.path.join(tmp, os.path.basename(url) or 'checkpoint.pth')
+            with urllib.request.urlopen(url) as response, open(checkpoint, 'wb') as f:
+                shutil.copyfileobj(response, f, 1 << 20)
+            source_sha256 = sha256_file(checkpoint)
+            path = f'sam_{model_type}.safetensors'
+            converted = os.path.join(tmp, path)
+            _save_safetensors(torch.load(checkpoint, map_location='cpu', weights_only=True), converted)
+            os.replace(converted, os.path.join(self.directory, path))
+        return self.register(f'sam_{model_type}', 'sam', path, url, revision=f'sha256:{source_sha256}')
+
+    def _fetch_hf(self, repo_id: str, revision: Optional[str] = None) -> Dict[str, Any]:
+        import torch
+        from huggingface_hub import HfApi, hf_hub_download, snapshot_download
+
+        revision = HfApi().model_info(repo_id, revision=revision).sha
+        path = os.path.join('hf', repo_id.replace('/', '--'))
+        target = os.path.join(self.directory, path)
+        logging.info(f'Downloading {repo_id}@{revision}')
+        snapshot_download(repo_id, revision=revision, local_dir=target, allow_patterns=HF_PATTERNS)
+        if not glob.glob(os.path.join(target, '*.safetensors')):
+            # Older repos only ship pytorch_model.bin
+            weights = hf_hub_download(repo_id, 'pytorch_model.bin', revision=revision, local_dir=target)
+            _save_safetensors(torch.load(weights, map_location='cpu', weights_only=True),
+                              os.path.join(target, 'model.safetensors'))
+            os.remove(weights)
+        return self.register(repo_id, 'hf', path, repo_id, revision=revision)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'directory': self.directory,
+            'offline': self.offline,
+            'verify_checksums': self.verify_checksums,
+            'resolved': dict(self.resolved)
+        }
+
+
+_store: Optional[ArtifactStore] = None
+
+
+def get_store() -> ArtifactStore:
+    """Store for config.MODEL_DIRECTORY"""
+    global _store
+    if _store is None:
+        _store = ArtifactStore(config.MODEL_DIRECTORY, offline=config.MODEL_OFFLINE,
+                               verify=config.VERIFY_MODEL_CHECKSUMS)
+    return _store
+
+
+def sam_checkpoint(model_type: str) -> str:
+    """Verified SAM checkpoint for model_type
+
+    Checkpoints dropped next to the app before the manifest existed are
+    still used (unverified) rather than downloading a second copy.
+    """
+    store = get_store()
+    name = f'sam_{model_type}'
+    if name not in store.manifest():
+        legacy = [os.path.join(store.directory, f'sam_{model_type}.pth'), f'sam_{model_type}.pth']
+        if model_type in SAM_URLS:
+            legacy.append(os.path.basename(SAM_URLS[model_type]))
+        for candidate in legacy:
+            if os.path.exists(candidate):
+                logging.warning(f'{candidate} is not in {store.manifest_path}; loading it unverified')
+                store.resolved[name] = {'path': candidate, 'source': candidate, 'revision': None,
+                                        'verified': False, 'resolve_seconds': 0.0}
+                return candidate
+    return store.resolve(name)
+
+
+def hf_model(repo_id: str) -> str:
+    """Verified local directory of a Hugging Face model"""
+    return get_store().resolve(repo_id)
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='Fetch and verify model weights in MODEL_DIRECTORY')
+    parser.add_argument('command', choices=['fetch', 'verify'])
+    parser.add_argument('--models', nargs='+',
+                        default=[f'sam_{config.SAM_MODEL_TYPE}', CLASSIFIER_MODEL, ZERO_SHOT_MODEL],
+                        help='artifact names (sam_<type> or Hugging Face repo ids)')
+    parser.add_argument('--directory', default=config.MODEL_DIRECTORY)
+    parser.add_argument('--force', action='store_true', help='download again even if verified')
+    args = parser.parse_args()
+
+    store = ArtifactStore(args.directory)
+    report = {}
+    for name in args.models:
+        if args.command == 'fetch':
+            store.fetch(name, force=args.force)
+        # Always rehash: this is the check to run after copying the directory
+        report[name] = store.verify(name, use_cache=False) or 'ok'
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if all(result == 'ok' for result in report.values()) else 1)
@@ -0,0 +1,359 @@
+"""
+Inference backends
+Runs the SAM image encoder, SAM mask decoder and the classifier from
+exported graphs instead of the eager Python models
+
+Backends (config.INFERENCE_BACKEND):
+    eager        the segment_anything / transformers modules as loaded
+    torchscript  frozen torch.jit graphs
+    onnxruntime  ONNX graphs run by ONNX Runtime (optional dependency)
+
+A runner takes and returns torch tensors, so the pipeline code does not
+change: the adapters below stand in for sam.image_encoder,
+sam.mask_decoder and the HF classifier. A component without an exported
+artifact (or whose runner cannot load) stays eager.
+
+Export the current eager models, checking parity against them:
+    python -m src.pipeline.backends --backend torchscript onnxruntime
+"""
+
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import torch
+
+BACKENDS = ('eager', 'torchscript', 'onnxruntime')
+COMPONENTS = ('sam_encoder', 'sam_decoder', 'classifier')
+EXTENSIONS = {'torchscript': '.torchscript.pt', 'onnxruntime': '.onnx'}
+
+# ONNX input/output names and dynamic axes per component
+ONNX_SPECS = {
+    'sam_encoder': {
+        'input_names': ['image'],
+        'output_names': ['image_embeddings'],
+        'dynamic_axes': {}
+    },
+    'sam_decoder': {
+        'input_names': ['image_embeddings', 'image_pe', 'sparse_prompt_embeddings', 'dense_prompt_embeddings'],
+        'output_names': ['masks', 'iou_predictions'],
+        'dynamic_axes': {'sparse_prompt_embeddings': {0: 'points', 1: 'tokens'},
+                         'dense_prompt_embeddings': {0: 'points'},
+                         'masks': {0: 'points'}, 'iou_predictions': {0: 'points'}}
+    },
+    'classifier': {
+        'input_names': ['pixel_values'],
+        'output_names': ['logits'],
+        'dynamic_axes': {'pixel_values': {0: 'batch'}, 'logits': {0: 'batch'}}
+    }
+}
+
+
+def artifact_name(component: str, model_name: str) -> str:
+    """File stem for a component of a given model (e.g. sam_vit_b_encoder)"""
+    if component == 'classifier':
+        return f"classifier-{model_name.replace('/', '--')}"
+    return f"{model_name}_{component.split('_', 1)[1]}"
+
+
+def artifact_path(directory: str, component: str, model_name: str, backend: str) -> str:
+    if backend not in EXTENSIONS:
+        raise ValueError(f'No exported artifacts for backend {backend!r}; expected one of {tuple(EXTENSIONS)}')
+    return os.path.join(directory, artifact_name(component, model_name) + EXTENSIONS[backend])
+
+
+class Runner:
+    """Callable running one exported graph on torch tensors"""
+
+    backend = ''
+
+    def __call__(self, *inputs: torch.Tensor):
+        """Run the graph; one tensor for single-output graphs, else a tuple"""
+        raise NotImplementedError
+
+
+class EagerRunner(Runner):
+    backend = 'eager'
+
+    def __init__(self, module: torch.nn.Module):
+        self.module = module
+
+    def __call__(self, *inputs):
+        with torch.no_grad():
+            return self.module(*inputs)
+
+
+class TorchScriptRunner(Runner):
+    backend = 'torchscript'
+
+    def __init__(self, path: str):
+        self.path = path
+        self.module = torch.jit.load(path, map_location='cpu').eval()
+
+    def __call__(self, *inputs):
+        with torch.no_grad():
+            return self.module(*inputs)
+
+
+class OnnxRuntimeRunner(Runner):
+    backend = 'onnxruntime'
+
+    def __init__(self, path: str, threads: int = 0):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError('The onnxruntime backend needs: pip install onnxruntime') from e
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.path = path
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def __call__(self, *inputs):
+        feeds = {name: tensor.detach().cpu().numpy() for name, tensor in zip(self.input_names, inputs)}
+        outputs = [torch.from_numpy(output) for output in self.session.run(None, feeds)]
+        return outputs[0] if len(outputs) == 1 else tuple(outputs)
+
+
+def load_runner(backend: str, path: str) -> Runner:
+    """Runner for an exported artifact; raises if it cannot be loaded"""
+    if backend == 'torchscript':
+        return TorchScriptRunner(path)
+    if backend == 'onnxruntime':
+        from .execution import get_policy
+        return OnnxRuntimeRunner(path, threads=get_policy().threads_per_slot)
+    raise ValueError(f'Unknown inference backend {backend!r}; expected one of {BACKENDS}')
+
+
+def try_load_runner(backend: str, path: str) -> Optional[Runner]:
+    """load_runner(), or None (with a warning) so the caller stays eager"""
+    if backend == 'eager':
+        return None
+    if not os.path.exists(path):
+        logging.warning(f"No {backend} artifact at {path}; using the eager model")
+        return None
+    try:
+        return load_runner(backend, path)
+    except Exception as e:
+        logging.warning(f"Could not load {path} ({e}); using the eager model")
+        return None
+
+
+def _register_graph(adapter: torch.nn.Module, runner: Runner) -> None:
+    """Keep torch graphs as submodules so memory reporting sees their weights"""
+    module = getattr(runner, 'module', None)
+    if isinstance(module, torch.nn.Module):
+        adapter.add_module('graph', module)
+
+
+class RunnerImageEncoder(torch.nn.Module):
+    """Stands in for sam.image_encoder (forward hooks still fire)"""
+
+    def __init__(self, runner: Runner, img_size: int):
+        super().__init__()
+        self.runner = runner
+        self.img_size = img_size
+        self.backend = runner.backend
+        _register_graph(self, runner)
+
+    def forward(self, x):
+        return self.runner(x)
+
+
+class RunnerMaskDecoder(torch.nn.Module):
+    """Stands in for sam.mask_decoder
+
+    Graphs are exported with multimask_output=True, which is what the
+    automatic mask generator uses; other calls go to the eager decoder.
+    """
+
+    def __init__(self, runner: Runner, eager: torch.nn.Module):
+        super().__init__()
+        self.runner = runner
+        self.eager = eager
+        self.backend = runner.backend
+        _register_graph(self, runner)
+
+    def forward(self, image_embeddings, image_pe, sparse_prompt_embeddings,
+                dense_prompt_embeddings, multimask_output: bool):
+        if not multimask_output:
+            return self.eager(image_embeddings=image_embeddings, image_pe=image_pe,
+                              sparse_prompt_embeddings=sparse_prompt_embeddings,
+                              dense_prompt_embeddings=dense_prompt_embeddings,
+                              multimask_output=False)
+        return tuple(self.runner(image_embeddings, image_pe,
+                                 sparse_prompt_embeddings, dense_prompt_embeddings))
+
+
+class RunnerClassifier(torch.nn.Module):
+    """Stands in for the HF classifier: classifier(pixel_values=...).logits"""
+
+    def __init__(self, runner: Runner, config):
+        super().__init__()
+        self.runner = runner
+        self.config = config
+        self.backend = runner.backend
+        _register_graph(self, runner)
+
+    def forward(self, pixel_values, **kwargs):
+        from transformers.modeling_outputs import ImageClassifierOutputWithNoAttention
+
+        return ImageClassifierOutputWithNoAttention(logits=self.runner(pixel_values))
+
+
+def backend_name(module) -> str:
+    """Backend a (possibly adapted) module runs on"""
+    return getattr(module, 'backend', 'eager')
+
+
+def apply_sam_backend(sam_model, backend: str, model_name: str, directory: str) -> None:
+    """Swap the encoder/decoder of a loaded Sam for exported runners, where available"""
+    if backend == 'eager':
+        return
+    encoder = try_load_runner(backend, artifact_path(directory, 'sam_encoder', model_name, backend))
+    if encoder is not None:
+        sam_model.image_encoder = RunnerImageEncoder(encoder, sam_model.image_encoder.img_size)
+    decoder = try_load_runner(backend, artifact_path(directory, 'sam_decoder', model_name, backend))
+    if decoder is not None:
+        sam_model.mask_decoder = RunnerMaskDecoder(decoder, sam_model.mask_decoder)
+
+
+# --- Export -----------------------------------------------------------------
+
+class _MaskDecoderGraph(torch.nn.Module):
+    """Positional-argument mask decoder with multimask_output fixed to True"""
+
+    def __init__(self, mask_decoder):
+        super().__init__()
+        self.mask_decoder = mask_decoder
+
+    def forward(self, image_embeddings, image_pe, sparse_prompt_embeddings, dense_prompt_embeddings):
+        return self.mask_decoder(image_embeddings=image_embeddings, image_pe=image_pe,
+                                 sparse_prompt_embeddings=sparse_prompt_embeddings,
+                                 dense_prompt_embeddings=dense_prompt_embeddings,
+                                 multimask_output=True)
+
+
+class _ClassifierGraph(torch.nn.Module):
+    """HF classifier as pixel_values -> logits"""
+
+    def __init__(self, classifier):
+        super().__init__()
+        self.classifier = classifier
+
+    def forward(self, pixel_values):
+        return self.classifier(pixel_values=pixel_values).logits
+
+
+def sam_export_modules(sam_model, points: int = 4) -> Dict[str, Tuple[torch.nn.Module, Tuple]]:
+    """Exportable SAM modules with example inputs, keyed by component"""
+    size = sam_model.image_encoder.img_size
+    image = torch.randn(1, 3, size, size)
+    with torch.no_grad():
+        embeddings = sam_model.image_encoder(image)
+        coords = torch.rand(points, 1, 2) * size
+        labels = torch.ones(points, 1, dtype=torch.int)
+        sparse, dense = sam_model.prompt_encoder(points=(coords, labels), boxes=None, masks=None)
+    image_pe = sam_model.prompt_encoder.get_dense_pe()
+    return {
+        'sam_encoder': (sam_model.image_encoder, (image,)),
+        'sam_decoder': (_MaskDecoderGraph(sam_model.mask_decoder), (embeddings, image_pe, sparse, dense))
+    }
+
+
+def classifier_export_module(classifier, processor) -> Tuple[torch.nn.Module, Tuple]:
+    """Exportable classifier with an example input from the processor"""
+    from PIL import Image
+
+    pixel_values = processor(Image.new('RGB', (224, 224), (128, 128, 128)), return_tensors='pt')['pixel_values']
+    return _ClassifierGraph(classifier), (pixel_values,)
+
+
+def export(module: torch.nn.Module, example_inputs: Tuple, backend: str, path: str,
+           component: str) -> str:
+    """Write `module` traced on `example_inputs` as a `backend` artifact"""
+    module = module.eval()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with torch.no_grad():
+        if backend == 'torchscript':
+            traced = torch.jit.trace(module, example_inputs, check_trace=False)
+            torch.jit.save(torch.jit.freeze(traced), path)
+        elif backend == 'onnxruntime':
+            torch.onnx.export(module, example_inputs, path, opset_version=17, dynamo=False,
+                              **ONNX_SPECS[component])
+        else:
+            raise ValueError(f'Cannot export to {backend!r}; expected torchscript or onnxruntime')
+    return path
+
+
+def max_abs_diff(expected, actual) -> float:
+    """Largest elementwise difference between two outputs (tensor or tuple)"""
+    if isinstance(expected, torch.Tensor):
+        expected, actual = (expected,), (actual,)
+    return max(float((e.float() - a.float()).abs().max()) for e, a in zip(expected, actual))
+
+
+def parity(module: torch.nn.Module, runner: Runner, example_inputs: Tuple) -> float:
+    """max_abs_diff between the eager module and a runner on the same inputs"""
+    with torch.no_grad():
+        return max_abs_diff(module(*example_inputs), runner(*example_inputs))
+
+
+def export_pipeline(pipeline, backends: Sequence[str] = ('torchscript',),
+                    components: Sequence[str] = COMPONENTS,
+                    directory: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Export the eager models of a LightweightPipeline and check parity
+
+    Returns one report per (component, backend): path, export seconds and
+    the largest output difference against the eager model.
+    """
+    from ..config import config
+
+    directory = directory or config.EXPORT_DIRECTORY
+    modules = {}
+    if pipeline.sam_model is not None and {'sam_encoder', 'sam_decoder'} & set(components):
+        modules.update(sam_export_modules(pipeline.sam_model))
+    if 'classifier' in components:
+        modules['classifier'] = classifier_export_module(pipeline.classifier, pipeline.processor)
+
+    reports = []
+    for component in components:
+        if component not in modules:
+            reports.append({'component': component, 'error': 'model not loaded'})
+            continue
+        module, example_inputs = modules[component]
+        model_name = pipeline.classification_model if component == 'classifier' else f'sam_{pipeline.sam_model_type}'
+        for backend in backends:
+            path = artifact_path(directory, component, model_name, backend)
+            report = {'component': component, 'backend': backend, 'path': path}
+            try:
+                start = time.perf_counter()
+                export(module, example_inputs, backend, path, component)
+                report['export_seconds'] = round(time.perf_counter() - start, 2)
+                report['max_abs_diff'] = parity(module, load_runner(backend, path), example_inputs)
+            except Exception as e:
+                report['error'] = str(e)
+            reports.append(report)
+    return reports
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Export pipeline models for the torchscript/onnxruntime backends')
+    parser.add_argument('--backend', nargs='+', choices=BACKENDS[1:], default=['torchscript'])
+    parser.add_argument('--components', nargs='+', choices=COMPONENTS, default=list(COMPONENTS))
+    parser.add_argument('--directory', help='output directory (default: EXPORT_DIRECTORY)')
+    args = parser.parse_args()
+
+    from ..config import config
+    # Export from the plain fp32 eager models
+    config.INFERENCE_BACKEND = 'eager'
+    config.CLASSIFIER_QUANTIZATION = 'none'
+    from .pipeline import get_pipeline
+
+    print(json.dumps(export_pipeline(get_pipeline(), args.backend, args.components, args.directory), indent=2))
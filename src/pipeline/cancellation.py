@@ -0,0 +1,121 @@
+"""
+Cooperative cancellation
+Deadline/cancel tokens checked at stage boundaries of a pipeline run
+
+A token carries an optional deadline, a cancel flag and optionally an
+external check (e.g. whether an async job was cancelled). Views create
+one per request (PROCESSING_TIMEOUT) or per batch
+(BATCH_PROCESSING_TIMEOUT, with a child token per image). run_pipeline
+makes it current, and checkpoint() calls between stages, between
+classified segments and in SAM forward hooks raise PipelineCancelled
+once the token fires, so the worker thread is freed at the next
+checkpoint instead of running to the end.
+
+Usage:
+    token = CancellationToken(timeout=30)
+    with use_token(token):
+        ...
+        checkpoint('classification')  # raises PipelineCancelled when due
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+_current_token: ContextVar[Optional['CancellationToken']] = ContextVar('cancellation_token', default=None)
+
+
+class PipelineCancelled(Exception):
+    """A pipeline run stopped at a checkpoint
+
+    `reason` is 'timeout' (deadline passed) or 'cancelled'; `stage` is
+    where the run stopped.
+    """
+
+    def __init__(self, reason: str, stage: Optional[str] = None):
+        self.reason = reason
+        self.stage = stage
+        what = 'timed out' if reason == 'timeout' else 'was cancelled'
+        super().__init__(f"Processing {what}" + (f" during {stage}" if stage else ''))
+
+
+class CancellationToken:
+    """Deadline and cancel flag shared by everything working for one request
+
+    Args:
+        timeout: seconds from now until the deadline (None: no deadline)
+        parent: token whose cancellation and deadline also apply
+        is_cancelled: extra check polled at every checkpoint
+    """
+
+    def __init__(self, timeout: Optional[float] = None, parent: Optional['CancellationToken'] = None,
+                 is_cancelled: Optional[Callable[[], bool]] = None):
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        if parent is not None and parent.deadline is not None:
+            self.deadline = parent.deadline if self.deadline is None else min(self.deadline, parent.deadline)
+        self.parent = parent
+        self._is_cancelled = is_cancelled
+        self._cancelled = threading.Event()
+
+    def child(self, timeout: Optional[float] = None) -> 'CancellationToken':
+        """A token for part of the work, ending at its own deadline or this one's"""
+        return CancellationToken(timeout, parent=self)
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds until the deadline (0 once passed), None without one"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def reason(self) -> Optional[str]:
+        """'cancelled', 'timeout' or None while the work may go on"""
+        if (self._cancelled.is_set() or (self._is_cancelled is not None and self._is_cancelled())
+                or (self.parent is not None and self.parent.reason() == 'cancelled')):
+            return 'cancelled'
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return 'timeout'
+        return None
+
+    def check(self, stage: Optional[str] = None) -> None:
+        """Raise PipelineCancelled if the work should stop"""
+        reason = self.reason()
+        if reason:
+            raise PipelineCancelled(reason, stage)
+
+
+@contextmanager
+def use_token(token: Optional[CancellationToken]):
+    """Make `token` the one checkpoint() checks in this thread/context"""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def current_token() -> Optional[CancellationToken]:
+    """The active token, or None outside use_token()"""
+    return _current_token.get()
+
+
+def checkpoint(stage: Optional[str] = None) -> None:
+    """Stop here if the active token fired; a no-op without one"""
+    token = _current_token.get()
+    if token is not None:
+        token.check(stage)
+
+
+def checkpoint_hook(stage: str) -> Callable:
+    """torch forward pre-hook running checkpoint(stage) before each forward
+
+    Lets model internals that loop over many forwards (SAM's mask
+    generator) stop between them.
+    """
+    def hook(module, args):
+        checkpoint(stage)
+    return hook
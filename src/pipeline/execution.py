@@ -0,0 +1,184 @@
+"""
+CPU execution policy
+Partitions the CPU cores between concurrent inference slots
+
+Every torch forward pass starts an OpenMP team as wide as the intra-op
+thread count, which defaults to every core. Several requests inferring at
+once therefore run several full-width teams that oversubscribe the cores
+and are slower together than one after another. The policy instead allows
+at most `slots` inferences at a time per process and gives each one
+cores // slots threads:
+
+    with inference_slot():
+        result = run_pipeline(image_path)
+
+A slot bounds whole pipeline runs, not SAM runs. SAM and MobileSAM keep
+the current image on their predictor, so each segmenter serializes its
+mask generation behind a lock (see segmenters.py): with N slots, up to N
+runs decode, classify and post-process at once, but only one image per
+generator is being segmented at a time, and the other runs wait in
+mask_generation. Contour segmentation has no such state and overlaps
+freely.
+
+Slots come from MAX_CONCURRENT_REQUESTS (capped at the core count on CPU),
+the cores from this process's CPU affinity split across the worker
+processes (see src/serving.py). TORCH_NUM_THREADS overrides the per-slot
+thread count.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from ..config import config
+from ..metrics.instruments import INFERENCE_QUEUE_DEPTH, INFERENCE_SLOTS_BUSY
+from .tracing import span
+
+
+def available_cores() -> int:
+    """CPU cores this process may run on (respects taskset/cpusets)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+class ExecutionPolicy:
+    """How many inferences run at once and how many threads each one gets"""
+
+    def __init__(self, cores: int, workers: int = 1, max_concurrent: int = 1,
+                 device: str = 'cpu', threads_override: int = 0, interop_threads: int = 1):
+        self.device = device
+        self.workers = max(1, workers)
+        # Cores available to this worker process
+        self.cores = max(1, cores // self.workers)
+        slots = max(1, max_concurrent)
+        if device == 'cpu':
+            # A slot needs at least one core of its own
+            slots = min(slots, self.cores)
+        self.slots = slots
+        if threads_override > 0:
+            self.threads_per_slot = threads_override
+        else:
+            self.threads_per_slot = max(1, self.cores // self.slots)
+        self.interop_threads = max(1, interop_threads)
+        self.interop_applied = False
+
+        self._semaphore = threading.BoundedSemaphore(self.slots)
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._waiting = 0
+
+    @classmethod
+    def from_config(cls, workers: int = 1) -> 'ExecutionPolicy':
+        return cls(
+            cores=available_cores(),
+            workers=workers,
+            max_concurrent=config.MAX_CONCURRENT_REQUESTS,
+            device=config.AI_DEVICE,
+            threads_override=config.TORCH_NUM_THREADS,
+            interop_threads=config.TORCH_INTEROP_THREADS
+        )
+
+    def apply(self) -> None:
+        """Set the process-wide torch thread counts for this layout
+
+        The inter-op pool can only be sized before torch first uses it;
+        later calls keep the existing pool and report interop_applied=False.
+        """
+        import torch
+
+        torch.set_num_threads(self.threads_per_slot)
+        try:
+            torch.set_num_interop_threads(self.interop_threads)
+            self.interop_applied = True
+        except RuntimeError:
+            self.interop_applied = False
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None):
+        """Hold one inference slot for the enclosed block
+
+        Waits up to `timeout` seconds for a free slot (traced as the
+        queue_wait stage) and raises TimeoutError after that. The torch
+        thread count is set in the calling thread, since OpenMP keeps it
+        per thread. Holding a slot does not make SAM mask generation
+        concurrent; it stays one image at a time per generator.
+        """
+        import torch
+
+        with self._lock:
+            self._waiting += 1
+        INFERENCE_QUEUE_DEPTH.inc()
+        try:
+            with span('queue_wait'):
+                acquired = self._semaphore.acquire(timeout=timeout)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+            INFERENCE_QUEUE_DEPTH.dec()
+        if not acquired:
+            raise TimeoutError(f'No inference slot became free within {timeout}s')
+
+        with self._lock:
+            self._busy += 1
+        INFERENCE_SLOTS_BUSY.inc()
+        try:
+            if torch.get_num_threads() != self.threads_per_slot:
+                torch.set_num_threads(self.threads_per_slot)
+            yield self
+        finally:
+            with self._lock:
+                self._busy -= 1
+            INFERENCE_SLOTS_BUSY.dec()
+            self._semaphore.release()
+
+    def describe(self) -> Dict[str, Any]:
+        """The chosen layout and current slot usage, for status endpoints"""
+        with self._lock:
+            busy, waiting = self._busy, self._waiting
+        return {
+            'device': self.device,
+            'workers': self.workers,
+            'cores_per_worker': self.cores,
+            'inference_slots': self.slots,
+            'threads_per_slot': self.threads_per_slot,
+            'interop_threads': self.interop_threads,
+            'interop_applied': self.interop_applied,
+            'slots_busy': busy,
+            'queue_depth': waiting
+        }
+
+
+_policy: Optional[ExecutionPolicy] = None
+_policy_lock = threading.Lock()
+
+
+def configure(workers: int = 1) -> ExecutionPolicy:
+    """Build and apply the policy for a process that is one of `workers`
+
+    Call once per process before serving (gunicorn calls it after fork).
+    """
+    global _policy
+    with _policy_lock:
+        _policy = ExecutionPolicy.from_config(workers)
+        _policy.apply()
+    return _policy
+
+
+def get_policy() -> ExecutionPolicy:
+    """The process's policy; configured for a single process on first use"""
+    global _policy
+    if _policy is None:
+        with _policy_lock:
+            if _policy is None:
+                _policy = ExecutionPolicy.from_config()
+                _policy.apply()
+    return _policy
+
+
+@contextmanager
+def inference_slot(timeout: Optional[float] = None):
+    """Hold a slot of the process's policy (see ExecutionPolicy.slot)"""
+    with get_policy().slot(timeout) as policy:
+        yield policy
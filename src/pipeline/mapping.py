@@ -5,7 +5,10 @@ Maps raw model outputs to meaningful, consistent labels
 
 from typing import List, Dict, Any, Optional
 import re
-from transformers import pipeline
+import time
+
+from .artifacts import ZERO_SHOT_MODEL, hf_model
+from ..metrics.instruments import CACHE_LOOKUPS, MODEL_LOADS, MODEL_LOAD_SECONDS
 
 
 # Predefined synonym mappings
@@ -75,21 +78,32 @@ class LabelMapper:
         """
         self.use_zero_shot = use_zero_shot
         self.zero_shot_classifier = None
+        self.model_name = ZERO_SHOT_MODEL
         self._cache = {}  # Cache for zero-shot results
+        self.load_seconds = None  # zero-shot model load time
+        self.last_inference_seconds = None  # latest zero-shot call
         
         if use_zero_shot:
             self._load_zero_shot_classifier()
     
     def _load_zero_shot_classifier(self):
         """Load zero-shot classification model"""
+        from transformers import pipeline
+
+        load_start = time.perf_counter()
         try:
             self.zero_shot_classifier = pipeline(
                 "zero-shot-classification",
-                model="typeform/distilbert-base-uncased-mnli",
-                device=-1  # CPU
+                model=hf_model(self.model_name),
+                device=-1,  # CPU
+                model_kwargs={'use_safetensors': True}
             )
             print("Zero-shot classifier loaded")
+            self.load_seconds = time.perf_counter() - load_start
+            MODEL_LOADS.inc(model='zero_shot', status='success')
+            MODEL_LOAD_SECONDS.observe(self.load_seconds, model='zero_shot')
         except Exception as e:
+            MODEL_LOADS.inc(model='zero_shot', status='failure')
             print(f"Zero-shot classifier failed to load: {e}")
             self.use_zero_shot = False
     
@@ -135,11 +149,15 @@ class LabelMapper:
         # Check cache
         cache_key = f"{raw_label}_{hash(tuple(candidate_labels))}"
         if cache_key in self._cache:
+            CACHE_LOOKUPS.inc(cache='label_mapping', result='hit')
             return self._cache[cache_key]
+        CACHE_LOOKUPS.inc(cache='label_mapping', result='miss')
         
         try:
             # Run zero-shot classification
+            inference_start = time.perf_counter()
             result = self.zero_shot_classifier(raw_label, candidate_labels)
+            self.last_inference_seconds = time.perf_counter() - inference_start
             
             mapped_label = result['labels'][0]
             mapping_confidence = result['scores'][0]
@@ -251,6 +269,11 @@ def get_mapper(use_zero_shot: bool = True) -> LabelMapper:
     return _global_mapper
 
 
+def loaded_mapper() -> Optional[LabelMapper]:
+    """The global mapper if it has been created, without creating it"""
+    return _global_mapper
+
+
 def map_labels(detections: List[Dict], 
                candidate_labels: Optional[List[str]] = None,
                mapping_threshold: float = 0.5) -> List[Dict]:
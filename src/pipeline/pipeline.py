@@ -5,22 +5,73 @@ Coordinates SAM segmentation + ResNet classification
 Usage:
     from app.pipeline import run_pipeline
     results = run_pipeline(image_path, confidence_threshold=0.7)
+
+torch, OpenCV, segment_anything and transformers are imported where the
+models load and run, not at module level: importing this module (and so
+src.app) stays cheap for processes that never run inference. Check with:
+    python benchmarks/startup.py
 """
 
-import torch
 import numpy as np
-from PIL import Image
-import cv2
-from segment_anything import SamAutomaticMaskGenerator, sam_model_registry
-from transformers import AutoImageProcessor, AutoModelForImageClassification
 import os
-from typing import List, Dict, Any
+import threading
+import time
+from contextlib import ExitStack
+from typing import List, Dict, Any, Optional
 import warnings
 warnings.filterwarnings("ignore")
 
-from .postprocess import filter_segments, apply_nms, aggregate_results
+from .postprocess import filter_segments, apply_nms, aggregate_results, detection_records, segments_from_records
 from .mapping import map_labels, get_synonyms
-from .mapping import get_candidate_set
+from .mapping import get_candidate_set, get_mapper, loaded_mapper
+from .tracing import Trace, activate, current_trace, span
+from .cancellation import CancellationToken, PipelineCancelled, checkpoint, checkpoint_hook, current_token, use_token
+from .execution import get_policy, inference_slot
+from .segmenters import SEGMENTERS, build_segmenters
+from .artifacts import CLASSIFIER_MODEL, get_store, hf_model, load_sam_model, sam_checkpoint
+from ..config import config
+from ..metrics.instruments import MODEL_LOADS, MODEL_LOAD_SECONDS, PIPELINE_IN_FLIGHT
+
+
+def _start_encoder_span(module, args):
+    """Forward pre-hook: open a sam_encoder span on the active trace"""
+    trace = current_trace()
+    if trace is not None:
+        trace.start('sam_encoder')
+
+
+def _stop_encoder_span(module, args, output):
+    """Forward hook: close the sam_encoder span opened by the pre-hook"""
+    trace = current_trace()
+    if trace is not None:
+        trace.stop('sam_encoder')
+
+
+def _memory_mb(module) -> float:
+    """Size of a torch module's weights and buffers in MB
+
+    Read from the state dict so that quantized modules, whose int8 weights
+    are packed rather than registered as parameters, are counted too; tied
+    weights (one tensor under several names) are counted once.
+    """
+    import torch
+
+    def tensors(value):
+        if isinstance(value, torch.Tensor):
+            yield value
+        elif isinstance(value, (tuple, list)):
+            for item in value:
+                yield from tensors(item)
+
+    seen = set()
+    total = 0
+    for value in module.state_dict().values():
+        for t in tensors(value):
+            key = (t.data_ptr(), t.numel())
+            if key not in seen:
+                seen.add(key)
+                total += t.numel() * t.element_size()
+    return round(total / (1024 * 1024), 1)
 
 
 class LightweightPipeline:
@@ -28,7 +79,7 @@ class LightweightPipeline:
     
     def __init__(self, 
                  sam_model_type="vit_b", 
-                 classification_model="microsoft/resnet-50",
+                 classification_model=CLASSIFIER_MODEL,
                  device="cpu"):
         """
         Initialize pipeline components
@@ -40,16 +91,56 @@ class LightweightPipeline:
         """
         self.device = device
         self.sam_model = None
+        self.sam_model_type = sam_model_type
         self.mask_generator = None
         self.classifier = None
+        self.classification_model = classification_model
         self.processor = None
         
+        # Reported by model_status()
+        self.load_times = {}
+        self.last_latency = {}
+        self.warmup_complete = False
+        self.warmup_seconds = None
+        self.warmup_error = None
+        
+        # Segmenters; SAM loads here only when it is the default, otherwise
+        # on the first request that asks for it. _sam_lock only guards
+        # loading; SamSegmenter serializes mask generation itself
+        self._sam_attempted = False
+        self._sam_lock = threading.Lock()
+        self.segmenters = build_segmenters(
+            self._ensure_sam, lambda: self.mask_generator is not None,
+            config.MODEL_DIRECTORY, device, min_area=500)
+        
         # Load models lazily
-        self._load_sam(sam_model_type)
+        if config.SEGMENTER == 'sam':
+            self._ensure_sam()
         self._load_classifier(classification_model)
     
+    def _ensure_sam(self):
+        """Load SAM on first call; returns the mask generator (None if loading failed)"""
+        if not self._sam_attempted:
+            with self._sam_lock:
+                if not self._sam_attempted:
+                    self._load_sam(self.sam_model_type)
+                    self._sam_attempted = True
+        return self.mask_generator
+    
+    def get_segmenter(self, name=None):
+        """Segmenter by name; config.SEGMENTER when name is None"""
+        name = name or config.SEGMENTER
+        if name not in self.segmenters:
+            raise ValueError(f"Unknown segmenter {name!r}; expected one of {SEGMENTERS}")
+        return self.segmenters[name]
+    
     def _load_sam(self, model_type):
         """Load SAM model with enhanced optimizations and device selection"""
+        import torch
+        from segment_anything import SamAutomaticMaskGenerator
+        from .backends import apply_sam_backend
+
+        load_start = time.perf_counter()
         try:
             # Smart device selection with fallback (FIXED: MPS compatibility)
             if torch.cuda.is_available():
@@ -64,28 +155,19 @@ class LightweightPipeline:
                 print("Using CPU for SAM (slower but stable)")
             
             self.sam_device = device
-            # Robust checkpoint discovery: try standard name then known local names
-            checkpoint_candidates = [
-                f"sam_{model_type}.pth",
-                # Known repo file for vit_b
-                "sam_vit_b_01ec64.pth" if model_type == "vit_b" else None,
-            ]
-            checkpoint_candidates = [c for c in checkpoint_candidates if c]
-
-            checkpoint_path = None
-            for candidate in checkpoint_candidates:
-                if os.path.isabs(candidate) and os.path.exists(candidate):
-                    checkpoint_path = candidate
-                    break
-                if os.path.exists(candidate):
-                    checkpoint_path = candidate
-                    break
-            if checkpoint_path is None:
-                # Fall back to first candidate; underlying loader may fetch/download
-                checkpoint_path = checkpoint_candidates[0]
-
-            self.sam_model = sam_model_registry[model_type](checkpoint=checkpoint_path)
+            # Verified checkpoint from MODEL_DIRECTORY, memory-mapped
+            self.sam_model = load_sam_model(model_type, sam_checkpoint(model_type))
             self.sam_model.to(device=device)
+            if device == 'cpu':
+                apply_sam_backend(self.sam_model, config.INFERENCE_BACKEND,
+                                  f'sam_{model_type}', config.EXPORT_DIRECTORY)
+            # The encoder runs inside mask_generator.generate(); hooks let
+            # traces split its time out of mask generation
+            self.sam_model.image_encoder.register_forward_pre_hook(_start_encoder_span)
+            self.sam_model.image_encoder.register_forward_hook(_stop_encoder_span)
+            # The mask decoder runs once per batch of prompt points, so a
+            # run past its deadline stops between batches
+            self.sam_model.mask_decoder.register_forward_pre_hook(checkpoint_hook('mask_generation'))
             
             # FIXED: Optimized parameters for better performance
             self.mask_generator = SamAutomaticMaskGenerator(
@@ -99,53 +181,96 @@ class LightweightPipeline:
                 box_nms_thresh=0.3           # FIXED: Added NMS for overlapping masks
             )
             print(f"SAM {model_type} loaded successfully on {device}")
+            self.load_times['sam'] = time.perf_counter() - load_start
+            MODEL_LOADS.inc(model=f'sam_{model_type}', status='success')
+            MODEL_LOAD_SECONDS.observe(self.load_times['sam'], model=f'sam_{model_type}')
         except Exception as e:
+            MODEL_LOADS.inc(model=f'sam_{model_type}', status='failure')
             print(f"SAM loading failed: {e}")
-            print("Run: python setup_models.py")
+            print("Run: python -m src.pipeline.artifacts fetch")
             self.sam_model = None
             self.mask_generator = None
             self.sam_device = "cpu"
     
     def _load_classifier(self, model_name):
         """Load classification model"""
+        from transformers import AutoConfig, AutoImageProcessor, AutoModelForImageClassification
+        from .backends import RunnerClassifier, artifact_path, backend_name, try_load_runner
+        from .quantization import quantization_mode, quantize_classifier
+
+        load_start = time.perf_counter()
         try:
-            self.processor = AutoImageProcessor.from_pretrained(model_name)
-            self.classifier = AutoModelForImageClassification.from_pretrained(model_name)
-            self.classifier.eval()
-            print(f"Classifier {model_name} loaded successfully")
+            source = hf_model(model_name)
+            self.processor = AutoImageProcessor.from_pretrained(source)
+            runner = None
+            if config.INFERENCE_BACKEND != 'eager':
+                runner = try_load_runner(config.INFERENCE_BACKEND, artifact_path(
+                    config.EXPORT_DIRECTORY, 'classifier', model_name, config.INFERENCE_BACKEND))
+            if runner is not None:
+                # Exported graph: only the label config is read, not the weights
+                self.classifier = RunnerClassifier(runner, AutoConfig.from_pretrained(source))
+            else:
+                # safetensors weights are memory-mapped rather than read
+                self.classifier = AutoModelForImageClassification.from_pretrained(source, use_safetensors=True)
+                self.classifier.eval()
+            if config.CLASSIFIER_QUANTIZATION != 'none' and runner is None:
+                # Quantized kernels are CPU-only
+                if self.device == 'cpu':
+                    self.classifier = quantize_classifier(
+                        self.classifier, self.processor, config.CLASSIFIER_QUANTIZATION,
+                        config.QUANTIZATION_CALIBRATION_DIR, config.QUANTIZATION_CALIBRATION_IMAGES)
+                else:
+                    print(f"Classifier quantization skipped on {self.device}")
+            print(f"Classifier {model_name} loaded successfully "
+                  f"(backend: {backend_name(self.classifier)}, "
+                  f"quantization: {quantization_mode(self.classifier)})")
+            self.load_times['classifier'] = time.perf_counter() - load_start
+            MODEL_LOADS.inc(model=model_name, status='success')
+            MODEL_LOAD_SECONDS.observe(self.load_times['classifier'], model=model_name)
         except Exception as e:
+            MODEL_LOADS.inc(model=model_name, status='failure')
             print(f"Classifier loading failed: {e}")
             raise
     
-    def segment_image(self, image_path):
-        """Generate segments using SAM with memory optimization"""
+    def segment_image(self, image_path, segmenter=None):
+        """Generate segments with the named segmenter (default: config.SEGMENTER)
+        
+        Raises when the segmenter cannot run or fails, so that a failed
+        segmentation is never reported as an image with no objects.
+        """
+        import cv2
+        import torch
+
+        segmenter = self.get_segmenter(segmenter)
         try:
-            # Check if SAM is available
-            if self.mask_generator is None:
-                print("SAM not available, returning empty segments")
-                return [], [], None
+            # Check if the segmenter is available
+            if not segmenter.available():
+                raise RuntimeError(f"Segmenter {segmenter.name} unavailable: models not loaded")
                 
-            # Load and process image with memory optimization
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError(f"Could not load image: {image_path}")
-            
-            # FIXED: Resize large images to prevent memory issues
-            height, width = image.shape[:2]
-            max_size = 1024  # Reasonable limit for processing
-            
-            if max(height, width) > max_size:
-                scale = max_size / max(height, width)
-                new_width = int(width * scale)
-                new_height = int(height * scale)
-                image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
-                print(f"Resized image: {width}×{height} → {new_width}×{new_height}")
-            
-            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            with span('image_decode'):
+                # Load and process image with memory optimization
+                image = cv2.imread(image_path)
+                if image is None:
+                    raise ValueError(f"Could not load image: {image_path}")
+                
+                # FIXED: Resize large images to prevent memory issues
+                height, width = image.shape[:2]
+                max_size = 1024  # Reasonable limit for processing
+                
+                if max(height, width) > max_size:
+                    scale = max_size / max(height, width)
+                    new_width = int(width * scale)
+                    new_height = int(height * scale)
+                    image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+                    print(f"Resized image: {width}×{height} → {new_width}×{new_height}")
+                
+                image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
             
             # FIXED: Generate masks with memory management
-            with torch.no_grad():  # Disable gradient computation for memory efficiency
-                masks = self.mask_generator.generate(image_rgb)
+            with span('mask_generation'), torch.no_grad():  # Disable gradient computation for memory efficiency
+                inference_start = time.perf_counter()
+                masks = segmenter.generate(image_rgb)
+                self.last_latency[segmenter.name] = time.perf_counter() - inference_start
                 
                 # Clear GPU cache if using CUDA
                 if hasattr(self, 'sam_device') and self.sam_device == "cuda":
@@ -155,28 +280,34 @@ class LightweightPipeline:
             segments = []
             bboxes = []
             
-            for mask_data in masks:
-                mask = mask_data['segmentation']
-                bbox = mask_data['bbox']  # [x, y, w, h]
-                
-                # Convert mask to segment image
-                segment = image_rgb.copy()
-                segment[~mask] = [128, 128, 128]  # Gray background
-                
-                segments.append(segment)
-                bboxes.append(bbox)
+            with span('segment_extraction'):
+                for mask_data in masks:
+                    mask = mask_data['segmentation']
+                    bbox = mask_data['bbox']  # [x, y, w, h]
+                    
+                    # Convert mask to segment image
+                    segment = image_rgb.copy()
+                    segment[~mask] = [128, 128, 128]  # Gray background
+                    
+                    segments.append(segment)
+                    bboxes.append(bbox)
             
             return segments, bboxes, image_rgb
             
+        except PipelineCancelled:
+            raise
         except Exception as e:
             print(f"Segmentation failed: {e}")
-            return [], [], None
+            raise
     
     def classify_segments(self, segments, bboxes=None, original_image=None):
         """Classify segments using ResNet with enhanced processing"""
         results = []
+        inference_start = time.perf_counter()
         
         for i, segment in enumerate(segments):
+            # Stop between segments once the run's deadline has passed
+            checkpoint('classification')
             try:
                 # FIXED: Enhanced segment preprocessing
                 segment_result = self._classify_single_segment(
@@ -193,10 +324,14 @@ class LightweightPipeline:
                     'calibrated_confidence': 0.0
                 })
         
+        if segments:
+            self.last_latency['classifier'] = time.perf_counter() - inference_start
         return results
     
     def _classify_single_segment(self, segment, segment_id, bbox=None, original_image=None):
         """FIXED: Enhanced single segment classification with confidence calibration"""
+        import torch
+        from PIL import Image
         
         # Convert to PIL Image and ensure RGB
         if segment.dtype != np.uint8:
@@ -260,13 +395,160 @@ class LightweightPipeline:
         calibrated_confidence = max(0.0, min(1.0, calibrated_confidence))
         
         return calibrated_confidence
+    
+    def warm_up(self):
+        """Run one dummy inference per model so real requests start warm
+
+        Pays for lazy allocations, kernel selection and the zero-shot model
+        load up front. Failures are recorded in warmup_error, not raised.
+        """
+        import torch
+
+        start = time.perf_counter()
+        try:
+            with inference_slot(), torch.no_grad():
+                segmenter = self.get_segmenter()
+                if segmenter.name == 'sam':
+                    if self.sam_model is not None:
+                        # One encoder pass at SAM's fixed input size; the
+                        # encoder is nearly all of SAM's cost
+                        size = self.sam_model.image_encoder.img_size
+                        dummy = torch.zeros(1, 3, size, size, device=self.sam_device)
+                        self.sam_model.image_encoder(dummy)
+                elif segmenter.available():
+                    segmenter.generate(np.full((256, 256, 3), 128, dtype=np.uint8))
+                self._classify_single_segment(np.full((224, 224, 3), 128, dtype=np.uint8), 0)
+            mapper = get_mapper()
+            mapper.zero_shot_map('dog', ['dog', 'cat'])
+            self.warmup_error = None
+            self.warmup_complete = True
+        except Exception as e:
+            print(f"Warm-up failed: {e}")
+            self.warmup_error = str(e)
+        self.warmup_seconds = time.perf_counter() - start
+        print(f"Warm-up finished in {self.warmup_seconds:.2f}s")
+        return self.warmup_complete
+    
+    def model_status(self) -> Dict[str, Any]:
+        """Loaded models with device, memory, load time and last latency"""
+        import torch
+        from .backends import backend_name
+        from .quantization import quantization_mode
+
+        models = {
+            'sam': {
+                'name': f'sam_{self.sam_model_type}',
+                'loaded': self.sam_model is not None,
+                'device': getattr(self, 'sam_device', 'cpu'),
+                'backend': backend_name(self.sam_model.image_encoder) if self.sam_model is not None else None,
+                'memory_mb': _memory_mb(self.sam_model) if self.sam_model is not None else 0.0,
+                'load_seconds': self.load_times.get('sam'),
+                'last_inference_seconds': self.last_latency.get('sam')
+            },
+            'classifier': {
+                'name': self.classification_model,
+                'loaded': self.classifier is not None,
+                # Quantized models run on the CPU and may have no parameters
+                'device': str(next(self.classifier.parameters(), torch.empty(0)).device) if self.classifier is not None else None,
+                'backend': backend_name(self.classifier) if self.classifier is not None else None,
+                'quantization': quantization_mode(self.classifier) if self.classifier is not None else None,
+                'memory_mb': _memory_mb(self.classifier) if self.classifier is not None else 0.0,
+                'load_seconds': self.load_times.get('classifier'),
+                'last_inference_seconds': self.last_latency.get('classifier')
+            }
+        }
+        mapper = loaded_mapper()
+        if mapper is not None:
+            zero_shot = mapper.zero_shot_classifier
+            models['zero_shot'] = {
+                'name': mapper.model_name,
+                'loaded': zero_shot is not None,
+                'device': str(zero_shot.device) if zero_shot is not None else None,
+                'memory_mb': _memory_mb(zero_shot.model) if zero_shot is not None else 0.0,
+                'load_seconds': mapper.load_seconds,
+                'last_inference_seconds': mapper.last_inference_seconds
+            }
+        segmenter = self.get_segmenter()
+        return {
+            'models_loaded': segmenter.loaded() and models['classifier']['loaded'],
+            'segmenter': {
+                'default': segmenter.name,
+                'loaded': {name: s.loaded() for name, s in self.segmenters.items()},
+                'last_inference_seconds': {name: self.last_latency.get(name) for name in self.segmenters}
+            },
+            'warmup_complete': self.warmup_complete,
+            'warmup_seconds': self.warmup_seconds,
+            'warmup_error': self.warmup_error,
+            'models': models,
+            'artifacts': get_store().describe(),
+            'execution': get_policy().describe()
+        }
+
+
+_pipeline_instance: Optional[LightweightPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline() -> LightweightPipeline:
+    """Shared LightweightPipeline, loading the models on first use"""
+    global _pipeline_instance
+    if _pipeline_instance is None:
+        with _pipeline_lock:
+            if _pipeline_instance is None:
+                _pipeline_instance = LightweightPipeline(sam_model_type=config.SAM_MODEL_TYPE)
+    return _pipeline_instance
+
+
+def loaded_pipeline() -> Optional[LightweightPipeline]:
+    """The shared pipeline if its models are loaded, without loading them"""
+    return _pipeline_instance
+
+
+def postprocess_segments(classifications, bboxes,
+                         confidence_threshold=0.7,
+                         nms_threshold=0.3,
+                         target_classes=None,
+                         enable_mapping=True):
+    """
+    Steps 3-5 of run_pipeline: filtering, NMS, label mapping and aggregation
+    
+    Needs only classifier output, so stored detections can be recounted
+    with other thresholds without running the models again.
+    
+    Returns:
+        dict: {'filtered': list, 'nms': list, 'detections': list}
+    """
+    with span('filter'):
+        filtered_results = filter_segments(
+            classifications, bboxes, 
+            confidence_threshold=confidence_threshold
+        )
+    
+    with span('nms'):
+        nms_results = apply_nms(filtered_results, threshold=nms_threshold)
+    
+    # Label mapping (optional)
+    if enable_mapping:
+        checkpoint('label_mapping')
+        print("Mapping labels...")
+        with span('label_mapping'):
+            mapped_results = map_labels(nms_results, target_classes)
+    else:
+        mapped_results = nms_results
+    
+    with span('aggregation'):
+        final_results = aggregate_results(mapped_results)
+    
+    return {'filtered': filtered_results, 'nms': nms_results, 'detections': final_results}
 
 
 def run_pipeline(image_path, 
                 confidence_threshold=0.7,
                 nms_threshold=0.3,
                 target_classes=None,
-                enable_mapping=True):
+                enable_mapping=True,
+                segmenter=None,
+                cancel_token=None):
     """
     Main pipeline entrypoint
     
@@ -276,87 +558,116 @@ def run_pipeline(image_path,
         nms_threshold: Non-maximum suppression threshold
         target_classes: List of target class names (optional)
         enable_mapping: Enable synonym mapping
+        segmenter: Segmenter name (sam, mobile_sam, contour); default config.SEGMENTER
+        cancel_token: CancellationToken checked between stages (default: the
+            active one, else a new one with config.PROCESSING_TIMEOUT)
     
     Returns:
         dict: {
             'image_path': str,
             'detections': list,
-            'summary': dict,
-            'processing_time': float
+            'segments': list,  # every classified segment, with 'bbox' and 'area'
+            'summary': dict,  # includes 'stage_timings' (seconds per stage)
+            'processing_time': float,
+            'error': str  # only when the run failed
         }
+    
+    Raises:
+        PipelineCancelled: the token was cancelled or its deadline passed
+            (including while waiting for an inference slot)
     """
-    import time
     start_time = time.time()
+    trace = Trace()
+    token = cancel_token or current_token() or CancellationToken(config.PROCESSING_TIMEOUT)
+    PIPELINE_IN_FLIGHT.inc()
     
     try:
-        # Initialize pipeline
-        pipeline = LightweightPipeline()
-        
-        # Step 1: Segmentation
-        print(f"Processing: {image_path}")
-        segments, bboxes, original_image = pipeline.segment_image(image_path)
-        
-        if not segments:
-            return {
-            'image_path': image_path,
-            'detections': [],
-            'summary': {
-                'total_objects': 0, 
-                'error': 'No segments found',
-                'processing_time': f"{time.time() - start_time:.2f}s"
-            },
-            'processing_time': time.time() - start_time
-        }
-        
-        # Step 2: Classification (FIXED: Pass additional context)
-        print(f"Classifying {len(segments)} segments...")
-        classifications = pipeline.classify_segments(segments, bboxes, original_image)
-        
-        # Step 3: Post-processing
-        print("Post-processing...")
-        filtered_results = filter_segments(
-            classifications, bboxes, 
-            confidence_threshold=confidence_threshold
-        )
-        
-        nms_results = apply_nms(filtered_results, threshold=nms_threshold)
-        
-        # Step 4: Label mapping (optional)
-        if enable_mapping:
-            print("Mapping labels...")
-            mapped_results = map_labels(nms_results, target_classes)
-        else:
-            mapped_results = nms_results
-        
-        # Step 5: Aggregation
-        final_results = aggregate_results(mapped_results)
+        with activate(trace), use_token(token):
+            # Shared pipeline; only the first call pays for model loading
+            with span('model_init'):
+                pipeline = get_pipeline()
+            
+            # Inference runs in one of the policy's slots, so concurrent
+            # requests split the cores instead of oversubscribing them;
+            # waiting for a slot counts against the deadline
+            token.check('queue_wait')
+            wait = token.remaining() if token.deadline is not None else config.PROCESSING_TIMEOUT
+            with ExitStack() as slot:
+                try:
+                    slot.enter_context(inference_slot(timeout=wait))
+                except TimeoutError:
+                    if token.reason():
+                        raise PipelineCancelled(token.reason(), 'queue_wait')
+                    raise
+                # Step 1: Segmentation
+                print(f"Processing: {image_path}")
+                segments, bboxes, original_image = pipeline.segment_image(image_path, segmenter)
+            
+                if not segments:
+                    return {
+                    'image_path': image_path,
+                    'detections': [],
+                    'segments': [],
+                    'summary': {
+                        'total_objects': 0, 
+                        'error': 'No segments found',
+                        'processing_time': f"{time.time() - start_time:.2f}s",
+                        'stage_timings': trace.timings()
+                    },
+                    'processing_time': time.time() - start_time
+                }
+            
+                # Step 2: Classification (FIXED: Pass additional context)
+                print(f"Classifying {len(segments)} segments...")
+                with span('classification'):
+                    classifications = pipeline.classify_segments(segments, bboxes, original_image)
+            
+                # Steps 3-5: Post-processing, label mapping and aggregation
+                print("Post-processing...")
+                postprocessed = postprocess_segments(
+                    classifications, bboxes,
+                    confidence_threshold=confidence_threshold,
+                    nms_threshold=nms_threshold,
+                    target_classes=target_classes,
+                    enable_mapping=enable_mapping
+                )
         
         processing_time = time.time() - start_time
         
         return {
             'image_path': image_path,
-            'detections': final_results,
+            'detections': postprocessed['detections'],
+            'segments': [dict(c, bbox=bbox, area=bbox[2] * bbox[3]) for c, bbox in zip(classifications, bboxes)],
             'summary': {
-                'total_objects': len(final_results),
+                'total_objects': len(postprocessed['detections']),
                 'processing_time': f"{processing_time:.2f}s",
                 'segments_generated': len(segments),
-                'segments_after_filtering': len(filtered_results),
-                'segments_after_nms': len(nms_results)
+                'segments_after_filtering': len(postprocessed['filtered']),
+                'segments_after_nms': len(postprocessed['nms']),
+                'stage_timings': trace.timings()
             },
             'processing_time': processing_time
         }
         
+    except PipelineCancelled:
+        raise
     except Exception as e:
         return {
             'image_path': image_path,
             'detections': [],
+            'segments': [],
+            # Set only when the run failed (not for an image without segments)
+            'error': str(e),
             'summary': {
                 'total_objects': 0,
                 'error': str(e),
-                'processing_time': f"{time.time() - start_time:.2f}s"
+                'processing_time': f"{time.time() - start_time:.2f}s",
+                'stage_timings': trace.timings()
             },
             'processing_time': time.time() - start_time
         }
+    finally:
+        PIPELINE_IN_FLIGHT.dec()
 
 
 # Quick test function
@@ -397,10 +708,57 @@ class _PipelineCompatibilityAdapter:
     Methods:
         - process_image(image_path, object_type)
         - process_image_auto(image_path)
+        - recount(records, object_type, confidence_threshold, nms_threshold)
+        - get_model_status()
+        - warm_up() / start_warm_up() / is_ready()
+        - segmenter_available(name)
     """
 
+    # Label mapping during recount (the stub's raw labels need none)
+    map_recounted_labels = True
+
     def __init__(self):
-        pass
+        self._warmup_thread = None
+        self._load_error = None
+
+    def get_model_status(self) -> Dict[str, Any]:
+        """Model/warm-up status for health checks; never loads models"""
+        shared_pipeline = loaded_pipeline()
+        if shared_pipeline is None:
+            return {
+                'models_loaded': False,
+                'warmup_complete': False,
+                'warmup_in_progress': self._warmup_thread is not None and self._warmup_thread.is_alive(),
+                'warmup_seconds': None,
+                'warmup_error': self._load_error,
+                'models': {},
+                'execution': get_policy().describe()
+            }
+        status = shared_pipeline.model_status()
+        status['warmup_in_progress'] = self._warmup_thread is not None and self._warmup_thread.is_alive()
+        return status
+
+    def warm_up(self) -> bool:
+        """Load the models and run one dummy inference each (blocking)"""
+        try:
+            shared_pipeline = get_pipeline()
+        except Exception as e:
+            print(f"Model loading failed during warm-up: {e}")
+            self._load_error = str(e)
+            return False
+        return shared_pipeline.warm_up()
+
+    def start_warm_up(self) -> threading.Thread:
+        """Run warm_up() in a background thread, once"""
+        if self._warmup_thread is None:
+            self._warmup_thread = threading.Thread(target=self.warm_up, name='model-warmup', daemon=True)
+            self._warmup_thread.start()
+        return self._warmup_thread
+
+    def is_ready(self) -> bool:
+        """True once the models are loaded and warmed up"""
+        shared_pipeline = loaded_pipeline()
+        return shared_pipeline is not None and shared_pipeline.warmup_complete
 
     def _count_by_label(self, detections: List[Dict[str, Any]], label: str) -> Dict[str, Any]:
         matched = [d for d in detections if (d.get('mapped_label') or d.get('raw_label', '')).lower() == label.lower()]
@@ -410,21 +768,55 @@ class _PipelineCompatibilityAdapter:
         avg_conf = float(np.mean([d.get('confidence', 0.0) for d in matched]))
         return {"count": count, "avg_conf": avg_conf}
 
-    def process_image(self, image_path: str, object_type: str) -> Dict[str, Any]:
-        """Process a single image focusing on a specific object_type."""
+    def _run(self, image_path: str, target_classes: Optional[List[str]] = None,
+             segmenter: Optional[str] = None,
+             cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+        """One pipeline run with the API's thresholds (src/pipeline/stub.py overrides it)"""
+        return run_pipeline(
+            image_path,
+            confidence_threshold=config.CONFIDENCE_THRESHOLD,
+            nms_threshold=config.NMS_THRESHOLD,
+            target_classes=target_classes,
+            enable_mapping=True,
+            segmenter=segmenter,
+            cancel_token=cancel_token,
+        )
+
+    def _failure(self, result: Dict[str, Any], segmenter: Optional[str]) -> Dict[str, Any]:
+        """Adapter result of a failed run: success False, never a count of 0"""
+        return {
+            'success': False,
+            'error': result['error'],
+            'predicted_count': 0,
+            'confidence': 0.0,
+            'processing_time': float(result.get('processing_time', 0.0)),
+            'stage_timings': result.get('summary', {}).get('stage_timings', {}),
+            'segmenter': segmenter or config.SEGMENTER,
+            'detections': [],
+        }
+
+    def segmenter_available(self, name: str) -> bool:
+        """Whether the named segmenter can run (loads it if needed)"""
+        return get_pipeline().get_segmenter(name).available()
+
+    def _candidates(self, object_type: str) -> List[str]:
         # Use a broader candidate set for mapping to enable meaningful
         # zero-shot selection instead of a single-class (trivial) list.
         candidates = get_candidate_set('general')
         if object_type not in candidates:
             candidates = candidates + [object_type]
+        return candidates
 
-        result = run_pipeline(
-            image_path,
-            confidence_threshold=0.7,
-            nms_threshold=0.3,
-            target_classes=candidates,
-            enable_mapping=True,
-        )
+    def process_image(self, image_path: str, object_type: str, segmenter: Optional[str] = None,
+                      cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+        """Process a single image focusing on a specific object_type.
+
+        Raises PipelineCancelled if cancel_token fires before the run ends.
+        """
+        result = self._run(image_path, target_classes=self._candidates(object_type), segmenter=segmenter,
+                           cancel_token=cancel_token)
+        if result.get('error'):
+            return self._failure(result, segmenter)
         detections = result.get('detections', [])
         stats = self._count_by_label(detections, object_type)
         return {
@@ -433,17 +825,17 @@ class _PipelineCompatibilityAdapter:
             'confidence': float(stats['avg_conf']),
             'processing_time': float(result.get('processing_time', 0.0)),
             'object_type': object_type,
+            'stage_timings': result.get('summary', {}).get('stage_timings', {}),
+            'segmenter': segmenter or config.SEGMENTER,
+            'detections': detection_records(result.get('segments', []), detections),
         }
 
-    def process_image_auto(self, image_path: str) -> Dict[str, Any]:
+    def process_image_auto(self, image_path: str, segmenter: Optional[str] = None,
+                           cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
         """Process a single image and infer the dominant object type by frequency."""
-        result = run_pipeline(
-            image_path,
-            confidence_threshold=0.7,
-            nms_threshold=0.3,
-            target_classes=None,
-            enable_mapping=True,
-        )
+        result = self._run(image_path, target_classes=None, segmenter=segmenter, cancel_token=cancel_token)
+        if result.get('error'):
+            return self._failure(result, segmenter)
         detections = result.get('detections', [])
         if not detections:
             return {
@@ -452,6 +844,9 @@ class _PipelineCompatibilityAdapter:
                 'confidence': 0.0,
                 'processing_time': float(result.get('processing_time', 0.0)),
                 'object_type': 'unknown',
+                'stage_timings': result.get('summary', {}).get('stage_timings', {}),
+                'segmenter': segmenter or config.SEGMENTER,
+                'detections': detection_records(result.get('segments', []), detections),
             }
 
         # Count by mapped label
@@ -478,8 +873,67 @@ class _PipelineCompatibilityAdapter:
             'confidence': float(best_avg_conf if best_avg_conf > 0 else 0.0),
             'processing_time': float(result.get('processing_time', 0.0)),
             'object_type': best_label or 'unknown',
+            'stage_timings': result.get('summary', {}).get('stage_timings', {}),
+            'segmenter': segmenter or config.SEGMENTER,
+            'detections': detection_records(result.get('segments', []), detections),
         }
 
 
+    def recount(self, records: List[Dict[str, Any]], object_type: str,
+                confidence_threshold: Optional[float] = None,
+                nms_threshold: Optional[float] = None) -> Dict[str, Any]:
+        """Count object_type again from stored detection records.
+
+        Reruns filtering, NMS, label mapping and counting on the stored
+        classifier output, so no model runs (mapping only on labels the
+        mapper has not cached). Thresholds default to the config values.
+        """
+        start_time = time.time()
+        trace = Trace()
+        if confidence_threshold is None:
+            confidence_threshold = config.CONFIDENCE_THRESHOLD
+        if nms_threshold is None:
+            nms_threshold = config.NMS_THRESHOLD
+        segments = segments_from_records(records)
+        with activate(trace):
+            postprocessed = postprocess_segments(
+                segments, [segment['bbox'] for segment in segments],
+                confidence_threshold=confidence_threshold,
+                nms_threshold=nms_threshold,
+                target_classes=self._candidates(object_type),
+                enable_mapping=self.map_recounted_labels
+            )
+        detections = postprocessed['detections']
+        stats = self._count_by_label(detections, object_type)
+        return {
+            'success': True,
+            'predicted_count': int(stats['count']),
+            'confidence': float(stats['avg_conf']),
+            'processing_time': time.time() - start_time,
+            'object_type': object_type,
+            'stage_timings': trace.timings(),
+            'confidence_threshold': confidence_threshold,
+            'nms_threshold': nms_threshold,
+            'segments': len(segments),
+            'segments_after_filtering': len(postprocessed['filtered']),
+            'segments_after_nms': len(postprocessed['nms']),
+            'detections': detection_records(segments, detections),
+        }
+
+
+PIPELINE_BACKENDS = ('models', 'stub')
+
+
+def create_adapter(backend: Optional[str] = None) -> _PipelineCompatibilityAdapter:
+    """The adapter for config.PIPELINE_BACKEND: the real models or the stub"""
+    backend = (backend or config.PIPELINE_BACKEND).lower()
+    if backend not in PIPELINE_BACKENDS:
+        raise ValueError(f"Unknown pipeline backend {backend!r}; expected one of {list(PIPELINE_BACKENDS)}")
+    if backend == 'stub':
+        from .stub import StubPipeline
+        return StubPipeline()
+    return _PipelineCompatibilityAdapter()
+
+
 # Public adapter instance expected by views: `from ...pipeline.pipeline import pipeline`
-pipeline = _PipelineCompatibilityAdapter()
+pipeline = create_adapter()
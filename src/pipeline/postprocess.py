@@ -5,16 +5,20 @@ Filtering, thresholds, NMS, and result aggregation
 
 import numpy as np
 from typing import List, Dict, Any, Tuple
-import cv2
-import matplotlib.pyplot as plt
 from collections import Counter
 
-# Optional seaborn import for better styling
-try:
-    import seaborn as sns
-    sns.set_style("whitegrid")
-except ImportError:
-    sns = None
+
+def _pyplot():
+    """matplotlib.pyplot, imported on first plot so the API never loads it"""
+    import matplotlib.pyplot as plt
+
+    # Optional seaborn import for better styling
+    try:
+        import seaborn as sns
+        sns.set_style("whitegrid")
+    except ImportError:
+        pass
+    return plt
 
 
 def filter_segments(classifications: List[Dict], 
@@ -162,24 +166,118 @@ def group_by_class(detections: List[Dict]) -> Dict[str, List[Dict]]:
     return groups
 
 
+class GroupedStats:
+    """Per-class statistics of confidence and area for a set of detections
+
+    Labels become integer codes (in first-seen order, like group_by_class)
+    and every statistic is computed for all classes at once: sums and
+    counts with np.bincount, min/max/median from one sort by (code, value)
+    whose per-class segments are contiguous. Dense scenes and cross-image
+    aggregation then cost a few array passes instead of one Python loop
+    per class and statistic.
+    """
+
+    def __init__(self, labels: List[str], confidences, areas=None, detections: List[Dict] = None):
+        # dict keeps first-seen order, which np.unique's sorted labels would not
+        index = dict.fromkeys(labels)
+        for code, label in enumerate(index):
+            index[label] = code
+        self.codes = np.array([index[label] for label in labels], dtype=np.intp)
+        self.labels = list(index)
+        self.confidences = np.asarray(confidences, dtype=float)
+        self._areas = None if areas is None else np.asarray(areas, dtype=float)
+        # Areas are read from the detections only when a caller needs them
+        self._detections = detections
+        self.counts = np.bincount(self.codes, minlength=len(self.labels))
+        # Start of each class's segment in a (code, value)-sorted array
+        self._starts = np.concatenate(([0], np.cumsum(self.counts)[:-1])).astype(np.intp)
+        self._cache: Dict[str, Dict[str, np.ndarray]] = {}
+
+    @classmethod
+    def from_detections(cls, detections: List[Dict]) -> 'GroupedStats':
+        return cls([d['mapped_label'] if 'mapped_label' in d else d.get('raw_label', 'unknown') for d in detections],
+                   [d.get('confidence', 0) for d in detections],
+                   detections=detections)
+
+    @classmethod
+    def from_groups(cls, grouped_detections: Dict[str, List[Dict]]) -> 'GroupedStats':
+        """From group_by_class() output; the group keys are the labels"""
+        labels, confidences, areas = [], [], []
+        for label, detections in grouped_detections.items():
+            labels.extend([label] * len(detections))
+            confidences.extend(d.get('confidence', 0) for d in detections)
+            areas.extend(d.get('area', 0) for d in detections)
+        return cls(labels, confidences, areas)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def areas(self) -> np.ndarray:
+        if self._areas is None:
+            self._areas = np.asarray([d.get('area', 0) for d in self._detections], dtype=float)
+        return self._areas
+
+    def mean(self, field: str) -> np.ndarray:
+        """Per-class mean alone, without the sort stats() needs"""
+        if field in self._cache:
+            return self._cache[field]['mean']
+        values = self.confidences if field == 'confidence' else self.areas
+        return np.bincount(self.codes, weights=values, minlength=len(self.labels)) / self.counts
+
+    def count_where(self, mask: np.ndarray) -> np.ndarray:
+        """Per-class number of detections where `mask` is true"""
+        return np.bincount(self.codes, weights=mask, minlength=len(self.labels)).astype(int)
+
+    def stats(self, field: str) -> Dict[str, np.ndarray]:
+        """count/sum/mean/std/min/max/median of 'confidence' or 'area' per class"""
+        if field not in self._cache:
+            values = self.confidences if field == 'confidence' else self.areas
+            total = np.bincount(self.codes, weights=values, minlength=len(self.labels))
+            mean = total / self.counts
+            # Population std, as np.std, from deviations to each class mean
+            squares = np.bincount(self.codes, weights=(values - mean[self.codes]) ** 2,
+                                  minlength=len(self.labels))
+            ordered = values[np.lexsort((values, self.codes))]
+            last = self._starts + self.counts - 1
+            self._cache[field] = {
+                'count': self.counts,
+                'sum': total,
+                'mean': mean,
+                'std': np.sqrt(squares / self.counts),
+                'min': ordered[self._starts],
+                'max': ordered[last],
+                'median': (ordered[self._starts + (self.counts - 1) // 2] + ordered[self._starts + self.counts // 2]) / 2
+            }
+        return self._cache[field]
+
+    def values_by_class(self, field: str) -> Dict[str, List[float]]:
+        """Each class's values in detection order"""
+        values = self.confidences if field == 'confidence' else self.areas
+        ordered = values[np.argsort(self.codes, kind='stable')]
+        return {label: ordered[start:start + count].tolist()
+                for label, start, count in zip(self.labels, self._starts, self.counts)}
+
+    def class_statistics(self) -> Dict[str, Dict]:
+        """The calculate_class_statistics() entries"""
+        confidence = self.stats('confidence')
+        area = self.stats('area')
+        return {
+            label: {
+                'count': int(self.counts[i]),
+                'avg_confidence': float(confidence['mean'][i]),
+                'max_confidence': float(confidence['max'][i]),
+                'min_confidence': float(confidence['min'][i]),
+                'total_area': float(area['sum'][i]),
+                'avg_area': float(area['mean'][i])
+            }
+            for i, label in enumerate(self.labels)
+        }
+
+
 def calculate_class_statistics(grouped_detections: Dict[str, List[Dict]]) -> Dict[str, Dict]:
     """Calculate statistics for each class"""
-    stats = {}
-    
-    for class_name, detections in grouped_detections.items():
-        confidences = [d.get('confidence', 0) for d in detections]
-        areas = [d.get('area', 0) for d in detections]
-        
-        stats[class_name] = {
-            'count': len(detections),
-            'avg_confidence': np.mean(confidences) if confidences else 0,
-            'max_confidence': max(confidences) if confidences else 0,
-            'min_confidence': min(confidences) if confidences else 0,
-            'total_area': sum(areas),
-            'avg_area': np.mean(areas) if areas else 0
-        }
-    
-    return stats
+    return GroupedStats.from_groups(grouped_detections).class_statistics()
 
 
 def aggregate_results(detections: List[Dict]) -> List[Dict]:
@@ -195,11 +293,8 @@ def aggregate_results(detections: List[Dict]) -> List[Dict]:
     if not detections:
         return []
     
-    # Group by class
-    grouped = group_by_class(detections)
-    
-    # Calculate statistics
-    class_stats = calculate_class_statistics(grouped)
+    # Calculate statistics for every class at once
+    class_stats = GroupedStats.from_detections(detections).class_statistics()
     
     # Enrich each detection
     enriched_detections = []
@@ -227,10 +322,67 @@ def aggregate_results(detections: List[Dict]) -> List[Dict]:
             }
         
         enriched_detections.append(enriched)
-    
+
     return enriched_detections
 
 
+def detection_records(segments: List[Dict], detections: List[Dict]) -> List[Dict[str, Any]]:
+    """
+    Flatten one run into rows for the detections table
+
+    Args:
+        segments: Every classified segment of the run, with 'bbox' and 'area'
+        detections: The segments that survived filtering and NMS, with mapped labels
+
+    Returns:
+        One plain dict per segment (JSON/DB friendly), in segment order
+    """
+    kept = {d['segment_id']: d for d in detections if 'segment_id' in d}
+    records = []
+
+    for segment in segments:
+        x, y, w, h = (int(v) for v in segment['bbox'])
+        final = kept.get(segment['segment_id'])
+        calibrated = segment.get('calibrated_confidence')
+        records.append({
+            'segment_id': int(segment['segment_id']),
+            'x': x,
+            'y': y,
+            'width': w,
+            'height': h,
+            'area': int(segment.get('area', w * h)),
+            'raw_label': segment.get('raw_label', 'unknown'),
+            'confidence': float(segment.get('confidence', 0.0)),
+            'calibrated_confidence': float(calibrated) if calibrated is not None else None,
+            'mapped_label': final.get('mapped_label') if final else None,
+            'mapping_method': final.get('mapping_method') if final else None,
+            'kept': final is not None
+        })
+
+    return records
+
+
+def segments_from_records(records: List[Dict[str, Any]]) -> List[Dict]:
+    """
+    Rebuild classified segments from detection records (inverse of detection_records)
+
+    Args:
+        records: Rows as produced by detection_records
+
+    Returns:
+        Segments shaped like classifier output, with 'bbox' and 'area'
+    """
+    return [{
+        'segment_id': record['segment_id'],
+        'raw_label': record['raw_label'],
+        'confidence': record['confidence'],
+        'calibrated_confidence': (record['calibrated_confidence']
+                                  if record.get('calibrated_confidence') is not None else record['confidence']),
+        'bbox': [record['x'], record['y'], record['width'], record['height']],
+        'area': record['area']
+    } for record in records]
+
+
 def apply_confidence_boost(detections: List[Dict], 
                           boost_classes: List[str] = None,
                           boost_factor: float = 1.2) -> List[Dict]:
@@ -285,33 +437,32 @@ def create_summary_report(detections: List[Dict],
             'quality_score': 0
         }
     
-    # Group by class
-    grouped = group_by_class(detections)
-    class_stats = calculate_class_statistics(grouped)
+    grouped = GroupedStats.from_detections(detections)
+    class_stats = grouped.class_statistics()
     
     # Calculate metrics
     total_objects = len(detections)
-    unique_classes = len(grouped)
-    avg_confidence = np.mean([d.get('confidence', 0) for d in detections])
+    unique_classes = len(grouped.labels)
+    confidences = grouped.confidences
+    avg_confidence = float(confidences.mean())
     
     # Processing efficiency
     efficiency = (total_objects / original_segments_count * 100) if original_segments_count > 0 else 0
     
     # Quality score (based on confidence distribution)
-    confidences = [d.get('confidence', 0) for d in detections]
-    high_conf_count = sum(1 for c in confidences if c > 0.8)
+    high_conf_count = int(np.count_nonzero(confidences > 0.8))
     quality_score = (high_conf_count / total_objects * 100) if total_objects > 0 else 0
     
     return {
         'total_objects': total_objects,
         'unique_classes': unique_classes,
-        'classes_detected': list(grouped.keys()),
-        'class_distribution': {k: len(v) for k, v in grouped.items()},
+        'classes_detected': list(grouped.labels),
+        'class_distribution': dict(zip(grouped.labels, grouped.counts.tolist())),
         'avg_confidence': round(avg_confidence, 3),
         'confidence_distribution': {
-            'high (>0.8)': sum(1 for c in confidences if c > 0.8),
-            'medium (0.5-0.8)': sum(1 for c in confidences if 0.5 <= c <= 0.8),
-            'low (<0.5)': sum(1 for c in confidences if c < 0.5)
+            'high (>0.8)': high_conf_count,
+            'medium (0.5-0.8)': int(np.count_nonzero((confidences >= 0.5) & (confidences <= 0.8))),
+            'low (<0.5)': int(np.count_nonzero(confidences < 0.5))
         },
         'processing_efficiency': round(efficiency, 1),
         'quality_score': round(quality_score, 1),
@@ -344,42 +495,28 @@ def apply_confidence_thresholds(detections: List[Dict],
     if thresholds is None:
         thresholds = {}
     
-    passed_detections = []
-    filtered_detections = []
-    threshold_analysis = {}
-    
-    for detection in detections:
-        label = detection.get('mapped_label', detection.get('raw_label', 'unknown'))
-        confidence = detection.get('confidence', 0.0)
-        
-        # Get threshold for this class
-        threshold = thresholds.get(label, default_threshold)
-        
-        # Track threshold analysis
-        if label not in threshold_analysis:
-            threshold_analysis[label] = {
-                'threshold_used': threshold,
-                'total_detections': 0,
-                'passed': 0,
-                'filtered': 0,
-                'avg_confidence': 0,
-                'confidences': []
-            }
-        
-        threshold_analysis[label]['total_detections'] += 1
-        threshold_analysis[label]['confidences'].append(confidence)
-        
-        if confidence >= threshold:
-            passed_detections.append(detection)
-            threshold_analysis[label]['passed'] += 1
-        else:
-            filtered_detections.append(detection)
-            threshold_analysis[label]['filtered'] += 1
-    
-    # Calculate averages
-    for label, analysis in threshold_analysis.items():
-        if analysis['confidences']:
-            analysis['avg_confidence'] = np.mean(analysis['confidences'])
+    grouped = GroupedStats.from_detections(detections)
+    class_thresholds = np.array([thresholds.get(label, default_threshold) for label in grouped.labels],
+                                dtype=float)
+    passed = grouped.confidences >= class_thresholds[grouped.codes]
+    passed_counts = grouped.count_where(passed)
+    mean_confidence = grouped.mean('confidence')
+    confidences_by_class = grouped.values_by_class('confidence')
+    
+    threshold_analysis = {
+        label: {
+            'threshold_used': thresholds.get(label, default_threshold),
+            'total_detections': int(grouped.counts[i]),
+            'passed': int(passed_counts[i]),
+            'filtered': int(grouped.counts[i] - passed_counts[i]),
+            'avg_confidence': float(mean_confidence[i]),
+            'confidences': confidences_by_class[label]
+        }
+        for i, label in enumerate(grouped.labels)
+    }
+    passed = passed.tolist()
+    passed_detections = [d for d, ok in zip(detections, passed) if ok]
+    filtered_detections = [d for d, ok in zip(detections, passed) if not ok]
     
     return {
         'filtered_detections': passed_detections,
@@ -403,35 +540,28 @@ def count_objects_by_class(detections: List[Dict]) -> Dict[str, Dict[str, Any]]:
     if not detections:
         return {}
     
-    # Group by class
-    grouped = group_by_class(detections)
-    counts = {}
+    grouped = GroupedStats.from_detections(detections)
+    confidence = grouped.stats('confidence')
+    area = grouped.stats('area')
+    high = grouped.count_where(grouped.confidences > 0.8)
+    low = grouped.count_where(grouped.confidences < 0.5)
+    reliable = grouped.count_where(grouped.confidences > 0.7)
     
-    for class_name, class_detections in grouped.items():
-        confidences = [d.get('confidence', 0) for d in class_detections]
-        areas = [d.get('area', 0) for d in class_detections]
-        
+    counts = {}
+    for i, class_name in enumerate(grouped.labels):
+        count = int(grouped.counts[i])
         counts[class_name] = {
-            'count': len(class_detections),
-            'confidence_stats': {
-                'mean': np.mean(confidences),
-                'std': np.std(confidences),
-                'min': np.min(confidences),
-                'max': np.max(confidences),
-                'median': np.median(confidences)
-            },
+            'count': count,
+            'confidence_stats': {key: float(confidence[key][i]) for key in ('mean', 'std', 'min', 'max', 'median')},
             'area_stats': {
-                'mean': np.mean(areas) if areas else 0,
-                'std': np.std(areas) if areas else 0,
-                'min': np.min(areas) if areas else 0,
-                'max': np.max(areas) if areas else 0,
-                'total': np.sum(areas) if areas else 0
+                **{key: float(area[key][i]) for key in ('mean', 'std', 'min', 'max')},
+                'total': float(area['sum'][i])
             },
             'quality_flags': {
-                'high_confidence': sum(1 for c in confidences if c > 0.8),
-                'medium_confidence': sum(1 for c in confidences if 0.5 <= c <= 0.8),
-                'low_confidence': sum(1 for c in confidences if c < 0.5),
-                'reliable': sum(1 for c in confidences if c > 0.7) / len(confidences) > 0.5
+                'high_confidence': int(high[i]),
+                'medium_confidence': count - int(high[i]) - int(low[i]),
+                'low_confidence': int(low[i]),
+                'reliable': bool(reliable[i] / count > 0.5)
             }
         }
     
@@ -451,54 +581,14 @@ def aggregate_counts_across_images(image_results: Dict[str, List[Dict]]) -> Dict
     if not image_results:
         return {}
     
-    all_detections = []
-    per_image_stats = {}
+    # Streamed one image at a time; medians of overall_counts are estimates
+    # (see src/pipeline/aggregation.py, which also handles the DB history)
+    from .aggregation import CrossImageAggregator
     
-    # Collect all detections and per-image stats
+    aggregator = CrossImageAggregator(keep_per_image=True)
     for image_name, detections in image_results.items():
-        all_detections.extend(detections)
-        per_image_stats[image_name] = count_objects_by_class(detections)
-    
-    # Overall statistics
-    overall_counts = count_objects_by_class(all_detections)
-    
-    # Cross-image analysis
-    all_classes = set()
-    for stats in per_image_stats.values():
-        all_classes.update(stats.keys())
-    
-    cross_image_analysis = {}
-    for class_name in all_classes:
-        class_counts = []
-        class_confidences = []
-        
-        for image_name, stats in per_image_stats.items():
-            if class_name in stats:
-                class_counts.append(stats[class_name]['count'])
-                class_confidences.extend([
-                    stats[class_name]['confidence_stats']['mean']
-                ])
-        
-        cross_image_analysis[class_name] = {
-            'appears_in_images': len(class_counts),
-            'total_images': len(per_image_stats),
-            'frequency': len(class_counts) / len(per_image_stats),
-            'count_variance': np.var(class_counts) if len(class_counts) > 1 else 0,
-            'avg_count_per_image': np.mean(class_counts),
-            'consistency_score': 1 - (np.std(class_counts) / np.mean(class_counts)) if np.mean(class_counts) > 0 else 0
-        }
-    
-    return {
-        'overall_counts': overall_counts,
-        'per_image_stats': per_image_stats,
-        'cross_image_analysis': cross_image_analysis,
-        'summary': {
-            'total_images': len(per_image_stats),
-            'total_objects': len(all_detections),
-            'unique_classes': len(all_classes),
-            'avg_objects_per_image': len(all_detections) / len(per_image_stats) if per_image_stats else 0
-        }
-    }
+        aggregator.add_image(image_name, detections)
+    return aggregator.report()
 
 
 def generate_histograms(detections: List[Dict], 
@@ -518,6 +608,8 @@ def generate_histograms(detections: List[Dict],
     if not detections:
         return {'error': 'No detections to plot'}
     
+    plt = _pyplot()
+    
     # Extract data
     classes = [d.get('mapped_label', d.get('raw_label', 'unknown')) for d in detections]
     confidences = [d.get('confidence', 0) for d in detections]
@@ -666,14 +758,14 @@ def generate_quality_flags(detections: List[Dict],
     quality_metrics = {}
     
     # Extract data
-    confidences = [d.get('confidence', 0) for d in detections]
-    classes = [d.get('mapped_label', d.get('raw_label', 'unknown')) for d in detections]
-    areas = [d.get('area', 0) for d in detections if d.get('area', 0) > 0]
+    grouped = GroupedStats.from_detections(detections)
+    confidences = grouped.confidences
+    areas = grouped.areas[grouped.areas > 0]
     
     # 1. Confidence Quality Assessment
-    high_conf_count = sum(1 for c in confidences if c > 0.8)
-    medium_conf_count = sum(1 for c in confidences if 0.5 <= c <= 0.8)
-    low_conf_count = sum(1 for c in confidences if c < 0.5)
+    high_conf_count = int(np.count_nonzero(confidences > 0.8))
+    low_conf_count = int(np.count_nonzero(confidences < 0.5))
+    medium_conf_count = len(confidences) - high_conf_count - low_conf_count
     
     confidence_quality = high_conf_count / len(confidences)
     quality_metrics['confidence_quality'] = confidence_quality
@@ -685,9 +777,9 @@ def generate_quality_flags(detections: List[Dict],
         recommendations.append('Consider lowering confidence thresholds or improving model')
     
     # 2. Class Distribution Assessment
-    class_counts = Counter(classes)
-    max_class_count = max(class_counts.values())
-    min_class_count = min(class_counts.values())
+    class_counts = dict(zip(grouped.labels, grouped.counts.tolist()))
+    max_class_count = int(grouped.counts.max())
+    min_class_count = int(grouped.counts.min())
     
     if max_class_count / min_class_count > 5:
         flags.append('IMBALANCED_CLASS_DISTRIBUTION')
@@ -703,15 +795,15 @@ def generate_quality_flags(detections: List[Dict],
         recommendations.append('Consider lowering confidence thresholds')
     
     # 4. Area Distribution Assessment
-    if areas:
+    if areas.size:
         area_std = np.std(areas)
         area_mean = np.mean(areas)
         if area_std / area_mean > 2:  # High coefficient of variation
             flags.append('HIGH_SIZE_VARIATION')
         
         # Check for very small or very large objects
-        very_small = sum(1 for a in areas if a < 500)
-        very_large = sum(1 for a in areas if a > 50000)
+        very_small = int(np.count_nonzero(areas < 500))
+        very_large = int(np.count_nonzero(areas > 50000))
         
         if very_small / len(areas) > 0.3:
             flags.append('MANY_SMALL_OBJECTS')
@@ -754,11 +846,11 @@ def generate_quality_flags(detections: List[Dict],
                 'medium': medium_conf_count,
                 'low': low_conf_count
             },
-            'class_distribution': dict(class_counts),
+            'class_distribution': class_counts,
             'area_stats': {
-                'mean': np.mean(areas) if areas else 0,
-                'std': np.std(areas) if areas else 0,
-                'count': len(areas)
+                'mean': float(np.mean(areas)) if areas.size else 0,
+                'std': float(np.std(areas)) if areas.size else 0,
+                'count': int(areas.size)
             }
         }
     }
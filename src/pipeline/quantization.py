@@ -0,0 +1,273 @@
+"""
+Int8 classifier quantization
+Optional quantized variants of the segment classifier for CPU inference
+
+Modes (config.CLASSIFIER_QUANTIZATION):
+    none     fp32 classifier as loaded
+    dynamic  Linear layers quantized to int8, activations quantized on the
+             fly; no calibration. Helps transformer classifiers (ViT); on
+             ResNet only the final layer is affected
+    static   FX graph mode post-training quantization of the whole ResNet
+             (convolutions included), calibrated on local images. Falls
+             back to dynamic for architectures it cannot trace
+
+Compare a mode against fp32 on a local image set:
+    python -m src.pipeline.quantization --mode static --images dev_media
+"""
+
+import copy
+import glob
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import torch
+from PIL import Image
+
+QUANTIZATION_MODES = ('none', 'dynamic', 'static')
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png', '*.bmp', '*.JPG', '*.JPEG', '*.PNG')
+
+
+def select_engine() -> str:
+    """Pick the best quantized kernel backend available on this CPU"""
+    supported = torch.backends.quantized.supported_engines
+    for engine in ('x86', 'fbgemm', 'qnnpack'):
+        if engine in supported:
+            torch.backends.quantized.engine = engine
+            return engine
+    raise RuntimeError('No quantized engine available in this torch build')
+
+
+def calibration_images(directory: str, limit: int = 32) -> List[Image.Image]:
+    """Up to `limit` RGB images from `directory` (sorted for repeatability)"""
+    paths = sorted({path for pattern in IMAGE_PATTERNS
+                    for path in glob.glob(os.path.join(directory, pattern))})
+    images = []
+    for path in paths[:limit]:
+        try:
+            images.append(Image.open(path).convert('RGB'))
+        except OSError as e:
+            logging.warning(f"Skipping calibration image {path}: {e}")
+    return images
+
+
+def _calibration_inputs(images: Iterable[Image.Image]) -> List[Image.Image]:
+    """Whole images plus gray-padded crops, closer to what segments look like"""
+    inputs = []
+    for image in images:
+        inputs.append(image)
+        array = np.asarray(image).copy()
+        height, width = array.shape[:2]
+        masked = np.full_like(array, 128)  # gray background, as in segment_image
+        masked[height // 4:3 * height // 4, width // 4:3 * width // 4] = \
+            array[height // 4:3 * height // 4, width // 4:3 * width // 4]
+        inputs.append(Image.fromarray(masked))
+    return inputs
+
+
+class _ResNetLogits(torch.nn.Module):
+    """HF ResNetForImageClassification as a traceable pixels -> logits graph
+
+    The HF forward checks its input channels in Python, which torch.fx
+    cannot trace, so the submodules are called directly.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.embedder = model.resnet.embedder.embedder
+        self.stem_pool = model.resnet.embedder.pooler
+        self.encoder = model.resnet.encoder
+        self.pooler = model.resnet.pooler
+        self.classifier = model.classifier
+
+    def forward(self, pixel_values):
+        hidden = self.stem_pool(self.embedder(pixel_values))
+        hidden = self.encoder(hidden, output_hidden_states=False, return_dict=False)[0]
+        return self.classifier(self.pooler(hidden))
+
+
+class QuantizedClassifier(torch.nn.Module):
+    """Quantized logits graph behind the HF classifier interface
+
+    Called as classifier(pixel_values=...) and returns an object with
+    .logits, like the model it replaces; `config` carries id2label.
+    """
+
+    def __init__(self, graph, config, mode: str):
+        super().__init__()
+        self.graph = graph
+        self.config = config
+        self.quantization = mode
+
+    def forward(self, pixel_values, **kwargs):
+        from transformers.modeling_outputs import ImageClassifierOutputWithNoAttention
+
+        return ImageClassifierOutputWithNoAttention(logits=self.graph(pixel_values))
+
+
+def quantize_dynamic(model):
+    """int8 copy of `model` with dynamically quantized Linear layers"""
+    select_engine()
+    quantized = torch.ao.quantization.quantize_dynamic(
+        copy.deepcopy(model).eval(), {torch.nn.Linear}, dtype=torch.qint8)
+    quantized.quantization = 'dynamic'
+    return quantized
+
+
+def quantize_static(model, processor, images: List[Image.Image]):
+    """int8 copy of a ResNet classifier, calibrated on `images`
+
+    Raises ValueError when the model is not a ResNet or there is nothing
+    to calibrate on.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    if not hasattr(model, 'resnet'):
+        raise ValueError(f'Static quantization supports ResNet classifiers, not {type(model).__name__}')
+    if not images:
+        raise ValueError('Static quantization needs calibration images')
+
+    engine = select_engine()
+    graph = _ResNetLogits(copy.deepcopy(model).eval()).eval()
+    inputs = [processor(image, return_tensors='pt')['pixel_values'] for image in _calibration_inputs(images)]
+    prepared = prepare_fx(graph, get_default_qconfig_mapping(engine), example_inputs=(inputs[0],))
+    with torch.no_grad():
+        for pixel_values in inputs:
+            prepared(pixel_values)
+    return QuantizedClassifier(convert_fx(prepared), model.config, 'static')
+
+
+def quantize_classifier(model, processor, mode: str,
+                        calibration_dir: Optional[str] = None, calibration_limit: int = 32):
+    """Return `model` quantized per `mode` ('none' returns it unchanged)
+
+    Static quantization falls back to dynamic (with a warning) when the
+    model cannot be traced or no calibration images are found.
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f'Unknown quantization mode {mode!r}; expected one of {QUANTIZATION_MODES}')
+    if mode == 'none':
+        return model
+    if mode == 'static':
+        try:
+            images = calibration_images(calibration_dir, calibration_limit) if calibration_dir else []
+            return quantize_static(model, processor, images)
+        except Exception as e:
+            logging.warning(f"Static quantization unavailable ({e}); using dynamic")
+    return quantize_dynamic(model)
+
+
+def quantization_mode(model) -> str:
+    """Quantization applied to a classifier ('none' for fp32 models)"""
+    return getattr(model, 'quantization', 'none')
+
+
+def _count_by_label(detections: List[Dict]) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for detection in detections:
+        counts[detection['raw_label']] = counts.get(detection['raw_label'], 0) + 1
+    return counts
+
+
+def compare(images_dir: str, mode: str = 'static', limit: int = 20,
+            confidence_threshold: float = 0.7, nms_threshold: float = 0.3) -> Dict[str, Any]:
+    """Accuracy and speed of the `mode` classifier against fp32
+
+    Each image is segmented once (the whole image is one segment when SAM
+    is unavailable); both classifiers then label the same segments.
+    Reports top-1 agreement per segment, per-image count deltas after
+    filtering and NMS (raw labels, no synonym mapping), and the mean
+    classification time per segment.
+    """
+    from ..config import config
+    from .pipeline import get_pipeline
+    from .postprocess import apply_nms, filter_segments
+
+    pipeline = get_pipeline()
+    fp32 = pipeline.classifier
+    if quantization_mode(fp32) != 'none':
+        raise ValueError('compare() needs the fp32 classifier; set CLASSIFIER_QUANTIZATION=none')
+    quantized = quantize_classifier(fp32, pipeline.processor, mode,
+                                    config.QUANTIZATION_CALIBRATION_DIR,
+                                    config.QUANTIZATION_CALIBRATION_IMAGES)
+    paths = sorted({path for pattern in IMAGE_PATTERNS
+                    for path in glob.glob(os.path.join(images_dir, pattern))})[:limit]
+
+    segments_total = agreements = 0
+    seconds = {'fp32': 0.0, 'int8': 0.0}
+    per_image = []
+    segment = pipeline.get_segmenter().available()
+    try:
+        for path in paths:
+            segments, bboxes, image = pipeline.segment_image(path) if segment else ([], [], None)
+            if not segments:
+                image = np.asarray(Image.open(path).convert('RGB'))
+                segments = [image]
+                bboxes = [[0, 0, image.shape[1], image.shape[0]]]
+
+            results = {}
+            for name, model in (('fp32', fp32), ('int8', quantized)):
+                pipeline.classifier = model
+                start = time.perf_counter()
+                results[name] = pipeline.classify_segments(segments, bboxes, image)
+                seconds[name] += time.perf_counter() - start
+
+            segments_total += len(segments)
+            agreements += sum(a['raw_label'] == b['raw_label']
+                              for a, b in zip(results['fp32'], results['int8']))
+            counts = {}
+            for name, classifications in results.items():
+                kept = apply_nms(filter_segments(classifications, bboxes, confidence_threshold),
+                                 threshold=nms_threshold)
+                counts[name] = _count_by_label(kept)
+            labels = set(counts['fp32']) | set(counts['int8'])
+            deltas = {label: counts['int8'].get(label, 0) - counts['fp32'].get(label, 0)
+                      for label in sorted(labels)}
+            per_image.append({
+                'image': os.path.basename(path),
+                'segments': len(segments),
+                'count_fp32': sum(counts['fp32'].values()),
+                'count_int8': sum(counts['int8'].values()),
+                'count_deltas': {label: d for label, d in deltas.items() if d}
+            })
+    finally:
+        pipeline.classifier = fp32
+
+    per_segment = {name: (total / segments_total if segments_total else 0.0)
+                   for name, total in seconds.items()}
+    return {
+        'mode': quantization_mode(quantized),
+        'images': len(paths),
+        'segments': segments_total,
+        'top1_agreement': agreements / segments_total if segments_total else 0.0,
+        'mean_abs_count_delta': (float(np.mean([abs(i['count_int8'] - i['count_fp32']) for i in per_image]))
+                                 if per_image else 0.0),
+        'seconds_per_segment': per_segment,
+        'speedup': per_segment['fp32'] / per_segment['int8'] if per_segment['int8'] else 0.0,
+        'per_image': per_image
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Compare a quantized classifier against fp32')
+    parser.add_argument('--mode', choices=QUANTIZATION_MODES[1:], default='static')
+    parser.add_argument('--images', default='dev_media', help='directory of test images')
+    parser.add_argument('--limit', type=int, default=20, help='maximum number of images')
+    parser.add_argument('--confidence-threshold', type=float, default=0.7)
+    parser.add_argument('--output', help='also write the report to this JSON file')
+    args = parser.parse_args()
+
+    from ..config import config
+    config.CLASSIFIER_QUANTIZATION = 'none'  # the shared pipeline must load fp32
+    report = compare(args.images, args.mode, args.limit, args.confidence_threshold)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
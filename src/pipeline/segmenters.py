@@ -0,0 +1,263 @@
+"""
+Segmenters
+Pluggable region proposal for the pipeline's first stage
+
+Every segmenter returns SAM-style mask records, so everything after
+segmentation (classification, filtering, NMS, counting) is shared:
+
+    [{'segmentation': HxW bool array, 'bbox': [x, y, w, h], 'area': int}, ...]
+
+Available segmenters:
+    sam         segment_anything ViT automatic mask generator (default)
+    mobile_sam  distilled MobileSAM (optional `mobile_sam` package and
+                mobile_sam.pt checkpoint), roughly an order of magnitude
+                faster on CPU
+    contour     OpenCV threshold/edge contours; milliseconds per image,
+                good enough for plain backgrounds with separated objects
+
+The default comes from config.SEGMENTER; requests may ask for another
+one by name. Compare them on a local image set:
+    python -m src.pipeline.segmenters --images dev_media
+"""
+
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .cancellation import checkpoint_hook
+
+SEGMENTERS = ('sam', 'mobile_sam', 'contour')
+
+
+class Segmenter:
+    """Region proposal stage of the pipeline"""
+
+    name = ''
+
+    def available(self) -> bool:
+        """Whether generate() can run (loads the model on first call)"""
+        return True
+
+    def loaded(self) -> bool:
+        """Whether the segmenter is ready without loading anything"""
+        return True
+
+    def generate(self, image_rgb: np.ndarray) -> List[Dict[str, Any]]:
+        """Mask records for an RGB uint8 image"""
+        raise NotImplementedError
+
+
+class SamSegmenter(Segmenter):
+    """The pipeline's SAM automatic mask generator
+
+    `load` returns the mask generator (or None when SAM cannot load); it is
+    called on first use, so SAM is only loaded when something asks for it.
+    `is_loaded` reports whether that has happened.
+
+    The generator keeps the current image's embedding on its predictor
+    (set_image ... reset_image), so one image is segmented at a time.
+    """
+
+    name = 'sam'
+
+    def __init__(self, load: Callable[[], Any], is_loaded: Callable[[], bool]):
+        self._load = load
+        self._is_loaded = is_loaded
+        self._generate_lock = threading.Lock()
+
+    def available(self) -> bool:
+        return self._load() is not None
+
+    def loaded(self) -> bool:
+        return self._is_loaded()
+
+    def generate(self, image_rgb):
+        generator = self._load()
+        with self._generate_lock:
+            return generator.generate(image_rgb)
+
+
+class MobileSamSegmenter(Segmenter):
+    """MobileSAM (ViT-tiny image encoder) behind the SAM mask generator
+
+    Segments one image at a time, like SamSegmenter.
+    """
+
+    name = 'mobile_sam'
+
+    def __init__(self, checkpoint_candidates: List[str], device: str = 'cpu'):
+        self.checkpoint_candidates = checkpoint_candidates
+        self.device = device
+        self.error: Optional[str] = None
+        self._generator = None
+        self._attempted = False
+        self._lock = threading.Lock()
+        self._generate_lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if self._attempted:
+            return self._generator
+        with self._lock:
+            if not self._attempted:
+                try:
+                    from mobile_sam import SamAutomaticMaskGenerator, sam_model_registry
+                    checkpoint = next((c for c in self.checkpoint_candidates if os.path.exists(c)), None)
+                    if checkpoint is None:
+                        raise FileNotFoundError(f'No MobileSAM checkpoint in {self.checkpoint_candidates}')
+                    model = sam_model_registry['vit_t'](checkpoint=checkpoint).to(self.device).eval()
+                    # Lets runs past their deadline stop between point batches
+                    model.mask_decoder.register_forward_pre_hook(checkpoint_hook('mask_generation'))
+                    # No crop layers: speed over the last few small masks
+                    self._generator = SamAutomaticMaskGenerator(
+                        model=model,
+                        points_per_side=8,
+                        pred_iou_thresh=0.88,
+                        stability_score_thresh=0.92,
+                        min_mask_region_area=500,
+                        box_nms_thresh=0.3
+                    )
+                except Exception as e:
+                    self.error = str(e)
+                    logging.warning(f"MobileSAM unavailable: {e}")
+                self._attempted = True
+        return self._generator
+
+    def available(self) -> bool:
+        return self._ensure_loaded() is not None
+
+    def loaded(self) -> bool:
+        return self._generator is not None
+
+    def generate(self, image_rgb):
+        generator = self._ensure_loaded()
+        with self._generate_lock:
+            return generator.generate(image_rgb)
+
+
+class ContourSegmenter(Segmenter):
+    """Classical proposals: Otsu foreground and Canny edges, then contours
+
+    The foreground polarity is chosen from the image border, which is
+    assumed to be mostly background. Regions smaller than `min_area` pixels
+    or covering more than `max_area_fraction` of the image are dropped.
+    """
+
+    name = 'contour'
+
+    def __init__(self, min_area: int = 500, max_area_fraction: float = 0.9, max_regions: int = 100):
+        self.min_area = min_area
+        self.max_area_fraction = max_area_fraction
+        self.max_regions = max_regions
+
+    def _foreground(self, gray: np.ndarray) -> np.ndarray:
+        import cv2
+
+        _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        border = np.concatenate([mask[0], mask[-1], mask[:, 0], mask[:, -1]])
+        if border.mean() > 127:
+            mask = cv2.bitwise_not(mask)
+        edges = cv2.dilate(cv2.Canny(gray, 50, 150), np.ones((3, 3), np.uint8))
+        # Edges split touching objects of the same brightness
+        mask = cv2.bitwise_and(mask, cv2.bitwise_not(edges)) if mask.any() else edges
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+        return cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+
+    def generate(self, image_rgb):
+        import cv2
+
+        gray = cv2.GaussianBlur(cv2.cvtColor(image_rgb, cv2.COLOR_RGB2GRAY), (5, 5), 0)
+        height, width = gray.shape
+        max_area = self.max_area_fraction * height * width
+        contours, _ = cv2.findContours(self._foreground(gray), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        records = []
+        for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:self.max_regions]:
+            area = cv2.contourArea(contour)
+            if area < self.min_area or area > max_area:
+                continue
+            mask = np.zeros((height, width), np.uint8)
+            cv2.drawContours(mask, [contour], -1, 1, thickness=cv2.FILLED)
+            x, y, w, h = cv2.boundingRect(contour)
+            records.append({
+                'segmentation': mask.astype(bool),
+                'bbox': [x, y, w, h],
+                'area': int(mask.sum())
+            })
+        return records
+
+
+def build_segmenters(load_sam: Callable[[], Any], sam_loaded: Callable[[], bool],
+                     model_directory: str = 'models', device: str = 'cpu',
+                     min_area: int = 500) -> Dict[str, Segmenter]:
+    """One instance of every segmenter, keyed by name"""
+    return {
+        'sam': SamSegmenter(load_sam, sam_loaded),
+        'mobile_sam': MobileSamSegmenter(
+            [os.path.join(model_directory, 'mobile_sam.pt'), 'mobile_sam.pt'], device),
+        'contour': ContourSegmenter(min_area=min_area)
+    }
+
+
+def benchmark(images_dir: str, segmenters: List[str], reference: str = 'sam',
+              limit: int = 20) -> Dict[str, Any]:
+    """Latency and counts of each segmenter against `reference` on local images
+
+    Runs the whole pipeline (without synonym mapping) once per image and
+    segmenter. Count error is the absolute difference from the reference
+    segmenter's count; it is omitted when the reference is unavailable.
+    """
+    import glob
+
+    from .pipeline import get_pipeline, run_pipeline
+
+    pipeline = get_pipeline()
+    names = [reference] + [name for name in segmenters if name != reference]
+    paths = sorted(path for path in glob.glob(os.path.join(images_dir, '*'))
+                   if path.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')))[:limit]
+
+    results = {name: {'available': pipeline.get_segmenter(name).available(),
+                      'seconds': [], 'segmentation_seconds': [], 'counts': []}
+               for name in names}
+    for path in paths:
+        for name in names:
+            if not results[name]['available']:
+                continue
+            result = run_pipeline(path, enable_mapping=False, segmenter=name)
+            timings = result['summary'].get('stage_timings', {})
+            results[name]['seconds'].append(result['processing_time'])
+            results[name]['segmentation_seconds'].append(
+                timings.get('mask_generation', 0.0) + timings.get('sam_encoder', 0.0))
+            results[name]['counts'].append(len(result['detections']))
+
+    report = {'images': len(paths), 'reference': reference, 'segmenters': {}}
+    reference_counts = results[reference]['counts']
+    for name, data in results.items():
+        entry = {'available': data['available']}
+        if data['counts']:
+            entry.update({
+                'mean_seconds': float(np.mean(data['seconds'])),
+                'mean_segmentation_seconds': float(np.mean(data['segmentation_seconds'])),
+                'mean_count': float(np.mean(data['counts']))
+            })
+            if reference_counts and name != reference:
+                entry['mean_abs_count_error'] = float(np.mean(
+                    [abs(a - b) for a, b in zip(data['counts'], reference_counts)]))
+        report['segmenters'][name] = entry
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Compare segmenters against SAM on local images')
+    parser.add_argument('--images', default='dev_media', help='directory of test images')
+    parser.add_argument('--segmenters', nargs='+', choices=SEGMENTERS, default=['mobile_sam', 'contour'])
+    parser.add_argument('--reference', choices=SEGMENTERS, default='sam')
+    parser.add_argument('--limit', type=int, default=20, help='maximum number of images')
+    args = parser.parse_args()
+
+    print(json.dumps(benchmark(args.images, args.segmenters, args.reference, args.limit), indent=2))
@@ -0,0 +1,207 @@
+"""
+Stub pipeline backend
+Deterministic synthetic detections behind the adapter interface, so the
+web, storage and monitoring layers can be profiled and load-tested
+without model weights, torch or a GPU
+
+Selected with OBJ_DETECT_PIPELINE_BACKEND=stub; ProductionConfig refuses
+it. The same image (by content) and object type always give the same
+detections. Each run sleeps for a latency drawn from STUB_LATENCY, spread
+over the real stage names so stage_timings and the monitoring histograms
+look like a real run:
+
+    none                no delay (default)
+    fixed:0.2           always 0.2s
+    uniform:0.1,0.5     between 0.1s and 0.5s
+    normal:0.3,0.05     mean and standard deviation, clipped at 0
+    lognormal:0.3,0.5   median and sigma; the long tail inference shows
+
+Latencies come from one generator seeded with STUB_SEED, so a
+single-threaded run is reproducible too.
+"""
+
+import hashlib
+import math
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .mapping import get_candidate_set
+from .pipeline import _PipelineCompatibilityAdapter
+from .cancellation import CancellationToken, PipelineCancelled, current_token, use_token
+from .tracing import Trace, activate, span
+from ..config import config
+from ..metrics.instruments import PIPELINE_IN_FLIGHT
+
+# Share of a run's latency per stage, roughly as measured on CPU; the
+# names are the spans run_pipeline records (segmentation is its first three)
+STAGE_SHARES = {
+    'image_decode': 0.05,
+    'mask_generation': 0.5,
+    'segment_extraction': 0.05,
+    'classification': 0.3,
+    'filter': 0.02,
+    'nms': 0.03,
+    'label_mapping': 0.03,
+    'aggregation': 0.02
+}
+
+LATENCY_DISTRIBUTIONS = {
+    'none': 0,
+    'fixed': 1,
+    'uniform': 2,
+    'normal': 2,
+    'lognormal': 2
+}
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Sampler for a STUB_LATENCY spec such as `lognormal:0.3,0.5`"""
+    name, _, params = spec.strip().lower().partition(':')
+    if name not in LATENCY_DISTRIBUTIONS:
+        raise ValueError(f"Unknown stub latency {spec!r}; expected one of {sorted(LATENCY_DISTRIBUTIONS)}")
+    try:
+        values = [float(v) for v in params.split(',')] if params else []
+    except ValueError:
+        raise ValueError(f"Invalid stub latency parameters in {spec!r}")
+    if len(values) != LATENCY_DISTRIBUTIONS[name] or any(v < 0 for v in values):
+        raise ValueError(f"Stub latency {name!r} takes {LATENCY_DISTRIBUTIONS[name]} non-negative parameter(s)")
+
+    if name == 'none':
+        return lambda rng: 0.0
+    if name == 'fixed':
+        return lambda rng: values[0]
+    if name == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1])
+    if name == 'normal':
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    median, sigma = values
+    return lambda rng: rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+
+def image_seed(image_path: str) -> int:
+    """Seed derived from the image bytes (the path when it cannot be read)"""
+    digest = hashlib.sha256()
+    try:
+        with open(image_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                digest.update(chunk)
+    except OSError:
+        digest.update(image_path.encode())
+    return int.from_bytes(digest.digest()[:8], 'big')
+
+
+def synthetic_detections(image_path: str, labels: List[str], max_objects: int) -> List[Dict[str, Any]]:
+    """Detections shaped like run_pipeline's, fixed for an image and label set"""
+    # hash() of a str differs between processes, so the labels go through sha256 too
+    label_seed = int.from_bytes(hashlib.sha256(','.join(labels).encode()).digest()[:8], 'big')
+    rng = random.Random(image_seed(image_path) ^ label_seed)
+    detections = []
+    for i in range(rng.randint(0, max_objects)):
+        label = rng.choice(labels)
+        x, y = rng.randint(0, 600), rng.randint(0, 400)
+        w, h = rng.randint(20, 200), rng.randint(20, 200)
+        detections.append({
+            'segment_id': i,
+            'raw_label': label,
+            'mapped_label': label,
+            'confidence': round(rng.uniform(0.7, 0.99), 4),
+            'bbox': [x, y, w, h],
+            'area': w * h,
+            'mapping_method': 'stub'
+        })
+    return detections
+
+
+class StubPipeline(_PipelineCompatibilityAdapter):
+    """The API adapter with run_pipeline replaced by synthetic detections
+
+    Counting, the response shape and the segmenter field all come from
+    the real adapter; only the model run is faked.
+    """
+
+    # Synthetic raw labels are already candidate names
+    map_recounted_labels = False
+
+    def __init__(self, latency: Optional[str] = None, max_objects: Optional[int] = None,
+                 seed: Optional[int] = None):
+        super().__init__()
+        self.latency_spec = latency if latency is not None else config.STUB_LATENCY
+        self._sample = parse_latency(self.latency_spec)
+        self.max_objects = max_objects if max_objects is not None else config.STUB_MAX_OBJECTS
+        self._rng = random.Random(seed if seed is not None else config.STUB_SEED)
+        self._rng_lock = threading.Lock()
+        # Stands in for the execution policy's inference slots
+        self._slots = threading.BoundedSemaphore(max(1, config.MAX_CONCURRENT_REQUESTS))
+
+    def _latency(self) -> float:
+        with self._rng_lock:
+            return self._sample(self._rng)
+
+    def _run(self, image_path: str, target_classes: Optional[List[str]] = None,
+             segmenter: Optional[str] = None,
+             cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+        start_time = time.time()
+        trace = Trace()
+        token = cancel_token or current_token() or CancellationToken(config.PROCESSING_TIMEOUT)
+        labels = target_classes or get_candidate_set('general')
+        latency = self._latency()
+        PIPELINE_IN_FLIGHT.inc()
+        try:
+            with activate(trace), use_token(token):
+                # Nothing to load, but recorded like run_pipeline's first stage
+                with span('model_init'):
+                    pass
+                token.check('queue_wait')
+                with span('queue_wait'):
+                    acquired = self._slots.acquire(timeout=token.remaining())
+                if not acquired:
+                    raise PipelineCancelled(token.reason() or 'timeout', 'queue_wait')
+                try:
+                    for stage, share in STAGE_SHARES.items():
+                        # Same checkpoints as run_pipeline: between stages
+                        token.check(stage)
+                        with span(stage):
+                            if latency:
+                                time.sleep(latency * share)
+                            if stage == 'mask_generation':
+                                detections = synthetic_detections(image_path, labels, self.max_objects)
+                finally:
+                    self._slots.release()
+        finally:
+            PIPELINE_IN_FLIGHT.dec()
+        processing_time = time.time() - start_time
+        return {
+            'image_path': image_path,
+            'detections': detections,
+            # Nothing is filtered, so every segment is also a detection
+            'segments': detections,
+            'summary': {
+                'total_objects': len(detections),
+                'processing_time': f"{processing_time:.2f}s",
+                'stage_timings': trace.timings()
+            },
+            'processing_time': processing_time
+        }
+
+    def segmenter_available(self, name: str) -> bool:
+        return True
+
+    def get_model_status(self) -> Dict[str, Any]:
+        return {
+            'models_loaded': True,
+            'warmup_complete': True,
+            'warmup_in_progress': False,
+            'warmup_seconds': 0.0,
+            'warmup_error': None,
+            'backend': 'stub',
+            'models': {'stub': {'name': 'stub', 'loaded': True, 'latency': self.latency_spec,
+                                'max_objects': self.max_objects}}
+        }
+
+    def warm_up(self) -> bool:
+        return True
+
+    def is_ready(self) -> bool:
+        return True
@@ -0,0 +1,114 @@
+"""
+Lightweight stage tracing
+Context-manager spans that time each stage of a pipeline run
+
+Usage:
+    trace = Trace()
+    with activate(trace):
+        with span('classification'):
+            ...
+    trace.timings()  # {'classification': 0.42}
+
+    with on_stage(lambda stage, seconds: print(stage, seconds)):
+        ...  # every span closed in here is reported as it ends
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+_current_trace: ContextVar[Optional['Trace']] = ContextVar('pipeline_trace', default=None)
+_stage_listener: ContextVar[Optional[Callable[[str, float], None]]] = ContextVar('stage_listener', default=None)
+
+
+class Trace:
+    """Collects wall time per stage for one pipeline run
+
+    Times are exclusive: a span nested in another (e.g. the SAM encoder
+    inside mask generation) is subtracted from its parent, so the stage
+    times of a run add up to its total.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self._stack: List[list] = []  # [name, start, child_time]
+
+    def start(self, name: str) -> None:
+        """Open a span; prefer span() unless start/stop live in different callbacks"""
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def stop(self, name: str) -> None:
+        """Close the innermost open span called `name`
+
+        Spans opened after it and never closed (their stage raised) are
+        discarded so one failure cannot skew the remaining timings.
+        """
+        if not any(frame[0] == name for frame in self._stack):
+            return
+        while self._stack:
+            frame_name, start, child_time = self._stack.pop()
+            if frame_name == name:
+                break
+        elapsed = time.perf_counter() - start
+        stage = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+        stage['seconds'] += elapsed - child_time
+        stage['calls'] += 1
+        if self._stack:
+            self._stack[-1][2] += elapsed
+        listener = _stage_listener.get()
+        if listener is not None:
+            listener(name, elapsed - child_time)
+
+    @contextmanager
+    def span(self, name: str):
+        """Time the enclosed block as stage `name`"""
+        self.start(name)
+        try:
+            yield self
+        finally:
+            self.stop(name)
+
+    def timings(self) -> Dict[str, float]:
+        """Seconds spent per stage, rounded to the microsecond"""
+        return {name: round(stage['seconds'], 6) for name, stage in self.stages.items()}
+
+
+@contextmanager
+def activate(trace: Trace):
+    """Make `trace` the target of span() calls in this thread/context"""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def on_stage(listener: Callable[[str, float], None]):
+    """Call listener(stage, seconds) as each span closes in this thread/context
+
+    Works across the traces of several runs, e.g. to report the progress
+    of a batch while it is processed.
+    """
+    token = _stage_listener.set(listener)
+    try:
+        yield listener
+    finally:
+        _stage_listener.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    """The active trace, or None outside activate()"""
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str):
+    """Time a stage on the active trace; a no-op when none is active"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    with trace.span(name):
+        yield trace
@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+"""Production server module
+Description:
+    Runs the Flask app under gunicorn with the models loaded once in the
+    master process and shared copy-on-write by the forked workers
+
+    Startup order matters:
+      1. master: torch limited to one thread, app imported, models loaded
+         (no inference: an OpenMP pool started before fork() does not
+         survive in the children), gc.freeze() so the garbage collector
+         does not dirty the shared pages
+      2. each worker after fork: fresh database connections, its share
+         of the cores split into inference slots (pipeline/execution.py),
+         warm-up started in the background
+         (/api/performance/ready returns 503 until it finishes)
+      3. on SIGTERM each worker stops accepting and finishes in-flight
+         requests for up to GRACEFUL_TIMEOUT seconds, then cancels its
+         background jobs and waits for them to save what they counted
+"""
+import gc
+import logging
+import os
+import tempfile
+from gunicorn.app.base import BaseApplication
+
+from .config import config
+
+
+def post_fork(server, worker):
+    """gunicorn hook: make the freshly forked worker safe to serve"""
+    from . import storage
+    from .pipeline import execution
+
+    storage.database.after_fork()
+    policy = execution.configure(workers=config.WEB_WORKERS)
+    server.log.info(f"Worker {worker.pid}: {policy.slots} inference slots "
+                    f"x {policy.threads_per_slot} torch threads")
+
+
+def post_worker_init(worker):
+    """gunicorn hook: warm the shared models up inside the worker"""
+    from .app import start_model_warm_up
+
+    start_model_warm_up()
+
+
+def worker_exit(server, worker):
+    """gunicorn hook: stop background jobs, then publish the final metrics
+
+    Runs after the worker stopped taking requests; its jobs stop at their
+    next pipeline checkpoint, save what they counted and end with a
+    `cancelled` event before the process exits.
+    """
+    from .api.utils import progress
+    from .metrics import shared
+
+    progress.shutdown_jobs()
+    store = shared.get_store()
+    if store is not None:
+        store.flush(force=True)
+
+
+def gunicorn_options() -> dict:
+    """gunicorn settings derived from Config"""
+    return {
+        'bind': f'{config.HOST}:{config.PORT}',
+        'workers': config.WEB_WORKERS,
+        # Threads keep the worker heartbeat alive during long inferences
+        'worker_class': 'gthread',
+        'threads': config.WEB_THREADS,
+        'preload_app': True,
+        'timeout': max(120, config.BATCH_PROCESSING_TIMEOUT),
+        'graceful_timeout': config.GRACEFUL_TIMEOUT,
+        'post_fork': post_fork,
+        'post_worker_init': post_worker_init,
+        'worker_exit': worker_exit,
+        'accesslog': '-',
+        'loglevel': config.LOG_LEVEL.lower(),
+    }
+
+
+class ProductionServer(BaseApplication):
+    """gunicorn application serving an already-imported WSGI app"""
+
+    def __init__(self, application, options=None):
+        self.application = application
+        self.options = options or {}
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key.lower(), value)
+
+    def load(self):
+        return self.application
+
+
+def preload_models():
+    """Load every model in this (master) process without running inference"""
+    if config.PIPELINE_BACKEND == 'stub':
+        return
+    import torch
+    from .pipeline.pipeline import get_pipeline
+    from .pipeline.mapping import get_mapper
+
+    torch.set_num_threads(1)
+    get_pipeline()
+    get_mapper()
+
+
+def run():
+    """Start gunicorn with the settings from Config"""
+    from .metrics import shared
+
+    if config.WEB_WORKERS > 1 and not config.METRICS_SHARED_DIR:
+        # Workers must share one metrics directory for merged reporting
+        config.METRICS_SHARED_DIR = tempfile.mkdtemp(prefix='objdetect-metrics-')
+    if config.METRICS_SHARED_DIR:
+        os.makedirs(config.METRICS_SHARED_DIR, exist_ok=True)
+        shared.clear(config.METRICS_SHARED_DIR)
+
+    from .app import app
+
+    if config.PRELOAD_MODELS:
+        logging.info("Preloading models in the master process")
+        try:
+            preload_models()
+        except Exception as e:
+            # Workers load lazily instead; readiness reports the failure
+            logging.error(f"Model preload failed: {e}")
+    gc.collect()
+    gc.freeze()
+
+    ProductionServer(app, gunicorn_options()).run()
@@ -22,7 +22,7 @@ class BaseModel:
         updated_at: When the row was last edited
     """
     id = Column(String(60), primary_key=True, nullable=False)
-    created_at = Column(DateTime(), default=datetime.now(), nullable=False)
+    created_at = Column(DateTime(), default=datetime.now(), nullable=False, index=True)
     updated_at = Column(DateTime(), default=datetime.now(), nullable=False)
 
     def __init__(self) -> None:
@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+"""Detection Model - Module"""
+from sqlalchemy import String, Column, Integer, Float, Boolean, ForeignKey
+from .base_model import Base, BaseModel
+
+class Detection(BaseModel, Base):
+    """Creating a Detections table in the database
+    One row per classified segment of the pipeline run behind an output,
+    so counts can be recomputed with other thresholds without re-inference
+    Args
+        output_id: Foreign key to the output of the run that produced the segment
+        segment_id: index of the segment within its image
+        x, y, width, height: bounding box of the segment in pixels
+        area: bounding box area in pixels
+        raw_label: label given by the classifier
+        confidence: classifier confidence
+        calibrated_confidence: confidence after calibration
+        mapped_label: label after synonym/zero-shot mapping (only for kept segments)
+        mapping_method: how mapped_label was chosen
+        kept: whether the segment survived the run's filtering and NMS
+    """
+    __tablename__ = 'detections'
+    output_id = Column(String(60), ForeignKey("outputs.id"), nullable=False, index=True)
+    segment_id = Column(Integer, nullable=False)
+    x = Column(Integer, nullable=False)
+    y = Column(Integer, nullable=False)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    area = Column(Integer, nullable=False)
+    raw_label = Column(String(200), nullable=False)
+    confidence = Column(Float(), nullable=False)
+    calibrated_confidence = Column(Float())
+    mapped_label = Column(String(128))
+    mapping_method = Column(String(32))
+    kept = Column(Boolean, nullable=False, default=False)
+
+    RECORD_FIELDS = ('segment_id', 'x', 'y', 'width', 'height', 'area', 'raw_label', 'confidence',
+                     'calibrated_confidence', 'mapped_label', 'mapping_method', 'kept')
+
+    def __init__(self, **kwargs):
+        """initializes Detection class"""
+        super().__init__()
+        if kwargs:
+            for key, value in kwargs.items():
+                if hasattr(self, key):
+                    setattr(self, key, value)
+
+    @classmethod
+    def from_records(cls, output_id, records):
+        """Detection rows of one output from the pipeline's detection records"""
+        return [cls(output_id=output_id, **record) for record in records]
+
+    def to_record(self):
+        """This row as a pipeline detection record (see from_records)"""
+        return {field: getattr(self, field) for field in self.RECORD_FIELDS}
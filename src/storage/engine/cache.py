@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+"""Object type cache - Module
+Description:
+    Keeps the (small, rarely changing) object_types table in memory so
+    name/id lookups made on every request do not hit the database
+"""
+import threading
+import time
+from src.metrics.instruments import CACHE_LOOKUPS
+
+
+class ObjectTypeCache:
+    """Thread-safe read-through cache of ObjectType rows by name and by id
+    Rows are kept as plain dicts of column values, never ORM instances:
+    those belong to the session (and thread) that loaded them, and expire
+    or detach when it commits, rolls back or closes.
+    Attrs:
+        hits: lookups answered from memory
+        misses: lookups the snapshot could not answer
+    The whole table is loaded on first use and served from memory until
+    invalidate() is called or the snapshot is older than ttl seconds, so
+    rows written by other worker processes still show up eventually.
+    """
+
+    def __init__(self, loader, ttl=300):
+        """Intializes the cache
+        Args:
+            loader: callable returning every ObjectType row as a dict of
+                column values
+            ttl: maximum age of a snapshot in seconds
+        """
+        self.__loader = loader
+        self.__ttl = ttl
+        self.__lock = threading.Lock()
+        self.__generation = 0
+        self.__by_name = None
+        self.__by_id = None
+        self.__loaded_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def __snapshot(self):
+        """Return the (by_name, by_id) maps, reloading them if needed"""
+        with self.__lock:
+            fresh = time.monotonic() - self.__loaded_at <= self.__ttl
+            if self.__by_name is not None and fresh:
+                return self.__by_name, self.__by_id
+            generation = self.__generation
+
+        # Load outside the lock: the query may autoflush, and a flush
+        # touching object types calls invalidate() on this same thread
+        rows = self.__loader() or []
+        by_name = {row['name']: row for row in rows}
+        by_id = {row['id']: row for row in rows}
+        with self.__lock:
+            # Drop the result if an invalidation raced with the load
+            if generation == self.__generation:
+                self.__by_name = by_name
+                self.__by_id = by_id
+                self.__loaded_at = time.monotonic()
+        return by_name, by_id
+
+    def get(self, name=None, id=None):
+        """Look up one ObjectType row by name or by id
+        Return: a copy of the cached column values, or None when the
+        snapshot has no match
+        """
+        by_name, by_id = self.__snapshot()
+        row = by_id.get(id) if id else by_name.get(name)
+        with self.__lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        CACHE_LOOKUPS.inc(cache='object_type', result='miss' if row is None else 'hit')
+        return dict(row) if row is not None else None
+
+    def invalidate(self) -> None:
+        """Forget the current snapshot; the next lookup reloads it"""
+        with self.__lock:
+            self.__generation += 1
+            self.__by_name = None
+            self.__by_id = None
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the snapshot size"""
+        with self.__lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.__by_id) if self.__by_id is not None else 0
+            }
@@ -1,10 +1,19 @@
 #!/usr/bin/python3
 """Engine - Module"""
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy import create_engine, event, func, case, select
+from sqlalchemy.orm import scoped_session, sessionmaker, make_transient_to_detached
 from src.storage.base_model import Base
+from src.storage.inputs import Input
+from src.storage.object_types import ObjectType
+from src.storage.outputs import Output
+from src.storage.detections import Detection
+from src.storage.engine.cache import ObjectTypeCache
+from src.metrics.instruments import DB_QUERY_SECONDS
+from contextlib import contextmanager
 from os import getenv
-from datetime import datetime
+from datetime import datetime, timedelta
+import threading
+import time
 
 
 class Engine:
@@ -15,6 +24,8 @@ class Engine:
 
     def __init__(self):
         """intialize the Engine"""
+        # Unit-of-work nesting is tracked per request thread
+        self.__local = threading.local()
         # setup connection to MySQL
         OBJ_DETECT_MYSQL_USER = getenv('OBJ_DETECT_MYSQL_USER')
         OBJ_DETECT_MYSQL_PWD = getenv('OBJ_DETECT_MYSQL_PWD')
@@ -34,13 +45,32 @@ class Engine:
                 pool_pre_ping=True,
                 connect_args={"check_same_thread": False}
             )
+            # pysqlite defers BEGIN on its own, which breaks SAVEPOINT;
+            # let SQLAlchemy emit BEGIN so nested transactions work
+            @event.listens_for(self.__engine, "connect")
+            def _sqlite_connect(dbapi_connection, connection_record):
+                dbapi_connection.isolation_level = None
+
+            @event.listens_for(self.__engine, "begin")
+            def _sqlite_begin(connection):
+                connection.exec_driver_sql("BEGIN")
         else:
             self.__engine = create_engine(exec_db, pool_pre_ping=True)
+        event.listen(self.__engine, "before_cursor_execute", self.__before_execute)
+        event.listen(self.__engine, "after_cursor_execute", self.__after_execute)
+        event.listen(self.__engine, "handle_error", self.__execute_failed)
         
+        # Short-lived cache of summary_stats() results
+        self.__stats_lock = threading.Lock()
+        self.__stats_cache = {}
+
         # Initialize session
-        session_db = sessionmaker(bind=self.__engine, expire_on_commit=False)
-        Session = scoped_session(session_db)
-        self.__session = Session()
+        self.__object_types = ObjectTypeCache(
+            lambda: [dict(row._mapping) for row in
+                     self.__session.execute(select(*ObjectType.__table__.columns))],
+            ttl=float(getenv('OBJECT_TYPE_CACHE_TTL', '300'))
+        )
+        self.__session = self.__new_session()
 
         if OBJ_DETECT_ENV == 'test':
             # In test env, reset DB to a clean state each run
@@ -49,6 +79,7 @@ class Engine:
         else:
             # In development/production, ensure tables exist but do not drop data
             Base.metadata.create_all(self.__engine)
+            self.__create_missing_indexes()
 
     def new(self, obj):
         """
@@ -59,9 +90,70 @@ class Engine:
     def save(self):
         """
             save to the db storage
+            Inside a unit of work the commit is deferred until the
+            outermost unit_of_work block exits
         """
+        if self.__uow_depth:
+            return
         self.__session.commit()
 
+    def bulk_save(self, objs):
+        """
+            Insert many new objects with a single executemany per table
+        Args:
+            objs: list of new model instances
+        """
+        if not objs:
+            return
+        now = datetime.now()
+        for obj in objs:
+            obj.updated_at = now
+        # bulk inserts bypass the session, so flush events never see them
+        if any(isinstance(obj, ObjectType) for obj in objs):
+            self.__object_types.invalidate()
+        # pending rows (e.g. a new ObjectType) must reach the db first
+        # so foreign keys of the bulk rows resolve
+        self.__session.flush()
+        self.__session.bulk_save_objects(objs, preserve_order=True)
+        self.save()
+
+    @property
+    def __uow_depth(self):
+        """Unit-of-work nesting of the calling thread"""
+        return getattr(self.__local, 'uow_depth', 0)
+
+    @__uow_depth.setter
+    def __uow_depth(self, value):
+        self.__local.uow_depth = value
+
+    @contextmanager
+    def unit_of_work(self):
+        """
+            Stage every write made inside the block and commit them once
+            Nested blocks join the outermost one; any exception rolls
+            the whole unit back
+        """
+        self.__uow_depth += 1
+        try:
+            yield self
+            if self.__uow_depth == 1:
+                self.__session.commit()
+        except Exception:
+            if self.__uow_depth == 1:
+                self.__session.rollback()
+            raise
+        finally:
+            self.__uow_depth -= 1
+
+    @contextmanager
+    def savepoint(self):
+        """
+            Isolate a group of writes inside a unit of work
+            A failure rolls back only this group, then re-raises
+        """
+        with self.__session.begin_nested():
+            yield self
+
     def get(self, cls, id=None, **kwargs) -> object:
         """retrieve one object based on cls and id or kwargs
         Args:
@@ -95,21 +187,190 @@ class Engine:
             self.__session.delete(obj)
         self.save()
 
+    def __create_missing_indexes(self):
+        """create indexes added to models after their table already existed"""
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(self.__engine, checkfirst=True)
+
+    def count(self, cls, since=None) -> int:
+        """count rows of cls with a SQL COUNT
+        Args:
+            cls: class of the objects
+            since: only count rows created at or after this datetime
+        """
+        query = self.__session.query(func.count(cls.id))
+        if since:
+            query = query.filter(cls.created_at >= since)
+        return query.scalar() or 0
+
+    def average(self, cls, field, since=None) -> float:
+        """average a numeric column of cls with a SQL AVG
+        Args:
+            cls: class of the objects
+            field: name of the column to average
+            since: only use rows created at or after this datetime
+        """
+        query = self.__session.query(func.avg(getattr(cls, field)))
+        if since:
+            query = query.filter(cls.created_at >= since)
+        return float(query.scalar() or 0)
+
+    def summary_stats(self, window_hours=24, max_age=0) -> dict:
+        """row counts and output averages computed in the database
+        Args:
+            window_hours: size of the recent activity window
+            max_age: reuse a previous result younger than this (seconds)
+        Return: dict of totals, recent outputs and average confidence
+        """
+        now = time.monotonic()
+        with self.__stats_lock:
+            cached = self.__stats_cache.get(window_hours)
+            if cached and max_age and now - cached[0] < max_age:
+                return dict(cached[1])
+
+        since = datetime.now() - timedelta(hours=window_hours)
+        total_outputs, recent_outputs, average_confidence = self.__session.query(
+            func.count(Output.id),
+            func.sum(case((Output.created_at >= since, 1), else_=0)),
+            func.avg(Output.pred_confidence)
+        ).one()
+        stats = {
+            'total_inputs': self.count(Input),
+            'total_outputs': total_outputs or 0,
+            'total_object_types': self.count(ObjectType),
+            'recent_outputs': int(recent_outputs or 0),
+            'average_confidence': float(average_confidence or 0)
+        }
+        with self.__stats_lock:
+            self.__stats_cache[window_hours] = (now, stats)
+        return dict(stats)
+
+    def iter_output_counts(self, since=None, corrected=False, batch_size=1000):
+        """stream (input id, object type name, count, confidence) per output
+        Args:
+            since: only outputs created at or after this datetime
+            corrected: use corrected_count where a user set one
+            batch_size: rows fetched per round trip
+        Return: rows ordered by input id, so one image's rows are adjacent
+        """
+        count = (func.coalesce(Output.corrected_count, Output.predicted_count) if corrected
+                 else Output.predicted_count)
+        query = self.__session.query(Output.input_id, ObjectType.name, count, Output.pred_confidence).\
+            join(ObjectType, Output.object_type_id == ObjectType.id)
+        if since:
+            query = query.filter(Output.created_at >= since)
+        return query.order_by(Output.input_id).yield_per(batch_size)
+
+    def get_detections(self, output_id, kept=None):
+        """stored detections of one output, in segment order
+        Args:
+            output_id: id of the output
+            kept: True/False to select only segments that did/did not
+                survive the original run's filtering, None for all
+        Return: list of Detection rows
+        """
+        query = self.__session.query(Detection).filter(Detection.output_id == output_id)
+        if kept is not None:
+            query = query.filter(Detection.kept == kept)
+        return query.order_by(Detection.segment_id).all()
+
     def reload(self):
         """
             create table in database
         """
         Base.metadata.create_all(self.__engine)
+        self.__session = self.__new_session()
+        self.__object_types.invalidate()
+
+    @staticmethod
+    def __before_execute(conn, cursor, statement, parameters, context, executemany):
+        """Remember when a statement started (for DB_QUERY_SECONDS)"""
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @staticmethod
+    def __after_execute(conn, cursor, statement, parameters, context, executemany):
+        """Time a finished statement, labelled by its verb (SELECT, INSERT...)"""
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'UNKNOWN'
+        DB_QUERY_SECONDS.observe(elapsed, operation=operation)
+
+    @staticmethod
+    def __execute_failed(exception_context):
+        """Drop the start time of a statement that raised"""
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('query_start'):
+            conn.info['query_start'].pop()
+
+    def __new_session(self):
+        """Create a session whose writes keep the object type cache coherent
+
+        The scoped_session registry is kept rather than one Session from
+        it: every call goes to the calling thread's own session, so
+        concurrent requests never share a transaction.
+        """
         session_db = sessionmaker(bind=self.__engine, expire_on_commit=False)
-        Session = scoped_session(session_db)
-        self.__session = Session()
+        event.listen(session_db, "after_flush", self.__after_flush)
+        event.listen(session_db, "after_soft_rollback", self.__after_rollback)
+        return scoped_session(session_db)
+
+    def __after_flush(self, session, flush_context):
+        """Invalidate cached object types when a flush creates/edits/deletes one"""
+        changed = list(session.new) + list(session.dirty) + list(session.deleted)
+        if any(isinstance(obj, ObjectType) for obj in changed):
+            self.__object_types.invalidate()
+
+    def __after_rollback(self, session, previous_transaction):
+        """A rollback may undo object types the cache already saw"""
+        self.__object_types.invalidate()
+
+    def get_object_type(self, name=None, id=None):
+        """retrieve one ObjectType by name or id through the in-memory cache
+        Args:
+            name: name of the object type
+            id: Id of the object type
+        Return: the ObjectType row in the calling thread's session, or None
+        """
+        if not name and not id:
+            return None
+        cached = self.__object_types.get(name=name, id=id)
+        if cached is not None:
+            # Rebuild the row from the cached values and attach it to this
+            # thread's session without a query (or reuse the instance the
+            # session already has)
+            obj = ObjectType(**cached)
+            make_transient_to_detached(obj)
+            return self.__session.merge(obj, load=False)
+        # A miss may mean another process created the row after our
+        # snapshot; confirm against the db before reporting it missing
+        if id:
+            obj = self.get(ObjectType, id=id)
+        else:
+            obj = self.get(ObjectType, name=name)
+        if obj is not None:
+            self.__object_types.invalidate()
+        return obj
+
+    def object_type_cache_stats(self) -> dict:
+        """Return hit/miss counters of the object type cache"""
+        return self.__object_types.stats()
 
     def close(self) -> None:
         """
-            Closing the session
+            Close and discard the calling thread's session
         """
         if self.__session:
-            self.__session.close()
+            self.__session.remove()
+
+    def after_fork(self) -> None:
+        """
+            Drop connections inherited from the parent process
+            Call in a forked worker before it touches the database;
+            the parent keeps using its own connections
+        """
+        self.__engine.dispose(close=False)
+        self.__session = self.__new_session()
+        self.__object_types.invalidate()
 
     def update(self, cls, id, **kwargs):
         """Update an object in the database
@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 """Output Model - Module"""
 from sqlalchemy import String, Column, Integer, Float, ForeignKey
+from sqlalchemy.orm import relationship
 from .base_model import Base, BaseModel
 
 class Output(BaseModel, Base):
@@ -18,6 +19,7 @@ class Output(BaseModel, Base):
     pred_confidence = Column(Float(), nullable=False)
     object_type_id = Column(String(60), ForeignKey("object_types.id"), nullable=False)
     input_id = Column(String(60), ForeignKey("inputs.id"), nullable=False)
+    detections = relationship("Detection", backref="output", cascade="all, delete-orphan")
 
     def __init__(self, **kwargs):
         """initializes Output class"""
@@ -44,7 +44,7 @@ def setup_logging():
 def start_development_server():
     """Start the Flask development server."""
     try:
-        from src.app import app
+        from src.app import app, start_model_warm_up
         from src.config import config
 
         print("Starting AI Object Counting (Development Mode)...")
@@ -63,7 +63,9 @@ def start_development_server():
         print("  - POST /api/batch/process")
         print("  - GET  /api/results")
         print("  - GET  /api/performance/*")
+        print("  - GET  /metrics")
 
+        start_model_warm_up()
         app.run(
             host=config.HOST,
             port=config.PORT,
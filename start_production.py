@@ -86,18 +86,48 @@ def check_dependencies():
         print("Please install all requirements: pip install -r requirements.txt")
         return False
 
+def print_startup_banner(workers):
+    """Print the configuration the server is about to start with"""
+    from src.config import config
+    from src.pipeline.execution import ExecutionPolicy
+    
+    print("🚀 Starting AI Object Counting Application...")
+    print(f"   Environment: {config.ENV}")
+    print(f"   Host: {config.HOST}")
+    print(f"   Port: {config.PORT}")
+    print(f"   Database: {config.DATABASE_TYPE}")
+    print(f"   Debug: {config.DEBUG}")
+    # The layout each worker applies after fork; only described here, torch
+    # thread counts are set in the workers themselves
+    policy = ExecutionPolicy.from_config(workers=workers)
+    print(f"   Workers: {workers} x {config.WEB_THREADS} threads, "
+          f"{policy.slots} inference slots x {policy.threads_per_slot} torch threads each "
+          f"(SAM segments one image at a time per worker)")
+
 def start_application():
-    """Start the Flask application"""
+    """Start the application under gunicorn (Flask server as a fallback)"""
     try:
-        from src.app import app
         from src.config import config
         
-        print("🚀 Starting AI Object Counting Application...")
-        print(f"   Environment: {config.ENV}")
-        print(f"   Host: {config.HOST}")
-        print(f"   Port: {config.PORT}")
-        print(f"   Database: {config.DATABASE_TYPE}")
-        print(f"   Debug: {config.DEBUG}")
+        try:
+            from src import serving
+        except ImportError:
+            # gunicorn is POSIX-only; keep Windows hosts working
+            serving = None
+        
+        print_startup_banner(config.WEB_WORKERS if serving is not None else 1)
+        
+        if serving is not None:
+            # Models load once here and are shared by the forked workers,
+            # which warm up on their own; readiness waits for that
+            serving.run()
+            return
+        
+        print("⚠️  gunicorn is not available; falling back to the Flask server")
+        from src.app import app, start_model_warm_up
+        
+        # Warm the models up while the server starts; readiness waits for it
+        start_model_warm_up()
         
         # Start the application
         app.run(
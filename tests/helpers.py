@@ -0,0 +1,34 @@
+# tests/helpers.py
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.storage.engine.engine import Engine
+from src.storage import Input, Output
+
+
+class EngineTestCase(unittest.TestCase):
+    """Runs each test against a fresh SQLite Engine in its own temp dir"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(self.tmpdir.name, 'engine_test.db')
+        env = {'OBJ_DETECT_ENV': 'test', 'OBJ_DETECT_MYSQL_DB': db_path}
+        with patch.dict(os.environ, env):
+            self.db = Engine()
+
+        # Route BaseModel.save() through the engine under test
+        self.storage_patcher = patch('src.storage.database', self.db)
+        self.storage_patcher.start()
+
+    def tearDown(self):
+        patch.stopall()
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def _rows(self, object_type, image_path):
+        new_input = Input(description='d', image_path=image_path)
+        new_output = Output(predicted_count=1, pred_confidence=0.9,
+                            object_type_id=object_type.id, input_id=new_input.id)
+        return new_input, new_output
@@ -0,0 +1,169 @@
+# tests/test_api/test_views/test_jobs.py
+import io
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from flask import Flask
+from flask_restful import Api
+
+from src.config import config
+from src.api.utils import progress
+from src.api.views.batch_processing import BatchProcessing
+from src.api.views.jobs import JobStatus, JobEvents
+from src.pipeline.stub import StubPipeline
+from src.storage import Output
+from tests.helpers import EngineTestCase
+
+
+def _events(text):
+    return [line.split(': ', 1)[1] for line in text.splitlines() if line.startswith('event: ')]
+
+
+class TestBatchJobs(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        media = os.path.join(self.tmpdir.name, 'media')
+        os.makedirs(media)
+        patch('src.api.views.batch_processing.database', self.db).start()
+        patch('src.api.utils.image_utils.upload_folder', media).start()
+        patch.object(config, 'MEDIA_DIRECTORY', media).start()
+        patch.object(config, 'JOBS_DIRECTORY', os.path.join(self.tmpdir.name, 'jobs')).start()
+        patch.object(config, 'PROGRESS_POLL_INTERVAL', 0.01).start()
+        # A runner and stream count of this test's own (the test client
+        # only closes responses used as context managers)
+        patch.object(progress, '_runner', None).start()
+        patch.object(progress, '_open_streams', 0).start()
+        self.stub = StubPipeline(latency='fixed:0.05')
+        patch('src.api.views.batch_processing.pipeline', self.stub).start()
+
+        app = Flask(__name__)
+        api = Api(app)
+        api.add_resource(BatchProcessing, '/api/batch/process')
+        api.add_resource(JobStatus, '/api/jobs/<string:job_id>')
+        api.add_resource(JobEvents, '/api/jobs/<string:job_id>/events')
+        self.client = app.test_client()
+
+    def tearDown(self):
+        progress.shutdown_jobs()
+        super().tearDown()
+
+    def _submit(self, images):
+        data = {'images[]': [(io.BytesIO(f'image {i}'.encode()), f'{i}.jpg') for i in range(images)],
+                'object_type': 'dog', 'async': 'true'}
+        return self.client.post('/api/batch/process', data=data, content_type='multipart/form-data')
+
+    def test_async_batch_streams_progress_until_completed(self):
+        resp = self._submit(2)
+        self.assertEqual(resp.status_code, 202)
+        job_id = resp.get_json()['job_id']
+
+        stream = self.client.get(f'/api/jobs/{job_id}/events')
+        self.assertTrue(stream.content_type.startswith('text/event-stream'))
+        events = _events(stream.get_data(as_text=True))
+        self.assertEqual(events[:3], ['queued', 'started', 'uploaded'])
+        self.assertIn('stage', events)
+        self.assertEqual(events.count('counted'), 2)
+        self.assertEqual(events[-3:], ['persisted', 'persisted', 'completed'])
+
+        status = self.client.get(f'/api/jobs/{job_id}').get_json()
+        self.assertEqual((status['status'], status['processed'], status['successful']), ('completed', 2, 2))
+        self.assertEqual({r['result_id'] for r in status['results']},
+                         {o.id for o in self.db.all(Output)})
+        self.assertEqual(self.client.delete(f'/api/jobs/{job_id}').status_code, 409)
+
+    def test_resume_skips_events_already_seen(self):
+        job_id = self._submit(1).get_json()['job_id']
+        first = self.client.get(f'/api/jobs/{job_id}/events').get_data(as_text=True)
+        resumed = self.client.get(f'/api/jobs/{job_id}/events', headers={'Last-Event-ID': '2'})
+        self.assertEqual(_events(resumed.get_data(as_text=True)), _events(first)[2:])
+
+    def test_cancel_stops_before_the_next_image(self):
+        job_id = self._submit(5).get_json()['job_id']
+        time.sleep(0.02)
+        self.assertEqual(self.client.delete(f'/api/jobs/{job_id}').status_code, 202)
+        events = _events(self.client.get(f'/api/jobs/{job_id}/events').get_data(as_text=True))
+        self.assertEqual(events[-1], 'cancelled')
+        status = self.client.get(f'/api/jobs/{job_id}').get_json()
+        # Every image is accounted for; those not started are cancelled
+        self.assertEqual(status['processed'], 5)
+        cancelled = [r for r in status['results'] if r.get('status') == 'cancelled']
+        self.assertTrue(0 < len(cancelled) < 5)
+        self.assertEqual([r['image_name'] for r in status['results']], [f'{i}.jpg' for i in range(5)])
+        self.assertEqual(len(self.db.all(Output)), status['successful'])
+
+    def test_full_job_queue_answers_503(self):
+        with patch.object(config, 'JOB_WORKERS', 1), patch.object(config, 'JOB_QUEUE_SIZE', 1):
+            accepted = [self._submit(3).status_code for _ in range(2)]
+            rejected = self._submit(1)
+        self.assertEqual(accepted, [202, 202])
+        self.assertEqual(rejected.status_code, 503)
+        self.assertEqual(rejected.headers['Retry-After'], '5')
+
+    def test_shutdown_cancels_and_drains_jobs(self):
+        with patch.object(config, 'JOB_WORKERS', 1):
+            running = self._submit(5).get_json()['job_id']
+            queued = self._submit(5).get_json()['job_id']
+        time.sleep(0.02)
+        progress.shutdown_jobs()
+        running, queued = progress.get_job(running).status(), progress.get_job(queued).status()
+        self.assertEqual((running['status'], queued['status']), ('cancelled', 'cancelled'))
+        self.assertEqual((running['processed'], queued['processed']), (5, 5))
+        self.assertLess(running['successful'], 5)
+        self.assertEqual(queued['successful'], 0)
+        self.assertTrue(all(r['status'] == 'cancelled' for r in queued['results']))
+        self.assertEqual(len(self.db.all(Output)), running['successful'])
+
+    def test_batch_deadline_keeps_the_images_already_counted(self):
+        data = {'images[]': [(io.BytesIO(f'image {i}'.encode()), f'{i}.jpg') for i in range(5)],
+                'object_type': 'dog'}
+        with patch.object(config, 'BATCH_PROCESSING_TIMEOUT', 0.12):
+            resp = self.client.post('/api/batch/process', data=data, content_type='multipart/form-data')
+        self.assertEqual(resp.status_code, 200)
+        body = resp.get_json()
+        self.assertEqual(len(body['results']), 5)
+        self.assertGreater(body['successful_images'], 0)
+        self.assertGreater(body['timed_out_images'], 0)
+        self.assertEqual(body['successful_images'] + body['timed_out_images'], 5)
+        self.assertTrue(all(r['timed_out'] for r in body['results'] if not r['success']))
+        self.assertIn('skipped', {r.get('status') for r in body['results']})
+        self.assertEqual(body['cancelled_images'], 0)
+        self.assertEqual(len(self.db.all(Output)), body['successful_images'])
+
+    def test_event_streams_are_capped(self):
+        job = progress.create_job('batch', total=1)
+        with patch.object(config, 'MAX_EVENT_STREAMS', 0):
+            self.assertEqual(self.client.get(f'/api/jobs/{job.id}/events').status_code, 503)
+        with patch.object(config, 'EVENT_STREAM_MAX_SECONDS', 0):
+            with self.client.get(f'/api/jobs/{job.id}/events') as response:
+                self.assertEqual(progress._open_streams, 1)
+                text = response.get_data(as_text=True)
+        self.assertEqual(_events(text), ['queued'])
+        self.assertTrue(text.endswith(': reconnect\n\n'))
+        # The slot is given back when the response closes
+        self.assertEqual(progress._open_streams, 0)
+
+    def test_unknown_jobs(self):
+        self.assertEqual(self.client.get('/api/jobs/nope').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/jobs/{"0" * 32}/events').status_code, 404)
+        self.assertEqual(self.client.delete('/api/jobs/../etc').status_code, 404)
+
+
+class TestJobLog(unittest.TestCase):
+    def test_partial_lines_wait_for_the_rest(self):
+        with tempfile.TemporaryDirectory() as directory:
+            job = progress.Job('a' * 32, directory)
+            job.publish('queued', kind='batch', total=1)
+            with open(job.path, 'a') as log:
+                log.write('{"id": 2, "event": "sta')
+            events, offset = job.read()
+            self.assertEqual([e['event'] for e in events], ['queued'])
+            self.assertEqual(job.read(offset), ([], offset))
+            os.utime(job.path, (0, 0))
+            with patch.object(config, 'JOBS_DIRECTORY', directory):
+                self.assertEqual(progress.prune(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+# tests/test_monitoring.py
+import unittest
+from unittest.mock import patch
+from flask import Flask
+from flask_restful import Api
+
+from src.api.views.monitoring import Readiness, SystemHealth
+
+
+class TestReadinessAndHealthViews(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        api = Api(app)
+        api.add_resource(Readiness, '/api/performance/ready')
+        api.add_resource(SystemHealth, '/api/performance/health')
+        self.client = app.test_client()
+
+        self.pipeline_patcher = patch('src.pipeline.pipeline.pipeline')
+        self.config_patcher = patch('src.api.views.monitoring.config')
+        self.mock_pipeline = self.pipeline_patcher.start()
+        self.mock_config = self.config_patcher.start()
+        self.mock_config.MODEL_WARMUP = True
+        self.mock_config.STATS_CACHE_TTL = 0
+        self.mock_pipeline.get_model_status.return_value = {
+            'models_loaded': True, 'warmup_complete': False,
+            'warmup_in_progress': True, 'warmup_error': None, 'models': {}
+        }
+
+    def tearDown(self):
+        patch.stopall()
+
+    def test_not_ready_until_warm_returns_503(self):
+        self.mock_pipeline.is_ready.return_value = False
+        resp = self.client.get('/api/performance/ready')
+        self.assertEqual(resp.status_code, 503)
+        self.assertTrue(resp.get_json()['warmup_in_progress'])
+
+    def test_ready_after_warm_up_returns_200(self):
+        self.mock_pipeline.is_ready.return_value = True
+        resp = self.client.get('/api/performance/ready')
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.get_json()['ready'])
+
+    def test_ready_when_warm_up_disabled(self):
+        self.mock_config.MODEL_WARMUP = False
+        self.mock_pipeline.is_ready.return_value = False
+        self.assertEqual(self.client.get('/api/performance/ready').status_code, 200)
+
+    @patch('src.api.views.monitoring.database')
+    def test_health_reports_pipeline_status(self, mock_db):
+        mock_db.summary_stats.return_value = {'total_outputs': 3}
+        resp = self.client.get('/api/performance/health')
+        self.assertEqual(resp.status_code, 200)
+        data = resp.get_json()
+        self.assertTrue(data['pipeline_status']['models_loaded'])
+        self.assertIn('AI models have not been warmed up yet', data['recommendations'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+# tests/test_api/test_views/test_profiling.py
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from flask import Flask
+from flask_restful import Api
+
+from src.config import config
+from src.api.utils import profiling
+from src.api.utils.profiling import SamplingProfiler
+from src.api.views.profiling import ProfileList, ProfileDownload, SamplingProfile
+
+TOKEN = {'X-Profile-Token': 'secret'}
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        patch.object(config, 'PROFILING_ENABLED', True).start()
+        patch.object(config, 'PROFILING_TOKEN', 'secret').start()
+        patch.object(config, 'PROFILING_DIRECTORY', self.tmpdir.name).start()
+        patch.object(config, 'PROFILING_MAX_FILES', 2).start()
+
+        app = Flask(__name__)
+        profiling.init_app(app)
+        api = Api(app)
+        api.add_resource(ProfileList, '/api/admin/profiles')
+        api.add_resource(ProfileDownload, '/api/admin/profiles/<string:name>')
+        api.add_resource(SamplingProfile, '/api/admin/profile/sample')
+        app.add_url_rule('/work', 'work', lambda: {'total': sum(range(1000))})
+        self.client = app.test_client()
+
+    def tearDown(self):
+        patch.stopall()
+        self.tmpdir.cleanup()
+
+    def test_request_profile_is_saved_and_downloadable(self):
+        resp = self.client.get('/work', headers={'X-Profile': 'cprofile', **TOKEN})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json(), {'total': 499500})
+        name = resp.headers['X-Profile-File']
+        self.assertTrue(name.endswith('.prof'))
+        self.assertIn(name, self.client.get('/api/admin/profiles', headers=TOKEN).get_json()['profiles'])
+        self.assertEqual(self.client.get(f'/api/admin/profiles/{name}', headers=TOKEN).status_code, 200)
+
+    def test_unprofiled_request_is_untouched(self):
+        resp = self.client.get('/work')
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn('X-Profile-File', resp.headers)
+
+    def test_token_is_required(self):
+        self.assertEqual(self.client.get('/work?profile=cprofile').status_code, 403)
+        self.assertEqual(self.client.get('/api/admin/profiles', headers={'X-Profile-Token': 'no'}).status_code, 403)
+
+    def test_unknown_profiler_is_rejected(self):
+        self.assertEqual(self.client.get('/work', headers={'X-Profile': 'perf', **TOKEN}).status_code, 400)
+
+    def test_old_profiles_are_pruned(self):
+        for _ in range(3):
+            self.client.get('/work', headers={'X-Profile': 'cprofile', **TOKEN})
+        self.assertEqual(len(self.client.get('/api/admin/profiles', headers=TOKEN).get_json()['profiles']), 2)
+
+    def test_sampling_profile_returns_collapsed_stacks(self):
+        resp = self.client.get('/api/admin/profile/sample?seconds=0.05&interval=0.001', headers=TOKEN)
+        self.assertEqual(resp.status_code, 200)
+        self.assertGreater(int(resp.headers['X-Profile-Samples']), 0)
+        self.assertEqual(self.client.get('/api/admin/profile/sample?seconds=9999', headers=TOKEN).status_code, 400)
+
+    def test_hooks_are_not_registered_when_disabled(self):
+        with patch.object(config, 'PROFILING_TOKEN', ''):
+            app = Flask(__name__)
+            profiling.init_app(app)
+        self.assertEqual(app.before_request_funcs, {})
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    def test_other_threads_are_sampled_root_first(self):
+        stop = threading.Event()
+
+        def busy_worker():
+            while not stop.is_set():
+                time.sleep(0.001)
+
+        thread = threading.Thread(target=busy_worker, name='busy worker')
+        thread.start()
+        try:
+            profiler = SamplingProfiler(interval=0.001).run(0.05)
+        finally:
+            stop.set()
+            thread.join()
+        lines = [line for line in profiler.collapsed().splitlines() if line.startswith('busy_worker;')]
+        self.assertTrue(lines)
+        self.assertIn('test_profiling.py:TestSamplingProfiler.test_other_threads_are_sampled_root_first.<locals>.busy_worker',
+                      lines[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+# tests/test_api/test_views/test_recount.py
+import unittest
+from unittest.mock import patch
+from flask import Flask
+from flask_restful import Api
+
+from src.api.views.outputs import OutputRecount
+from src.pipeline.stub import StubPipeline
+from src.storage import Input, Output, ObjectType, Detection
+from tests.helpers import EngineTestCase
+
+
+def _record(segment_id, label, confidence, x, y, size):
+    return {'segment_id': segment_id, 'x': x, 'y': y, 'width': size, 'height': size, 'area': size * size,
+            'raw_label': label, 'confidence': confidence, 'calibrated_confidence': confidence,
+            'mapped_label': None, 'mapping_method': None, 'kept': False}
+
+
+class TestOutputRecount(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        patch('src.api.views.outputs.database', self.db).start()
+        patch('src.api.views.outputs.pipeline', StubPipeline()).start()
+
+        records = [_record(0, 'dog', 0.9, 0, 0, 50), _record(1, 'dog', 0.6, 100, 0, 50),
+                   _record(2, 'dog', 0.95, 5, 5, 50), _record(3, 'cat', 0.8, 200, 200, 40)]
+        with self.db.unit_of_work():
+            dog = ObjectType(name='dog', description='dogs')
+            dog.save()
+            self.input = Input(description='d', image_path='media/a.jpg')
+            self.output = Output(predicted_count=1, pred_confidence=0.95,
+                                 object_type_id=dog.id, input_id=self.input.id)
+            self.db.bulk_save([self.input, self.output] + Detection.from_records(self.output.id, records))
+
+        app = Flask(__name__)
+        Api(app).add_resource(OutputRecount, '/api/results/<string:output_id>/recount')
+        self.client = app.test_client()
+
+    def _recount(self, record_id=None, **body):
+        return self.client.post(f'/api/results/{record_id or self.output.id}/recount', json=body)
+
+    def test_defaults_reproduce_the_stored_count(self):
+        data = self._recount().get_json()
+        self.assertEqual((data['predicted_count'], data['previous_count']), (1, 1))
+        self.assertEqual((data['confidence_threshold'], data['nms_threshold']), (0.7, 0.3))
+        self.assertEqual((data['segments'], data['segments_after_filtering'], data['segments_after_nms']), (4, 3, 2))
+
+    def test_thresholds_and_object_type_change_the_count(self):
+        self.assertEqual(self._recount(confidence_threshold=0.5).get_json()['predicted_count'], 2)
+        self.assertEqual(self._recount(nms_threshold=0.9).get_json()['predicted_count'], 2)
+        self.assertEqual(self._recount(object_type='cat').get_json()['predicted_count'], 1)
+        # The input id finds its output too
+        self.assertEqual(self._recount(self.input.id, confidence_threshold=0.5).get_json()['predicted_count'], 2)
+        self.assertEqual(self.db.count(Output), 1)
+
+    def test_persist_saves_a_new_output_with_detections(self):
+        resp = self._recount(confidence_threshold=0.5, persist=True)
+        self.assertEqual(resp.status_code, 201)
+        new_id = resp.get_json()['result_id']
+        new_output = self.db.get(Output, id=new_id)
+        self.assertEqual((new_output.predicted_count, new_output.input_id), (2, self.input.id))
+        self.assertEqual([d.segment_id for d in self.db.get_detections(new_id, kept=True)], [1, 2, 3])
+
+    def test_errors(self):
+        self.assertEqual(self._recount('missing').status_code, 404)
+        self.assertEqual(self._recount(confidence_threshold=1.5).status_code, 400)
+        self.assertEqual(self._recount(nms_threshold='high').status_code, 400)
+        with self.db.unit_of_work():
+            old = Output(predicted_count=3, pred_confidence=0.8,
+                         object_type_id=self.output.object_type_id, input_id=self.input.id)
+            old.save()
+        self.assertEqual(self._recount(old.id).status_code, 422)
+
+
+if __name__ == '__main__':
+    unittest.main()
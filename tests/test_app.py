@@ -0,0 +1,31 @@
+# tests/test_app.py
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('torch', 'torchvision', 'cv2', 'segment_anything', 'transformers', 'matplotlib', 'seaborn')
+
+
+def _imported_heavy_modules(module):
+    """Heavy modules present after importing `module` in a fresh interpreter"""
+    code = (f'import importlib, json, sys; importlib.import_module({module!r}); '
+            f'print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))')
+    completed = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True,
+                               text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+class TestLazyImports(unittest.TestCase):
+    def test_app_import_does_not_load_ml_libraries(self):
+        self.assertEqual(_imported_heavy_modules('src.app'), [])
+
+    def test_pipeline_import_does_not_load_ml_libraries(self):
+        self.assertEqual(_imported_heavy_modules('src.pipeline.pipeline'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
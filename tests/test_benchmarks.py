@@ -0,0 +1,57 @@
+# tests/test_benchmarks.py
+import unittest
+
+from benchmarks import micro
+from benchmarks.loadtest import check_slos, parse_mix, report
+from benchmarks.common import compare, timeit
+
+
+class TestBenchmarkHelpers(unittest.TestCase):
+    def test_compare_flags_slowdowns_above_threshold(self):
+        baseline = {'micro': {'apply_nms': {'10': {'median_seconds': 1.0}, '100': {'median_seconds': 1.0}}}}
+        current = {'micro': {'apply_nms': {'10': {'median_seconds': 1.1}, '100': {'median_seconds': 2.0}},
+                             'map_labels': {'10': {'median_seconds': 0.5}}}}
+        comparison = compare(current, baseline, threshold=0.25)
+        self.assertEqual(comparison['regressions'], ['micro.apply_nms.100'])
+        self.assertEqual(comparison['changes']['micro.apply_nms.10']['ratio'], 1.1)
+        self.assertEqual(comparison['new'], ['micro.map_labels.10'])
+
+    def test_timeit_stops_at_budget(self):
+        calls = []
+        result = timeit(lambda: calls.append(1), repeat=3, budget=0.0)
+        self.assertEqual(result['runs'], 1)
+        self.assertEqual(len(calls), 1)
+
+    def test_micro_suite_covers_every_function(self):
+        results = micro.run(scales=(10,), repeat=1)
+        self.assertEqual(set(results), {'filter_segments', 'apply_nms', 'map_labels',
+                                        'aggregate_results', 'count_objects_by_class'})
+        self.assertEqual(results['apply_nms']['10']['runs'], 1)
+
+
+class TestLoadTestReport(unittest.TestCase):
+    def test_report_counts_errors_per_endpoint(self):
+        samples = [('count', 200, 0.1), ('count', 500, 0.3), ('health', 0, 1.0), ('health', 200, 0.05)]
+        result = report(samples, elapsed=2.0)
+        self.assertEqual(result['requests'], 4)
+        self.assertEqual(result['error_rate'], 0.5)
+        self.assertEqual(result['throughput_rps'], 2.0)
+        self.assertEqual(result['endpoints']['count']['status_codes'], {'200': 1, '500': 1})
+        self.assertEqual(result['latency']['max_seconds'], 1.0)
+
+    def test_check_slos_only_judges_set_targets(self):
+        result = report([('count', 200, 0.1), ('count', 200, 0.4)], elapsed=1.0)
+        checks = check_slos(result, p95=0.2, error_rate=0.01)
+        self.assertEqual(set(checks), {'p95_seconds', 'error_rate'})
+        self.assertFalse(checks['p95_seconds']['met'])
+        self.assertTrue(checks['error_rate']['met'])
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('count=3,results=1'), {'count': 3.0, 'results': 1.0})
+        self.assertIn('batch', parse_mix('write'))
+        with self.assertRaises(ValueError):
+            parse_mix('unknown=1')
+
+
+if __name__ == '__main__':
+    unittest.main()
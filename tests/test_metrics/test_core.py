@@ -0,0 +1,80 @@
+# tests/test_metrics/test_core.py
+import random
+import unittest
+
+from src.metrics.core import LatencyHistogram, SlidingWindow
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_quantiles_within_bucket_error(self):
+        rng = random.Random(0)
+        values = sorted(rng.uniform(0.05, 5.0) for _ in range(5000))
+        hist = LatencyHistogram()
+        for v in values:
+            hist.record(v)
+        for q in (0.5, 0.9, 0.99):
+            exact = values[int(q * len(values)) - 1]
+            self.assertAlmostEqual(hist.quantile(q), exact, delta=exact * 0.1)
+        self.assertEqual(hist.count, 5000)
+        self.assertEqual(hist.min, values[0])
+        self.assertEqual(hist.max, values[-1])
+
+    def test_memory_is_fixed(self):
+        hist = LatencyHistogram()
+        size = len(hist.counts)
+        for i in range(10000):
+            hist.record(i / 100.0)
+        self.assertEqual(len(hist.counts), size)
+
+    def test_merge_and_round_trip(self):
+        a, b = LatencyHistogram(), LatencyHistogram()
+        for v in (0.1, 0.2):
+            a.record(v)
+        b.record(3.0)
+        a.merge(LatencyHistogram.from_dict(b.to_dict()))
+        self.assertEqual(a.count, 3)
+        self.assertAlmostEqual(a.total, 3.3)
+        self.assertEqual(a.max, 3.0)
+
+    def test_empty_summary(self):
+        summary = LatencyHistogram().summary()
+        self.assertEqual(summary['count'], 0)
+        self.assertEqual(summary['p99'], 0.0)
+        self.assertEqual(summary['min'], 0.0)
+
+
+class TestSlidingWindow(unittest.TestCase):
+    def test_old_slots_expire(self):
+        window = SlidingWindow(60)
+        window.record(1.0, True, now=1000.0)
+        window.record(2.0, False, now=1030.0)
+        summary = window.summary(now=1030.0)
+        self.assertEqual(summary['requests'], 2)
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(window.summary(now=1075.0)['requests'], 1)
+        self.assertEqual(window.summary(now=1200.0)['requests'], 0)
+
+    def test_rate_is_per_minute(self):
+        window = SlidingWindow(300)
+        for i in range(10):
+            window.record(0.1, True, now=1000.0 + i)
+        self.assertAlmostEqual(window.summary(now=1010.0)['requests_per_minute'], 2.0)
+
+    def test_merge_round_trip(self):
+        a, b = SlidingWindow(60), SlidingWindow(60)
+        a.record(1.0, True, now=1000.0)
+        b.record(2.0, False, now=1000.0)
+        b.record(3.0, True, now=1050.0)
+        a.merge(SlidingWindow.from_dict(b.to_dict()))
+        summary = a.summary(now=1050.0)
+        self.assertEqual(summary['requests'], 3)
+        self.assertEqual(summary['errors'], 1)
+        # A newer slice replaces an expired one in the same ring position
+        c = SlidingWindow(60)
+        c.record(5.0, True, now=1120.0)
+        a.merge(c)
+        self.assertEqual(a.summary(now=1120.0)['requests'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
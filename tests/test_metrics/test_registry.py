@@ -0,0 +1,75 @@
+# tests/test_metrics/test_registry.py
+import unittest
+
+from src.metrics.core import LatencyHistogram
+from src.metrics.registry import MetricFamily, Registry, latency_buckets
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter_renders_total_samples(self):
+        counter = self.registry.counter('app_requests', 'Requests', ['endpoint'])
+        counter.inc(endpoint='/a')
+        counter.inc(2, endpoint='/a')
+        text = self.registry.render()
+        self.assertIn('# TYPE app_requests counter', text)
+        self.assertIn('app_requests_total{endpoint="/a"} 3.0', text)
+        self.assertTrue(text.endswith('# EOF\n'))
+
+    def test_counter_rejects_wrong_labels_and_decrements(self):
+        counter = self.registry.counter('app_requests', 'Requests', ['endpoint'])
+        with self.assertRaises(ValueError):
+            counter.inc(status='200')
+        with self.assertRaises(ValueError):
+            counter.inc(-1, endpoint='/a')
+
+    def test_unlabelled_gauge_starts_at_zero(self):
+        gauge = self.registry.gauge('app_in_flight', 'In flight')
+        self.assertIn('app_in_flight 0.0', self.registry.render())
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+        self.assertEqual(gauge.value(), 1.0)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram('app_latency', 'Latency', buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value)
+        text = self.registry.render()
+        self.assertIn('app_latency_bucket{le="0.1"} 1', text)
+        self.assertIn('app_latency_bucket{le="1.0"} 3', text)
+        self.assertIn('app_latency_bucket{le="+Inf"} 4', text)
+        self.assertIn('app_latency_count 4', text)
+        self.assertIn('app_latency_sum 6.05', text)
+
+    def test_same_metric_is_registered_once(self):
+        first = self.registry.counter('app_requests', 'Requests', ['endpoint'])
+        self.assertIs(self.registry.counter('app_requests', 'Requests', ['endpoint']), first)
+        with self.assertRaises(ValueError):
+            self.registry.gauge('app_requests', 'Requests', ['endpoint'])
+
+    def test_collectors_and_label_escaping(self):
+        def collector(registry):
+            family = MetricFamily('app_info', 'gauge', 'Info')
+            family.add({'name': 'a "quoted"\nvalue'}, 1)
+            return [family]
+        self.registry.register_collector(collector)
+        self.assertIn('app_info{name="a \\"quoted\\"\\nvalue"} 1', self.registry.render())
+
+    def test_latency_buckets_subset_is_exact(self):
+        hist = LatencyHistogram()
+        for value in (0.002, 0.03, 0.4, 5.0):
+            hist.record(value)
+        buckets = latency_buckets(hist)
+        self.assertLess(len(buckets), len(hist.bounds) // 4)
+        counts = [count for _, count in buckets]
+        self.assertEqual(counts, sorted(counts))
+        self.assertEqual(counts[-1], 4)
+        for bound, count in buckets:
+            self.assertIn(bound, hist.bounds)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# tests/test_metrics/test_shared.py
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.metrics import shared
+from src.metrics.registry import Registry
+
+
+class SharedStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = shared.configure(self.directory, flush_interval=60)
+
+    def tearDown(self):
+        shared.configure(None)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write_worker(self, pid, generation, sections):
+        """Drop a snapshot as another worker process would"""
+        with open(os.path.join(self.directory, f'worker-{pid}.json'), 'w') as f:
+            json.dump({'pid': pid, 'generation': generation, 'sections': sections}, f)
+
+
+class TestSharedMetricsStore(SharedStoreTestCase):
+    def test_flush_is_throttled_and_atomic(self):
+        shared.register_section('test', lambda generation: {'generation': generation})
+        self.assertTrue(self.store.flush())
+        self.assertFalse(self.store.flush())
+        self.assertTrue(self.store.flush(force=True))
+        files = os.listdir(self.directory)
+        self.assertEqual(files, [f'worker-{os.getpid()}.json'])
+        # Own snapshot is never read back as another worker's
+        self.assertEqual(self.store.read('test'), [])
+
+    def test_read_other_workers(self):
+        self.write_worker(2 ** 22 + 1, 0, {'test': {'value': 1}})
+        with open(os.path.join(self.directory, 'worker-7.json'), 'w') as f:
+            f.write('{"truncated')
+        self.assertEqual(self.store.read('test'), [({'value': 1}, 0, False)])
+
+    def test_reset_bumps_generation(self):
+        self.assertEqual(self.store.generation(), 0)
+        self.assertEqual(self.store.reset(), 1)
+        self.assertEqual(self.store.generation(), 1)
+        shared.clear(self.directory)
+        self.assertEqual(self.store.generation(), 0)
+
+
+class TestRegistryMerge(unittest.TestCase):
+    def test_counters_histograms_and_gauges(self):
+        registry = Registry()
+        counter = registry.counter('app_requests', 'Requests', ['endpoint'])
+        gauge = registry.gauge('app_in_flight', 'In flight')
+        histogram = registry.histogram('app_latency', 'Latency', buckets=(1.0,))
+        counter.inc(endpoint='/a')
+        gauge.inc()
+        histogram.observe(0.5)
+        dumped = json.loads(json.dumps(registry.dump()))
+
+        merged = registry.merged([(registry.dump(), True), (dumped, True), (dumped, False)])
+        self.assertEqual(merged.get('app_requests').value(endpoint='/a'), 3.0)
+        self.assertEqual(merged.get('app_in_flight').value(), 2.0)
+        self.assertIn('app_latency_count 3', merged.render())
+        # The source registry is untouched
+        self.assertEqual(counter.value(endpoint='/a'), 1.0)
+
+
+class TestSharedPerformanceMonitoring(SharedStoreTestCase):
+    def setUp(self):
+        super().setUp()
+        from src.api.views.monitoring import monitoring
+        self.monitoring = monitoring
+        self.monitoring.reset_stats()
+
+    def tearDown(self):
+        super().tearDown()
+        self.monitoring.reset_stats()
+
+    def test_metrics_merge_current_generation_only(self):
+        self.monitoring.record_request('car', 1.0, True, stage_timings={'nms': 0.1})
+        generation = self.store.generation()
+        other = self.monitoring._new_state()
+        other.record('car', 3.0, False, {'nms': 0.3}, other.session_start_time)
+        self.write_worker(2 ** 22 + 1, generation, {'monitoring': {'generation': generation, 'state': other.to_dict()}})
+        self.write_worker(2 ** 22 + 2, generation - 1, {'monitoring': {'generation': generation - 1, 'state': other.to_dict()}})
+
+        metrics = self.monitoring.get_metrics()
+        self.assertEqual(metrics['total_requests'], 2)
+        self.assertEqual(metrics['failed_requests'], 1)
+        self.assertEqual(metrics['stages']['nms']['count'], 2)
+        self.assertEqual(metrics['windows']['1m']['requests'], 2)
+        self.assertEqual(self.monitoring.get_object_type_stats()['car']['total_requests'], 2)
+
+    def test_reset_by_another_worker(self):
+        self.monitoring.record_request('car', 1.0, True)
+        self.store.reset()
+        self.store.flush(force=True)  # next flush of this worker sees the new generation
+        self.assertEqual(self.monitoring.get_metrics()['total_requests'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+# tests/test_pipeline/test_aggregation.py
+import unittest
+
+import numpy as np
+
+from src.pipeline.aggregation import CrossImageAggregator, QuantileSketch, RunningStats, aggregate_history
+from src.pipeline.postprocess import aggregate_counts_across_images, count_objects_by_class
+from src.storage import Input, Output, ObjectType
+from tests.helpers import EngineTestCase
+
+
+def _images(n_images=6, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = ['dog', 'cat', 'car']
+    return {
+        f'img_{i}.jpg': [{'mapped_label': labels[rng.integers(0, 3)], 'confidence': float(rng.uniform(0.3, 1)),
+                          'area': int(rng.integers(100, 5000))} for _ in range(rng.integers(0, 12))]
+        for i in range(n_images)
+    }
+
+
+class TestRunningStatistics(unittest.TestCase):
+    def test_merged_batches_match_numpy(self):
+        values = np.random.default_rng(1).normal(5, 2, 1000)
+        stats = RunningStats()
+        other = RunningStats()
+        for chunk in np.array_split(values[:600], 7):
+            stats.add_summary(len(chunk), chunk.mean(), chunk.std(), chunk.min(), chunk.max())
+        for value in values[600:]:
+            other.add(value)
+        stats.merge(other)
+        self.assertEqual(stats.count, 1000)
+        self.assertAlmostEqual(stats.mean, values.mean(), places=9)
+        self.assertAlmostEqual(stats.variance, values.var(), places=9)
+        self.assertEqual((stats.min, stats.max), (values.min(), values.max()))
+
+    def test_sketch_quantiles_within_relative_accuracy(self):
+        values = np.random.default_rng(2).lognormal(0, 1, 5000)
+        sketch = QuantileSketch(relative_accuracy=0.01)
+        sketch.add_many(values[:2500])
+        rest = QuantileSketch(relative_accuracy=0.01)
+        for value in values[2500:]:
+            rest.add(value)
+        sketch.merge(rest)
+        for q in (0.1, 0.5, 0.99):
+            self.assertLess(abs(sketch.quantile(q) - np.quantile(values, q)) / np.quantile(values, q), 0.01)
+        with self.assertRaises(ValueError):
+            sketch.merge(QuantileSketch(relative_accuracy=0.05))
+
+
+class TestCrossImageAggregator(unittest.TestCase):
+    def test_report_matches_in_memory_statistics(self):
+        images = _images()
+        report = aggregate_counts_across_images(images)
+        exact = count_objects_by_class([d for detections in images.values() for d in detections])
+        self.assertEqual(list(report['overall_counts']), list(exact))
+        for label, expected in exact.items():
+            actual = report['overall_counts'][label]
+            self.assertEqual(actual['count'], expected['count'])
+            self.assertEqual(actual['quality_flags'], expected['quality_flags'])
+            for key in ('mean', 'std', 'min', 'max'):
+                self.assertAlmostEqual(actual['confidence_stats'][key], expected['confidence_stats'][key], places=9)
+                self.assertAlmostEqual(actual['area_stats'][key], expected['area_stats'][key], places=6)
+            self.assertAlmostEqual(actual['confidence_stats']['median'], expected['confidence_stats']['median'],
+                                   delta=0.01 * expected['confidence_stats']['median'])
+        per_image = [len([d for d in dets if d['mapped_label'] == 'dog']) for dets in images.values()]
+        present = [count for count in per_image if count]
+        self.assertEqual(report['cross_image_analysis']['dog']['appears_in_images'], len(present))
+        self.assertAlmostEqual(report['cross_image_analysis']['dog']['count_variance'], np.var(present))
+        self.assertEqual(report['summary']['total_images'], 6)
+
+    def test_merged_shards_equal_one_pass(self):
+        images = list(_images(10, seed=3).items())
+        whole = CrossImageAggregator()
+        first, second = CrossImageAggregator(), CrossImageAggregator()
+        for i, (name, detections) in enumerate(images):
+            whole.add_image(name, detections)
+            (first if i % 2 else second).add_image(name, detections)
+        merged = first.merge(second).report()
+        expected = whole.report()
+        self.assertEqual(merged['summary'], expected['summary'])
+        for label in expected['overall_counts']:
+            self.assertAlmostEqual(merged['overall_counts'][label]['confidence_stats']['std'],
+                                   expected['overall_counts'][label]['confidence_stats']['std'], places=9)
+            self.assertEqual(merged['cross_image_analysis'][label]['appears_in_images'],
+                             expected['cross_image_analysis'][label]['appears_in_images'])
+
+
+class TestAggregateHistory(EngineTestCase):
+    def test_outputs_are_streamed_per_image(self):
+        with self.db.unit_of_work():
+            dog = ObjectType(name='dog', description='dogs')
+            dog.save()
+            rows = []
+            for i, (count, corrected, confidence) in enumerate(((2, None, 0.9), (4, 3, 0.6), (0, None, 0.0))):
+                new_input = Input(description='d', image_path=f'media/{i}.jpg')
+                rows += [new_input, Output(predicted_count=count, corrected_count=corrected, pred_confidence=confidence,
+                                           object_type_id=dog.id, input_id=new_input.id)]
+            self.db.bulk_save(rows)
+
+        report = aggregate_history(self.db, batch_size=1).report()
+        self.assertEqual(report['summary']['total_images'], 3)
+        self.assertEqual(report['overall_counts']['dog']['count'], 6)
+        self.assertAlmostEqual(report['overall_counts']['dog']['confidence_stats']['mean'], (2 * 0.9 + 4 * 0.6) / 6)
+        self.assertEqual(report['cross_image_analysis']['dog']['appears_in_images'], 2)
+        corrected = aggregate_history(self.db, corrected=True).report()
+        self.assertEqual(corrected['overall_counts']['dog']['count'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# tests/test_pipeline/test_artifacts.py
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from functools import partial
+from pathlib import Path
+from unittest.mock import patch
+
+import torch
+from segment_anything.modeling import ImageEncoderViT, MaskDecoder, PromptEncoder, Sam, TwoWayTransformer
+
+from src.config import config
+from src.pipeline import artifacts
+from src.pipeline.artifacts import ArtifactError, ArtifactStore
+
+
+def _tiny_sam():
+    encoder = ImageEncoderViT(
+        depth=1, embed_dim=32, img_size=64, mlp_ratio=2, norm_layer=partial(torch.nn.LayerNorm, eps=1e-6),
+        num_heads=2, patch_size=16, qkv_bias=True, use_rel_pos=True, global_attn_indexes=[0],
+        window_size=2, out_chans=16)
+    prompt_encoder = PromptEncoder(embed_dim=16, image_embedding_size=(4, 4), input_image_size=(64, 64),
+                                   mask_in_chans=4)
+    decoder = MaskDecoder(num_multimask_outputs=3, transformer_dim=16, iou_head_depth=2, iou_head_hidden_dim=16,
+                          transformer=TwoWayTransformer(depth=1, embedding_dim=16, mlp_dim=32, num_heads=2))
+    return Sam(encoder, prompt_encoder, decoder).eval()
+
+
+class TestArtifactStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = ArtifactStore(self.directory)
+        self.model_dir = os.path.join(self.directory, 'hf', 'org--model')
+        os.makedirs(self.model_dir)
+        Path(self.model_dir, 'config.json').write_text('{"num_labels": 3}')
+        Path(self.model_dir, 'model.safetensors').write_bytes(b'weights')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_registered_directory_resolves(self):
+        self.store.register('org/model', 'hf', os.path.join('hf', 'org--model'), 'org/model', 'abc123')
+        manifest = json.loads(Path(self.directory, 'manifest.json').read_text())
+        self.assertEqual(len(manifest['artifacts']['org/model']['files']), 2)
+
+        self.assertEqual(self.store.resolve('org/model'), self.model_dir)
+        self.assertEqual(self.store.describe()['resolved']['org/model']['revision'], 'abc123')
+
+    def test_modified_file_fails_verification(self):
+        self.store.register('org/model', 'hf', os.path.join('hf', 'org--model'), 'org/model')
+        Path(self.model_dir, 'model.safetensors').write_bytes(b'Weights')
+        with self.assertRaises(ArtifactError):
+            self.store.resolve('org/model')
+
+    def test_missing_file_fails_verification(self):
+        self.store.register('org/model', 'hf', os.path.join('hf', 'org--model'), 'org/model')
+        os.remove(os.path.join(self.model_dir, 'config.json'))
+        self.assertEqual(len(self.store.verify('org/model')), 1)
+
+    def test_unchanged_files_are_not_rehashed(self):
+        self.store.register('org/model', 'hf', os.path.join('hf', 'org--model'), 'org/model')
+        with patch('src.pipeline.artifacts.sha256_file') as sha256_file:
+            self.store.resolve('org/model')
+        sha256_file.assert_not_called()
+
+    def test_offline_store_never_fetches(self):
+        store = ArtifactStore(self.directory, offline=True)
+        with patch.object(ArtifactStore, 'fetch') as fetch, self.assertRaises(ArtifactError):
+            store.resolve('org/other')
+        fetch.assert_not_called()
+
+
+class TestSamArtifacts(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        torch.manual_seed(0)
+        self.sam = _tiny_sam()
+        checkpoint = os.path.join(self.directory, 'download.pth')
+        torch.save(self.sam.state_dict(), checkpoint)
+        self.url = Path(checkpoint).as_uri()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_fetch_converts_to_safetensors_and_loads_mapped(self):
+        store = ArtifactStore(os.path.join(self.directory, 'models'))
+        with patch.object(config, 'SAM_MODEL_TYPE', 'vit_b'), \
+                patch.object(config, 'SAM_CHECKPOINT_URL', self.url):
+            store.fetch('sam_vit_b')
+        path = store.resolve('sam_vit_b')
+        self.assertTrue(path.endswith('sam_vit_b.safetensors'))
+
+        loaded = artifacts.load_sam_model('vit_b', path, build=_tiny_sam)
+        for name, tensor in self.sam.state_dict().items():
+            self.assertTrue(torch.equal(tensor, loaded.state_dict()[name]), name)
+        self.assertTrue(torch.equal(loaded.pixel_std, self.sam.pixel_std))
+
+    def test_legacy_checkpoint_is_used_unverified(self):
+        store = ArtifactStore(self.directory, offline=True)
+        legacy = os.path.join(self.directory, 'sam_vit_b.pth')
+        torch.save(self.sam.state_dict(), legacy)
+        with patch('src.pipeline.artifacts.get_store', return_value=store):
+            self.assertEqual(artifacts.sam_checkpoint('vit_b'), legacy)
+        self.assertFalse(store.describe()['resolved']['sam_vit_b']['verified'])
+        self.assertEqual(len(artifacts.load_sam_model('vit_b', legacy, build=_tiny_sam).state_dict()),
+                         len(self.sam.state_dict()))
+
+
+if __name__ == '__main__':
+    unittest.main()
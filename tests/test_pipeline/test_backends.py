@@ -0,0 +1,124 @@
+# tests/test_pipeline/test_backends.py
+import importlib.util
+import shutil
+import tempfile
+import unittest
+from functools import partial
+
+import torch
+from segment_anything.modeling import ImageEncoderViT, MaskDecoder, PromptEncoder, Sam, TwoWayTransformer
+from transformers import ResNetConfig, ResNetForImageClassification
+
+from src.pipeline import backends
+
+HAS_ONNXRUNTIME = all(importlib.util.find_spec(name) for name in ('onnx', 'onnxruntime'))
+
+
+def _tiny_sam():
+    """Random-weight SAM with the real architecture at toy sizes"""
+    torch.manual_seed(0)
+    encoder = ImageEncoderViT(
+        depth=1, embed_dim=32, img_size=64, mlp_ratio=2, norm_layer=partial(torch.nn.LayerNorm, eps=1e-6),
+        num_heads=2, patch_size=16, qkv_bias=True, use_rel_pos=True, global_attn_indexes=[0],
+        window_size=2, out_chans=16)
+    prompt_encoder = PromptEncoder(embed_dim=16, image_embedding_size=(4, 4), input_image_size=(64, 64),
+                                   mask_in_chans=4)
+    decoder = MaskDecoder(num_multimask_outputs=3, transformer_dim=16, iou_head_depth=2, iou_head_hidden_dim=16,
+                          transformer=TwoWayTransformer(depth=1, embedding_dim=16, mlp_dim=32, num_heads=2))
+    return Sam(encoder, prompt_encoder, decoder).eval()
+
+
+class _Processor:
+    def __call__(self, image, return_tensors='pt'):
+        return {'pixel_values': torch.rand(1, 3, 64, 64)}
+
+
+def _tiny_resnet():
+    torch.manual_seed(0)
+    config = ResNetConfig(embedding_size=8, hidden_sizes=[8, 16], depths=[1, 1], num_labels=3)
+    return ResNetForImageClassification(config).eval()
+
+
+class _ParityTests:
+    """Export every component with `backend` and compare against eager"""
+
+    backend = ''
+    tolerance = 1e-4
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _check(self, component, module, example_inputs, other_inputs=None):
+        path = backends.artifact_path(self.directory, component, 'tiny', self.backend)
+        backends.export(module, example_inputs, self.backend, path, component)
+        runner = backends.load_runner(self.backend, path)
+        self.assertLess(backends.parity(module, runner, example_inputs), self.tolerance)
+        if other_inputs is not None:
+            self.assertLess(backends.parity(module, runner, other_inputs), self.tolerance)
+        return runner
+
+    def test_sam_encoder_parity(self):
+        module, inputs = backends.sam_export_modules(_tiny_sam())['sam_encoder']
+        self._check('sam_encoder', module, inputs)
+
+    def test_sam_decoder_parity_with_other_point_counts(self):
+        sam = _tiny_sam()
+        module, inputs = backends.sam_export_modules(sam, points=4)['sam_decoder']
+        _, other = backends.sam_export_modules(sam, points=7)['sam_decoder']
+        self._check('sam_decoder', module, inputs, other)
+
+    def test_classifier_parity(self):
+        module, inputs = backends.classifier_export_module(_tiny_resnet(), _Processor())
+        self._check('classifier', module, inputs, (torch.rand(2, 3, 64, 64),))
+
+
+class TestTorchScriptBackend(_ParityTests, unittest.TestCase):
+    backend = 'torchscript'
+
+    def test_apply_sam_backend_swaps_in_runners(self):
+        sam = _tiny_sam()
+        modules = backends.sam_export_modules(sam)
+        for component, (module, inputs) in modules.items():
+            path = backends.artifact_path(self.directory, component, 'sam_tiny', self.backend)
+            backends.export(module, inputs, self.backend, path, component)
+        embeddings, image_pe, sparse, dense = modules['sam_decoder'][1]
+        with torch.no_grad():
+            expected = sam.mask_decoder(image_embeddings=embeddings, image_pe=image_pe,
+                                        sparse_prompt_embeddings=sparse, dense_prompt_embeddings=dense,
+                                        multimask_output=True)
+
+        backends.apply_sam_backend(sam, self.backend, 'sam_tiny', self.directory)
+        self.assertEqual(backends.backend_name(sam.image_encoder), 'torchscript')
+        self.assertEqual(sam.image_encoder.img_size, 64)
+        with torch.no_grad():
+            actual = sam.mask_decoder(image_embeddings=embeddings, image_pe=image_pe,
+                                      sparse_prompt_embeddings=sparse, dense_prompt_embeddings=dense,
+                                      multimask_output=True)
+        self.assertLess(backends.max_abs_diff(expected, actual), self.tolerance)
+
+    def test_missing_artifact_stays_eager(self):
+        sam = _tiny_sam()
+        backends.apply_sam_backend(sam, self.backend, 'sam_tiny', self.directory)
+        self.assertEqual(backends.backend_name(sam.image_encoder), 'eager')
+
+    def test_classifier_adapter_keeps_hf_interface(self):
+        model = _tiny_resnet()
+        module, inputs = backends.classifier_export_module(model, _Processor())
+        path = backends.artifact_path(self.directory, 'classifier', 'tiny', self.backend)
+        backends.export(module, inputs, self.backend, path, 'classifier')
+        classifier = backends.RunnerClassifier(backends.load_runner(self.backend, path), model.config)
+        self.assertEqual(classifier(pixel_values=inputs[0]).logits.shape, (1, 3))
+        self.assertIs(classifier.config, model.config)
+
+
+@unittest.skipUnless(HAS_ONNXRUNTIME, 'onnx and onnxruntime are not installed')
+class TestOnnxRuntimeBackend(_ParityTests, unittest.TestCase):
+    backend = 'onnxruntime'
+    tolerance = 1e-3
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# tests/test_pipeline/test_cancellation.py
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from flask import Flask
+
+from src.config import config
+from src.api.utils.error_handlers import handle_ai_processing_error
+from src.pipeline.cancellation import (CancellationToken, PipelineCancelled, checkpoint, checkpoint_hook,
+                                       current_token, use_token)
+from src.pipeline.stub import StubPipeline
+
+
+class TestCancellationToken(unittest.TestCase):
+    def test_deadline(self):
+        token = CancellationToken(timeout=0.02)
+        self.assertIsNone(token.reason())
+        self.assertLessEqual(token.remaining(), 0.02)
+        time.sleep(0.03)
+        self.assertEqual((token.reason(), token.remaining()), ('timeout', 0.0))
+        with self.assertRaises(PipelineCancelled) as raised:
+            token.check('classification')
+        self.assertEqual((raised.exception.reason, raised.exception.stage), ('timeout', 'classification'))
+
+    def test_no_deadline(self):
+        token = CancellationToken()
+        self.assertIsNone(token.remaining())
+        token.check()
+        token.cancel()
+        self.assertEqual(token.reason(), 'cancelled')
+
+    def test_child_ends_with_its_parent(self):
+        parent = CancellationToken(timeout=10)
+        child = parent.child(timeout=60)
+        self.assertEqual(child.deadline, parent.deadline)
+        self.assertLess(parent.child(timeout=1).deadline, parent.deadline)
+        parent.cancel()
+        self.assertEqual(child.reason(), 'cancelled')
+
+    def test_external_cancel_check(self):
+        flag = []
+        token = CancellationToken(is_cancelled=lambda: bool(flag))
+        self.assertIsNone(token.reason())
+        flag.append(True)
+        self.assertEqual(token.child().reason(), 'cancelled')
+
+    def test_checkpoint_uses_the_active_token(self):
+        checkpoint('segmentation')  # no token: never stops
+        token = CancellationToken()
+        with use_token(token):
+            self.assertIs(current_token(), token)
+            checkpoint('segmentation')
+            token.cancel()
+            with self.assertRaises(PipelineCancelled):
+                checkpoint_hook('mask_generation')(None, ())
+        self.assertIsNone(current_token())
+
+
+class TestStubDeadlines(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.image = os.path.join(self.tmpdir.name, 'a.jpg')
+        with open(self.image, 'wb') as f:
+            f.write(b'not really a jpeg')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_run_stops_at_the_next_stage_after_the_deadline(self):
+        start = time.perf_counter()
+        with self.assertRaises(PipelineCancelled) as raised:
+            StubPipeline(latency='fixed:1.0').process_image(self.image, 'dog',
+                                                            cancel_token=CancellationToken(timeout=0.1))
+        # Stopped after mask generation (0.55s in), not after the whole second
+        self.assertLess(time.perf_counter() - start, 0.9)
+        self.assertEqual((raised.exception.reason, raised.exception.stage), ('timeout', 'segment_extraction'))
+
+    def test_default_deadline_is_processing_timeout(self):
+        with patch.object(config, 'PROCESSING_TIMEOUT', 0.05):
+            with self.assertRaises(PipelineCancelled):
+                StubPipeline(latency='fixed:0.2').process_image_auto(self.image)
+        self.assertTrue(StubPipeline().process_image(self.image, 'dog')['success'])
+
+    def test_queue_wait_counts_against_the_deadline(self):
+        with patch.object(config, 'MAX_CONCURRENT_REQUESTS', 1):
+            stub = StubPipeline()
+        stub._slots.acquire()
+        try:
+            with self.assertRaises(PipelineCancelled) as raised:
+                stub.process_image(self.image, 'dog', cancel_token=CancellationToken(timeout=0.05))
+            self.assertEqual(raised.exception.stage, 'queue_wait')
+        finally:
+            stub._slots.release()
+
+    def test_timeouts_answer_504(self):
+        with Flask(__name__).app_context():
+            response = handle_ai_processing_error(PipelineCancelled('timeout', 'classification'))
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(response.get_json()['error']['code'], 'PROCESSING_TIMEOUT')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+# tests/test_pipeline/test_execution.py
+import threading
+import unittest
+
+from src.pipeline.execution import ExecutionPolicy
+from src.pipeline.tracing import Trace, activate
+
+
+class TestExecutionPolicy(unittest.TestCase):
+    def test_cores_are_split_across_workers_and_slots(self):
+        policy = ExecutionPolicy(cores=16, workers=2, max_concurrent=4)
+        self.assertEqual(policy.cores, 8)
+        self.assertEqual(policy.slots, 4)
+        self.assertEqual(policy.threads_per_slot, 2)
+
+    def test_cpu_slots_are_capped_at_the_core_count(self):
+        policy = ExecutionPolicy(cores=2, max_concurrent=5)
+        self.assertEqual(policy.slots, 2)
+        self.assertEqual(policy.threads_per_slot, 1)
+
+    def test_gpu_slots_are_not_capped(self):
+        policy = ExecutionPolicy(cores=2, max_concurrent=5, device='cuda')
+        self.assertEqual(policy.slots, 5)
+        self.assertEqual(policy.threads_per_slot, 1)
+
+    def test_threads_override(self):
+        policy = ExecutionPolicy(cores=16, max_concurrent=4, threads_override=3)
+        self.assertEqual(policy.threads_per_slot, 3)
+
+    def test_slot_limits_concurrency_and_times_out(self):
+        policy = ExecutionPolicy(cores=1, max_concurrent=1)
+        with policy.slot():
+            self.assertEqual(policy.describe()['slots_busy'], 1)
+            errors = []
+
+            def contend():
+                try:
+                    with policy.slot(timeout=0.05):
+                        pass
+                except TimeoutError as e:
+                    errors.append(e)
+
+            thread = threading.Thread(target=contend)
+            thread.start()
+            thread.join()
+            self.assertEqual(len(errors), 1)
+        status = policy.describe()
+        self.assertEqual((status['slots_busy'], status['queue_depth']), (0, 0))
+
+    def test_queue_wait_is_traced(self):
+        policy = ExecutionPolicy(cores=1, max_concurrent=1)
+        trace = Trace()
+        with activate(trace), policy.slot():
+            pass
+        self.assertIn('queue_wait', trace.timings())
+
+
+if __name__ == '__main__':
+    unittest.main()
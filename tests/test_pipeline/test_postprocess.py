@@ -0,0 +1,84 @@
+# tests/test_pipeline/test_postprocess.py
+import unittest
+
+import numpy as np
+
+from src.pipeline.postprocess import (GroupedStats, apply_confidence_thresholds, calculate_class_statistics,
+                                      count_objects_by_class, create_summary_report, generate_quality_flags,
+                                      group_by_class)
+
+
+def _detections():
+    return [
+        {'mapped_label': 'dog', 'confidence': 0.9, 'area': 100},
+        {'mapped_label': 'cat', 'confidence': 0.4, 'area': 400},
+        {'mapped_label': 'dog', 'confidence': 0.6, 'area': 300},
+        {'raw_label': 'car', 'confidence': 0.75},
+        {'mapped_label': 'dog', 'confidence': 0.85, 'area': 200},
+    ]
+
+
+class TestGroupedStats(unittest.TestCase):
+    def test_matches_per_class_numpy(self):
+        rng = np.random.default_rng(0)
+        labels = [f'class_{i}' for i in rng.integers(0, 7, 500)]
+        confidences = rng.uniform(0, 1, 500)
+        areas = rng.integers(1, 10000, 500)
+        grouped = GroupedStats(labels, confidences, areas)
+        for field, values in (('confidence', confidences), ('area', areas)):
+            stats = grouped.stats(field)
+            for i, label in enumerate(grouped.labels):
+                selected = values[np.array(labels) == label]
+                self.assertEqual(stats['count'][i], len(selected))
+                for key, fn in (('mean', np.mean), ('std', np.std), ('min', np.min),
+                                ('max', np.max), ('median', np.median), ('sum', np.sum)):
+                    self.assertAlmostEqual(stats[key][i], fn(selected), places=9, msg=f'{field} {key}')
+
+    def test_labels_keep_first_seen_order(self):
+        grouped = GroupedStats.from_detections(_detections())
+        self.assertEqual(grouped.labels, ['dog', 'cat', 'car'])
+        self.assertEqual(grouped.counts.tolist(), [3, 1, 1])
+        self.assertEqual(grouped.values_by_class('confidence')['dog'], [0.9, 0.6, 0.85])
+        # Missing areas count as 0, as before
+        self.assertEqual(grouped.stats('area')['sum'].tolist(), [600.0, 400.0, 0.0])
+
+
+class TestStatisticsConsumers(unittest.TestCase):
+    def test_count_objects_by_class(self):
+        counts = count_objects_by_class(_detections())
+        dog = counts['dog']
+        self.assertEqual(dog['count'], 3)
+        self.assertAlmostEqual(dog['confidence_stats']['median'], 0.85)
+        self.assertAlmostEqual(dog['area_stats']['total'], 600)
+        self.assertEqual(dog['quality_flags'], {'high_confidence': 2, 'medium_confidence': 1,
+                                                'low_confidence': 0, 'reliable': True})
+        self.assertFalse(counts['cat']['quality_flags']['reliable'])
+
+    def test_class_statistics_from_groups(self):
+        stats = calculate_class_statistics(group_by_class(_detections()))
+        self.assertEqual(list(stats), ['dog', 'cat', 'car'])
+        self.assertAlmostEqual(stats['dog']['avg_confidence'], (0.9 + 0.6 + 0.85) / 3)
+        self.assertEqual(stats['dog']['min_confidence'], 0.6)
+
+    def test_summary_report(self):
+        report = create_summary_report(_detections(), original_segments_count=10)
+        self.assertEqual(report['class_distribution'], {'dog': 3, 'cat': 1, 'car': 1})
+        self.assertEqual(report['confidence_distribution'], {'high (>0.8)': 2, 'medium (0.5-0.8)': 2, 'low (<0.5)': 1})
+        self.assertEqual(report['processing_efficiency'], 50.0)
+
+    def test_confidence_thresholds_per_class(self):
+        result = apply_confidence_thresholds(_detections(), thresholds={'dog': 0.8}, default_threshold=0.5)
+        self.assertEqual(result['total_passed'], 3)
+        self.assertEqual([d['confidence'] for d in result['failed_detections']], [0.4, 0.6])
+        self.assertEqual(result['threshold_analysis']['dog']['passed'], 2)
+        self.assertEqual(result['threshold_analysis']['dog']['confidences'], [0.9, 0.6, 0.85])
+
+    def test_quality_flags(self):
+        flags = generate_quality_flags(_detections())
+        self.assertEqual(flags['statistics']['confidence_distribution'], {'high': 2, 'medium': 2, 'low': 1})
+        self.assertEqual(flags['statistics']['area_stats']['count'], 4)
+        self.assertIn('MANY_SMALL_OBJECTS', flags['flags'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# tests/test_pipeline/test_quantization.py
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import torch
+from PIL import Image
+from transformers import ResNetConfig, ResNetForImageClassification, ViTConfig, ViTForImageClassification
+
+from src.config import config
+from src.pipeline import quantization
+from src.pipeline.pipeline import LightweightPipeline
+from src.pipeline.segmenters import build_segmenters
+
+
+class _Processor:
+    """Stand-in for AutoImageProcessor: resize and scale to [0, 1]"""
+
+    def __call__(self, image, return_tensors='pt'):
+        array = np.asarray(image.convert('RGB').resize((64, 64)), dtype=np.float32) / 255.0
+        return {'pixel_values': torch.from_numpy(array).permute(2, 0, 1)[None]}
+
+
+def _tiny_resnet():
+    torch.manual_seed(0)
+    config = ResNetConfig(embedding_size=8, hidden_sizes=[8, 16], depths=[1, 1], num_labels=3)
+    return ResNetForImageClassification(config).eval()
+
+
+class TestQuantization(unittest.TestCase):
+    def setUp(self):
+        self.images_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        for i in range(3):
+            pixels = rng.integers(0, 255, (48, 64, 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(os.path.join(self.images_dir, f'image_{i}.png'))
+
+    def tearDown(self):
+        shutil.rmtree(self.images_dir)
+
+    def test_static_quantization_keeps_the_classifier_interface(self):
+        model = _tiny_resnet()
+        quantized = quantization.quantize_classifier(model, _Processor(), 'static', self.images_dir)
+        self.assertEqual(quantization.quantization_mode(quantized), 'static')
+        inputs = _Processor()(Image.new('RGB', (64, 64)))
+        self.assertEqual(quantized(**inputs).logits.shape, (1, 3))
+        self.assertIs(quantized.config, model.config)
+        self.assertEqual(quantization.quantization_mode(model), 'none')
+
+    def test_static_falls_back_to_dynamic_for_other_architectures(self):
+        model = ViTForImageClassification(ViTConfig(
+            image_size=64, patch_size=16, hidden_size=32, num_hidden_layers=1,
+            num_attention_heads=2, intermediate_size=64, num_labels=3)).eval()
+        quantized = quantization.quantize_classifier(model, _Processor(), 'static', self.images_dir)
+        self.assertEqual(quantization.quantization_mode(quantized), 'dynamic')
+
+    def test_unknown_mode_is_rejected(self):
+        with self.assertRaises(ValueError):
+            quantization.quantize_classifier(_tiny_resnet(), _Processor(), 'int4')
+
+    def test_compare_reports_agreement_and_counts(self):
+        pipeline = LightweightPipeline.__new__(LightweightPipeline)
+        pipeline.mask_generator = None
+        pipeline.segmenters = build_segmenters(lambda: None, lambda: False)
+        pipeline.last_latency = {}
+        pipeline.classifier = _tiny_resnet()
+        pipeline.processor = _Processor()
+        with patch('src.pipeline.pipeline.get_pipeline', return_value=pipeline), \
+                patch.object(config, 'QUANTIZATION_CALIBRATION_DIR', self.images_dir):
+            report = quantization.compare(self.images_dir, 'static', confidence_threshold=0.0)
+
+        self.assertEqual(report['mode'], 'static')
+        self.assertEqual((report['images'], report['segments']), (3, 3))
+        self.assertTrue(0.0 <= report['top1_agreement'] <= 1.0)
+        self.assertEqual(len(report['per_image']), 3)
+        self.assertEqual(quantization.quantization_mode(pipeline.classifier), 'none')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+# tests/test_pipeline/test_segmenters.py
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import cv2
+import numpy as np
+
+from src.pipeline.pipeline import LightweightPipeline, run_pipeline
+from src.pipeline.segmenters import ContourSegmenter, MobileSamSegmenter, SamSegmenter, build_segmenters
+
+
+def _scene(background, foreground, centers=((40, 40), (120, 60), (70, 130))):
+    image = np.full((180, 180, 3), background, dtype=np.uint8)
+    for center in centers:
+        cv2.circle(image, center, 18, (foreground,) * 3, thickness=-1)
+    return image
+
+
+class _StatefulGenerator:
+    """Stands in for SamAutomaticMaskGenerator: the image lives on the predictor
+    between set_image and reset_image, and overlapping calls corrupt it"""
+
+    def __init__(self):
+        self.image = None
+
+    def generate(self, image_rgb):
+        if self.image is not None:
+            raise RuntimeError('predictor already holds an image')
+        self.image = image_rgb
+        time.sleep(0.05)
+        height, width = self.image.shape[:2]
+        self.image = None
+        return [{'segmentation': np.ones((height, width), bool), 'bbox': [0, 0, width, height],
+                 'area': width * height}]
+
+
+def _generate_concurrently(segmenter, widths):
+    results, errors = {}, []
+
+    def run(width):
+        try:
+            results[width] = segmenter.generate(np.zeros((32, width, 3), np.uint8))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(width,)) for width in widths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+class TestContourSegmenter(unittest.TestCase):
+    def test_bright_objects_on_dark_background(self):
+        records = ContourSegmenter(min_area=200).generate(_scene(20, 230))
+        self.assertEqual(len(records), 3)
+        for record in records:
+            self.assertEqual(record['segmentation'].shape, (180, 180))
+            self.assertEqual(len(record['bbox']), 4)
+
+    def test_dark_objects_on_bright_background(self):
+        records = ContourSegmenter(min_area=200).generate(_scene(230, 20))
+        self.assertEqual(len(records), 3)
+
+    def test_blank_image_has_no_regions(self):
+        self.assertEqual(ContourSegmenter().generate(np.full((64, 64, 3), 128, np.uint8)), [])
+
+    def test_small_regions_are_dropped(self):
+        records = ContourSegmenter(min_area=5000).generate(_scene(20, 230))
+        self.assertEqual(records, [])
+
+
+class TestSegmenterSelection(unittest.TestCase):
+    def setUp(self):
+        self.generator = MagicMock()
+        self.generator.generate.return_value = []
+        self.pipeline = LightweightPipeline.__new__(LightweightPipeline)
+        self.pipeline.segmenters = build_segmenters(lambda: self.generator, lambda: True)
+
+    def test_sam_segmenter_uses_loaded_generator(self):
+        segmenter = self.pipeline.get_segmenter('sam')
+        self.assertIsInstance(segmenter, SamSegmenter)
+        segmenter.generate(np.zeros((8, 8, 3), np.uint8))
+        self.generator.generate.assert_called_once()
+
+    def test_unknown_segmenter_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.pipeline.get_segmenter('yolo')
+
+    def test_concurrent_calls_do_not_share_the_predictor(self):
+        segmenters = [SamSegmenter(lambda generator=_StatefulGenerator(): generator, lambda: True),
+                      MobileSamSegmenter([])]
+        segmenters[1]._generator, segmenters[1]._attempted = _StatefulGenerator(), True
+        for segmenter in segmenters:
+            results, errors = _generate_concurrently(segmenter, (40, 64, 96))
+            self.assertEqual(errors, [])
+            self.assertEqual({width: records[0]['bbox'][2] for width, records in results.items()},
+                             {40: 40, 64: 64, 96: 96})
+
+    def test_mobile_sam_without_checkpoint_is_unavailable(self):
+        segmenter = MobileSamSegmenter(['/nonexistent/mobile_sam.pt'])
+        self.assertFalse(segmenter.available())
+        self.assertFalse(segmenter.loaded())
+        self.assertIsNotNone(segmenter.error)
+
+
+class TestSharedPipeline(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.pipeline = LightweightPipeline.__new__(LightweightPipeline)
+        self.pipeline.last_latency = {}
+        self.pipeline.segmenters = build_segmenters(lambda generator=_StatefulGenerator(): generator,
+                                                    lambda: True)
+        self.pipeline.classify_segments = lambda segments, bboxes, image: [
+            {'segment_id': i, 'raw_label': 'box', 'confidence': 0.9, 'calibrated_confidence': 0.9}
+            for i in range(len(segments))]
+        patch('src.pipeline.pipeline.get_pipeline', return_value=self.pipeline).start()
+
+    def tearDown(self):
+        patch.stopall()
+        self.tmpdir.cleanup()
+
+    def _image(self, width):
+        path = os.path.join(self.tmpdir.name, f'{width}.png')
+        cv2.imwrite(path, np.zeros((32, width, 3), np.uint8))
+        return path
+
+    def test_concurrent_runs_get_their_own_segments(self):
+        results = {}
+        paths = {width: self._image(width) for width in (40, 64, 96)}
+        threads = [threading.Thread(target=lambda w=width: results.__setitem__(
+            w, run_pipeline(paths[w], enable_mapping=False, segmenter='sam'))) for width in paths]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for width, result in results.items():
+            self.assertNotIn('error', result)
+            self.assertEqual([s['bbox'][2] for s in result['segments']], [width])
+
+    def test_failed_segmentation_is_not_a_count_of_zero(self):
+        self.pipeline.segmenters['sam'] = MagicMock(available=MagicMock(return_value=False))
+        result = run_pipeline(self._image(40), enable_mapping=False, segmenter='sam')
+        self.assertIn('models not loaded', result['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
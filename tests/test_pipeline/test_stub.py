@@ -0,0 +1,98 @@
+# tests/test_pipeline/test_stub.py
+import os
+import random
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+
+from src.config import Config, ProductionConfig
+from src.pipeline.pipeline import LightweightPipeline, _PipelineCompatibilityAdapter, create_adapter
+from src.pipeline.segmenters import build_segmenters
+from src.pipeline.stub import STAGE_SHARES, StubPipeline, parse_latency
+
+
+class TestStubPipeline(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.image = os.path.join(self.tmpdir.name, 'a.jpg')
+        with open(self.image, 'wb') as f:
+            f.write(b'not really a jpeg')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_results_are_deterministic_per_image(self):
+        first = StubPipeline(max_objects=20).process_image(self.image, 'dog')
+        second = StubPipeline(max_objects=20).process_image(self.image, 'dog')
+        self.assertEqual(first['predicted_count'], second['predicted_count'])
+        self.assertEqual(first['confidence'], second['confidence'])
+        self.assertTrue(first['success'])
+        self.assertEqual(set(first['stage_timings']), set(STAGE_SHARES) | {'model_init', 'queue_wait'})
+
+    def test_auto_result_has_adapter_shape(self):
+        result = StubPipeline(max_objects=20).process_image_auto(self.image)
+        self.assertEqual(set(result), {'success', 'predicted_count', 'confidence', 'processing_time',
+                                       'object_type', 'stage_timings', 'segmenter', 'detections'})
+        self.assertTrue(all(record['kept'] for record in result['detections']))
+
+    def test_latency_is_spread_over_stages(self):
+        result = StubPipeline(latency='fixed:0.05').process_image(self.image, 'dog')
+        self.assertGreaterEqual(result['processing_time'], 0.05)
+        self.assertGreater(result['stage_timings']['mask_generation'], result['stage_timings']['filter'])
+
+    def test_stages_match_the_real_pipeline(self):
+        pipeline = LightweightPipeline.__new__(LightweightPipeline)
+        pipeline.last_latency = {}
+        pipeline.segmenters = build_segmenters(lambda: None, lambda: False)
+        pipeline.classify_segments = lambda segments, bboxes, image: [
+            {'segment_id': i, 'raw_label': 'dog', 'confidence': 0.9, 'calibrated_confidence': 0.9}
+            for i in range(len(segments))]
+        image = os.path.join(self.tmpdir.name, 'scene.png')
+        scene = np.full((180, 180, 3), 20, np.uint8)
+        cv2.circle(scene, (90, 90), 30, (230, 230, 230), thickness=-1)
+        cv2.imwrite(image, scene)
+        with patch('src.pipeline.pipeline.get_pipeline', return_value=pipeline):
+            real = _PipelineCompatibilityAdapter().process_image(image, 'dog', 'contour')
+        stub = StubPipeline().process_image(image, 'dog', 'contour')
+        self.assertTrue(real['success'])
+        self.assertEqual(set(stub['stage_timings']), set(real['stage_timings']))
+
+    def test_stub_is_always_ready(self):
+        stub = StubPipeline()
+        self.assertTrue(stub.is_ready())
+        self.assertEqual(stub.get_model_status()['backend'], 'stub')
+
+
+class TestLatencySpecs(unittest.TestCase):
+    def test_distributions(self):
+        rng = random.Random(0)
+        self.assertEqual(parse_latency('none')(rng), 0.0)
+        self.assertEqual(parse_latency('fixed:0.2')(rng), 0.2)
+        self.assertTrue(0.1 <= parse_latency('uniform:0.1,0.5')(rng) <= 0.5)
+        self.assertGreaterEqual(parse_latency('normal:0.0,1.0')(rng), 0.0)
+        self.assertGreater(parse_latency('lognormal:0.3,0.5')(rng), 0.0)
+
+    def test_invalid_specs_are_rejected(self):
+        for spec in ('gamma:1', 'fixed', 'uniform:0.1', 'fixed:-1', 'fixed:abc'):
+            with self.assertRaises(ValueError):
+                parse_latency(spec)
+
+
+class TestBackendSelection(unittest.TestCase):
+    def test_backend_is_chosen_by_name(self):
+        self.assertIsInstance(create_adapter('stub'), StubPipeline)
+        self.assertNotIsInstance(create_adapter('models'), StubPipeline)
+        with self.assertRaises(ValueError):
+            create_adapter('fake')
+
+    def test_production_config_refuses_stub(self):
+        with patch.object(Config, 'SECRET_KEY', 'secret'), patch.object(Config, 'DATABASE_TYPE', 'mysql'), \
+                patch.object(Config, 'PIPELINE_BACKEND', 'stub'), self.assertRaises(ValueError):
+            ProductionConfig()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+# tests/test_pipeline/test_tracing.py
+import unittest
+from unittest.mock import patch
+
+from src.pipeline.tracing import Trace, activate, current_trace, on_stage, span
+
+
+class TestTrace(unittest.TestCase):
+    def test_nested_spans_are_exclusive(self):
+        clock = iter([0.0, 1.0, 3.0, 4.0])
+        trace = Trace()
+        with patch('src.pipeline.tracing.time.perf_counter', side_effect=lambda: next(clock)):
+            with trace.span('mask_generation'):
+                with trace.span('sam_encoder'):
+                    pass
+        self.assertEqual(trace.timings(), {'sam_encoder': 2.0, 'mask_generation': 2.0})
+
+    def test_unclosed_inner_span_is_discarded(self):
+        trace = Trace()
+        with trace.span('mask_generation'):
+            trace.start('sam_encoder')  # forward raised, post-hook never ran
+        self.assertEqual(list(trace.timings()), ['mask_generation'])
+        self.assertEqual(trace._stack, [])
+
+    def test_repeated_stage_accumulates(self):
+        trace = Trace()
+        for _ in range(3):
+            with trace.span('classification'):
+                pass
+        self.assertEqual(trace.stages['classification']['calls'], 3)
+
+    def test_span_without_active_trace_is_noop(self):
+        self.assertIsNone(current_trace())
+        with span('nms') as active:
+            self.assertIsNone(active)
+
+    def test_activate_routes_module_spans(self):
+        trace = Trace()
+        with activate(trace):
+            with span('nms'):
+                pass
+        self.assertIsNone(current_trace())
+        self.assertIn('nms', trace.timings())
+
+    def test_stage_listener_sees_exclusive_times_across_traces(self):
+        clock = iter([0.0, 1.0, 3.0, 4.0, 10.0, 10.5, 20.0, 21.0])
+        seen = []
+        with patch('src.pipeline.tracing.time.perf_counter', side_effect=lambda: next(clock)):
+            with on_stage(lambda stage, seconds: seen.append((stage, seconds))):
+                with activate(Trace()), span('segmentation'):
+                    with span('sam_encoder'):
+                        pass
+                with activate(Trace()), span('nms'):
+                    pass
+            with activate(Trace()), span('aggregation'):
+                pass
+        self.assertEqual(seen, [('sam_encoder', 2.0), ('segmentation', 2.0), ('nms', 0.5)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,21 @@
+# tests/test_start_production.py
+import contextlib
+import io
+import unittest
+from unittest.mock import patch
+
+import start_production
+
+
+class TestStartApplication(unittest.TestCase):
+    def test_banner_and_handoff_to_gunicorn(self):
+        output = io.StringIO()
+        with patch('src.serving.run') as run, contextlib.redirect_stdout(output):
+            start_production.start_application()
+        run.assert_called_once_with()
+        self.assertIn('inference slots', output.getvalue())
+        self.assertNotIn('Failed to start', output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
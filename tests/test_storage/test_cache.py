@@ -0,0 +1,90 @@
+# tests/test_storage/test_cache.py
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+
+from src.storage.engine.cache import ObjectTypeCache
+from src.storage import ObjectType
+from tests.helpers import EngineTestCase
+
+
+class TestObjectTypeCache(unittest.TestCase):
+    def _row(self, id, name):
+        return {'id': id, 'name': name}
+
+    def test_loads_once_and_serves_from_memory(self):
+        loader = MagicMock(return_value=[self._row('1', 'car'), self._row('2', 'dog')])
+        cache = ObjectTypeCache(loader)
+        self.assertEqual(cache.get(name='car')['id'], '1')
+        self.assertEqual(cache.get(id='2')['name'], 'dog')
+        self.assertIsNone(cache.get(name='tree'))
+        loader.assert_called_once()
+        self.assertEqual(cache.stats(), {'hits': 2, 'misses': 1, 'size': 2})
+
+    def test_invalidate_forces_reload(self):
+        loader = MagicMock(return_value=[self._row('1', 'car')])
+        cache = ObjectTypeCache(loader)
+        cache.get(name='car')
+        cache.invalidate()
+        cache.get(name='car')
+        self.assertEqual(loader.call_count, 2)
+
+    def test_expired_snapshot_is_reloaded(self):
+        loader = MagicMock(return_value=[])
+        cache = ObjectTypeCache(loader, ttl=0)
+        with patch('src.storage.engine.cache.time.monotonic', side_effect=[100.0, 101.0, 102.0, 103.0]):
+            cache.get(name='car')
+            cache.get(name='car')
+        self.assertEqual(loader.call_count, 2)
+
+
+class TestEngineObjectTypeCache(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.car = ObjectType(name='car', description='cars')
+        self.car.save()
+
+    def test_repeated_lookups_hit_the_cache(self):
+        self.assertEqual(self.db.get_object_type(name='car').id, self.car.id)
+        with patch.object(self.db, 'get') as get:
+            self.assertEqual(self.db.get_object_type(id=self.car.id).name, 'car')
+            self.assertEqual(self.db.get_object_type(name='car').id, self.car.id)
+            get.assert_not_called()
+
+    def test_update_invalidates(self):
+        self.db.get_object_type(name='car')
+        self.db.update(ObjectType, self.car.id, name='automobile')
+        self.assertIsNone(self.db.get_object_type(name='car'))
+        self.assertEqual(self.db.get_object_type(name='automobile').id, self.car.id)
+
+    def test_cached_rows_belong_to_the_callers_session(self):
+        seen = {}
+
+        def worker():
+            # Fills the cache from this thread's session, then closes it
+            seen['car'] = self.db.get_object_type(name='car')
+            self.db.close()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        self.db.close()
+        with patch.object(self.db, 'get') as get:
+            car = self.db.get_object_type(name='car')
+            get.assert_not_called()
+        self.assertIsNot(car, seen['car'])
+        self.assertIn(car, self.db._Engine__session())
+        self.assertEqual((car.name, car.description), ('car', 'cars'))
+        self.assertEqual(len(car.outputs), 0)
+
+    def test_create_and_delete_invalidate(self):
+        self.assertIsNone(self.db.get_object_type(name='dog'))
+        dog = ObjectType(name='dog', description='dogs')
+        dog.save()
+        self.assertEqual(self.db.get_object_type(name='dog').id, dog.id)
+        self.db.delete(self.db.get(ObjectType, id=dog.id))
+        self.assertIsNone(self.db.get_object_type(name='dog'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+# tests/test_storage/test_detections.py
+import unittest
+
+from src.pipeline.postprocess import detection_records
+from src.storage import Input, Output, ObjectType, Detection
+from tests.helpers import EngineTestCase
+
+
+def _segments():
+    return [
+        {'segment_id': 0, 'raw_label': 'tabby', 'confidence': 0.9, 'calibrated_confidence': 0.8,
+         'bbox': [0, 0, 40, 30], 'area': 1200},
+        {'segment_id': 1, 'raw_label': 'sock', 'confidence': 0.3, 'calibrated_confidence': 0.2,
+         'bbox': [5, 5, 10, 10], 'area': 100},
+        {'segment_id': 2, 'raw_label': 'tabby', 'confidence': 0.85, 'bbox': [50, 0, 40, 30], 'area': 1200},
+    ]
+
+
+class TestDetectionRecords(unittest.TestCase):
+    def test_every_segment_is_recorded_with_its_outcome(self):
+        detections = [dict(_segments()[0], mapped_label='cat', mapping_method='synonym')]
+        records = detection_records(_segments(), detections)
+        self.assertEqual([r['kept'] for r in records], [True, False, False])
+        self.assertEqual(records[0]['mapped_label'], 'cat')
+        self.assertEqual(records[0]['mapping_method'], 'synonym')
+        self.assertIsNone(records[1]['mapped_label'])
+        self.assertIsNone(records[2]['calibrated_confidence'])
+        self.assertEqual((records[2]['x'], records[2]['width'], records[2]['area']), (50, 40, 1200))
+
+
+class TestDetectionStorage(EngineTestCase):
+    def test_detections_are_bulk_saved_and_queried_per_output(self):
+        records = detection_records(_segments(), [dict(_segments()[2], mapped_label='cat')])
+        with self.db.unit_of_work():
+            cat = ObjectType(name='cat', description='cats')
+            cat.save()
+            new_input = Input(description='d', image_path='media/a.jpg')
+            new_output = Output(predicted_count=1, pred_confidence=0.85,
+                                object_type_id=cat.id, input_id=new_input.id)
+            self.db.bulk_save([new_input, new_output] + Detection.from_records(new_output.id, records))
+
+        self.assertEqual([d.segment_id for d in self.db.get_detections(new_output.id)], [0, 1, 2])
+        kept = self.db.get_detections(new_output.id, kept=True)
+        self.assertEqual([(d.segment_id, d.mapped_label) for d in kept], [(2, 'cat')])
+        self.assertEqual(len(self.db.get_detections(new_output.id, kept=False)), 2)
+
+        self.db.delete(self.db.get(Output, id=new_output.id))
+        self.assertEqual(self.db.count(Detection), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# tests/test_storage/test_engine.py
+import threading
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from src.storage import Input, Output, ObjectType
+from tests.helpers import EngineTestCase
+
+
+class TestEngineUnitOfWork(EngineTestCase):
+    def test_unit_of_work_commits_once(self):
+        with patch.object(self.db, '_Engine__session', wraps=self.db._Engine__session) as session:
+            with self.db.unit_of_work():
+                object_type = ObjectType(name='car', description='cars')
+                object_type.save()
+                new_input, new_output = self._rows(object_type, 'media/a.jpg')
+                new_input.save()
+                new_output.save()
+            self.assertEqual(session.commit.call_count, 1)
+        self.assertEqual(len(self.db.all(Output)), 1)
+
+    def test_unit_of_work_rolls_back_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with self.db.unit_of_work():
+                ObjectType(name='car', description='cars').save()
+                raise RuntimeError('boom')
+        self.assertEqual(self.db.all(ObjectType), [])
+
+    def test_bulk_save_inserts_all_rows(self):
+        with self.db.unit_of_work():
+            object_type = ObjectType(name='car', description='cars')
+            object_type.save()
+            rows = []
+            for i in range(3):
+                rows.extend(self._rows(object_type, f'media/{i}.jpg'))
+            self.db.bulk_save(rows)
+        self.assertEqual(len(self.db.all(Input)), 3)
+        self.assertEqual(len(self.db.all(Output)), 3)
+
+    def test_savepoint_isolates_failed_group(self):
+        with self.db.unit_of_work():
+            object_type = ObjectType(name='car', description='cars')
+            object_type.save()
+            self.db.bulk_save(list(self._rows(object_type, 'media/dup.jpg')))
+            with self.assertRaises(Exception):
+                with self.db.savepoint():
+                    # image_path is unique, so this group must fail alone
+                    self.db.bulk_save(list(self._rows(object_type, 'media/dup.jpg')))
+            with self.db.savepoint():
+                self.db.bulk_save(list(self._rows(object_type, 'media/ok.jpg')))
+        paths = sorted(i.image_path for i in self.db.all(Input))
+        self.assertEqual(paths, ['media/dup.jpg', 'media/ok.jpg'])
+
+    def test_threads_get_their_own_session_and_unit_of_work(self):
+        seen = {}
+
+        def worker():
+            seen['session'] = self.db._Engine__session()
+            # Not inside the main thread's unit of work, so this commits at once
+            ObjectType(name='bus', description='buses').save()
+            self.db.close()
+
+        with self.db.unit_of_work():
+            ObjectType(name='car', description='cars').save()
+            thread = threading.Thread(target=worker)
+            thread.start()
+            thread.join()
+            self.assertIsNot(seen['session'], self.db._Engine__session())
+            self.db._Engine__session.rollback()
+        self.assertEqual([t.name for t in self.db.all(ObjectType)], ['bus'])
+
+
+class TestEngineAggregates(EngineTestCase):
+    def _populate(self):
+        object_type = ObjectType(name='car', description='cars')
+        object_type.save()
+        rows = []
+        for i, confidence in enumerate([0.5, 0.7, 0.9]):
+            new_input, new_output = self._rows(object_type, f'media/{i}.jpg')
+            new_output.pred_confidence = confidence
+            rows.extend([new_input, new_output])
+        # one output from two days ago falls outside the 24h window
+        rows[1].created_at = datetime.now() - timedelta(days=2)
+        self.db.bulk_save(rows)
+
+    def test_count_and_average(self):
+        self._populate()
+        self.assertEqual(self.db.count(Output), 3)
+        self.assertEqual(self.db.count(Output, since=datetime.now() - timedelta(hours=24)), 2)
+        self.assertAlmostEqual(self.db.average(Output, 'pred_confidence'), 0.7)
+
+    def test_summary_stats(self):
+        self._populate()
+        stats = self.db.summary_stats(window_hours=24)
+        self.assertEqual(stats['total_inputs'], 3)
+        self.assertEqual(stats['total_outputs'], 3)
+        self.assertEqual(stats['total_object_types'], 1)
+        self.assertEqual(stats['recent_outputs'], 2)
+        self.assertAlmostEqual(stats['average_confidence'], 0.7)
+
+    def test_summary_stats_cache(self):
+        self.assertEqual(self.db.summary_stats(max_age=60)['total_outputs'], 0)
+        self._populate()
+        self.assertEqual(self.db.summary_stats(max_age=60)['total_outputs'], 0)
+        self.assertEqual(self.db.summary_stats()['total_outputs'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()